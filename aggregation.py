@@ -0,0 +1,126 @@
+"""
+Sobremuestreo con agregación por ventanas en el propio dispositivo.
+
+`get_sensor_temperature` y `get_sensor_light` se leían una sola vez por envío, así que una lectura con
+ruido se convertía directamente en el valor publicado. `Oversampler` lee los sensores en un hilo a
+frecuencia alta (20-50 Hz) y acumula los valores en `WindowAccumulator`, que guarda cada ventana en un
+`array('d')` preasignado. Al cerrar la ventana solo se publica el agregado:
+
+    {"temperature": media, "temperature_min": ..., "temperature_max": ..., "temperature_std": ...,
+     "temperature_last": última lectura, "light": clase de luz según la humedad media,
+     "samples": lecturas de la ventana}
+
+Si el sensor falla, el hilo cuenta el error (`errors`, `last_error`) y sigue leyendo; una ventana sin
+lecturas devuelve None y `mainprueba.py` lee entonces los sensores directamente.
+
+Nota: el sensor de humedad/temperatura del Sense HAT (HTS221) refresca a 12,5 Hz como máximo, así que
+por encima de esa frecuencia se repiten valores.
+"""
+
+import array
+import math
+import threading
+
+from sampling_clock import FixedRateClock
+
+DEFAULT_RATE_HZ = 20
+LIGHT_HUMIDITY_THRESHOLD = 50  # Igual que get_sensor_light
+
+
+class WindowAccumulator:
+    def __init__(self, capacity=64):
+        self._values = array.array("d", bytes(8 * max(1, int(capacity))))
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, value):
+        if self._count == len(self._values):
+            # Ventana más larga de lo previsto: duplica el espacio
+            self._values.extend(self._values)
+        self._values[self._count] = value
+        self._count += 1
+
+    def reset(self):
+        self._count = 0
+
+    def summary(self):
+        """Devuelve min, max, media, desviación típica y último valor de la ventana (None si está vacía)."""
+        if not self._count:
+            return None
+        values = self._values[:self._count]
+        mean = math.fsum(values) / self._count
+        variance = math.fsum((value - mean) ** 2 for value in values) / self._count
+        return {
+            "min": min(values),
+            "max": max(values),
+            "mean": mean,
+            "std": math.sqrt(variance),
+            "last": values[-1],
+            "count": self._count,
+        }
+
+
+class Oversampler(threading.Thread):
+    """
+    Lee `read_temperature` y `read_humidity` a `rate_hz` en un hilo propio. `take_window()` cierra la
+    ventana actual y devuelve su agregado listo para añadir a `sensor_data`.
+    """
+
+    def __init__(self, read_temperature, read_humidity, rate_hz=DEFAULT_RATE_HZ):
+        if not rate_hz or rate_hz <= 0:
+            raise ValueError(f"Frecuencia de sobremuestreo no válida: {rate_hz!r}")
+        super().__init__(daemon=True)
+        self.read_temperature = read_temperature
+        self.read_humidity = read_humidity
+        self.clock = FixedRateClock(1 / rate_hz)
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        # Espacio para dos segundos de lecturas; la frecuencia puede no ser entera (p. ej. 12,5 Hz)
+        capacity = int(math.ceil(rate_hz * 2))
+        self._temperature = WindowAccumulator(capacity)
+        self._humidity = WindowAccumulator(capacity)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.clock.wait()
+            try:
+                temperature = self.read_temperature()
+                humidity = self.read_humidity()
+            except Exception as e:
+                # Cualquier fallo del sensor: el hilo no puede morir en silencio
+                self.errors += 1
+                error = f"{type(e).__name__}: {e}"
+                if error != self.last_error:
+                    print(f"Error al leer los sensores en el sobremuestreo: {error}")
+                self.last_error = error
+                continue
+            with self._lock:
+                self._temperature.add(temperature)
+                self._humidity.add(humidity)
+
+    def take_window(self):
+        with self._lock:
+            temperature = self._temperature.summary()
+            humidity = self._humidity.summary()
+            self._temperature.reset()
+            self._humidity.reset()
+
+        if temperature is None:
+            return None
+        return {
+            "temperature": round(temperature["mean"], 2),
+            "temperature_min": round(temperature["min"], 2),
+            "temperature_max": round(temperature["max"], 2),
+            "temperature_std": round(temperature["std"], 3),
+            "temperature_last": round(temperature["last"], 2),
+            "light": "Low Light" if humidity["mean"] < LIGHT_HUMIDITY_THRESHOLD else "High Light",
+            "samples": temperature["count"],
+        }
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self.join(timeout)
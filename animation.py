@@ -0,0 +1,179 @@
+"""
+Motor de animaciones cíclicas precalculadas para la matriz LED.
+
+Las ondas de `mainprueba-copy.py` y `leds.py` recalculaban cada frame (`math.sin` y una lista 8x8
+nueva cada 200 ms) y cada selección de vino paraba un hilo y arrancaba otro. Aquí:
+
+   - `wave_sequence` y `shifted_wave_sequence` generan una vez la secuencia cíclica completa de una onda.
+     La onda sinusoidal avanzaba 0,5 rad por frame, que no cierra un ciclo exacto; se usa el paso más
+     cercano que sí lo cierra (2π/13 ≈ 0,483 rad) para que el anillo de frames enlace sin saltos.
+   - `AnimationEngine` es un único hilo persistente que reproduce el anillo de frames de la secuencia
+     activa con plazos fijos (`FixedRateClock`). Cambiar de secuencia (`play`, `show_still`, `idle`)
+     solo sustituye una referencia: el hilo la recoge en el siguiente frame, sin parar ni crear hilos.
+   - Las secuencias se preparan para la salida (`framebuffer.py`) una sola vez por clave, p. ej.
+     (vino, amplitud, frecuencia, color), y se guardan. Con NumPy instalado se generan vectorizadas
+     (`led_numpy.py`) y el cambio entre vinos puede hacerse con un fundido cruzado (`transition`).
+   - Si un frame llega tan tarde que se pasa el plazo del siguiente, se salta al que toca y se cuenta
+     como perdido. `stats()` devuelve frames mostrados y perdidos, cambios de secuencia y el tiempo de
+     escritura por frame.
+"""
+
+import collections
+import threading
+import time
+
+from led_frames import render_shifted_wave, render_wave
+from perf_stats import summarize_latencies
+from sampling_clock import FixedRateClock
+
+try:
+    import led_numpy
+except ImportError:  # NumPy es opcional: sin él se usan los generadores en Python de led_frames.py
+    led_numpy = None
+
+FRAME_TIME_WINDOW = 1000
+
+
+def wave_sequence(amplitude, frequency, color):
+    """Ciclo completo de la onda sinusoidal (vectorizado con NumPy si está instalado)."""
+    if led_numpy:
+        return led_numpy.wave_frames(amplitude, frequency, color)
+    return render_wave(amplitude, frequency, color)
+
+
+def shifted_wave_sequence(wave_pattern, color):
+    """Ciclo completo de la onda de barras de `leds.py` (vectorizado con NumPy si está instalado)."""
+    if led_numpy:
+        return led_numpy.shifted_wave_frames(wave_pattern, color)
+    return render_shifted_wave(wave_pattern, color)
+
+
+class Playback:
+    def __init__(self, key, frames, until=None, intro=()):
+        self.key = key
+        self.frames = frames
+        self.until = until
+        self.intro = intro  # Frames de transición que se muestran una vez antes del bucle
+        self.index = 0
+
+    def frame(self, index):
+        if index < len(self.intro):
+            return self.intro[index]
+        return self.frames[(index - len(self.intro)) % len(self.frames)]
+
+
+class AnimationEngine(threading.Thread):
+    def __init__(self, output, period=0.2, clock=time.monotonic):
+        super().__init__(daemon=True)
+        self.output = output
+        self.period = period
+        self.clock = clock
+        self.sequences = {}  # clave -> frames preparados para la salida
+        self.sources = {}    # clave -> array NumPy original, para calcular transiciones
+        self.shown = 0
+        self.dropped = 0
+        self.switches = 0
+        self.frame_times = collections.deque(maxlen=FRAME_TIME_WINDOW)
+        self._playback = None
+        self._condition = threading.Condition()
+        self._stopping = False
+
+    def prepare(self, key, build):
+        """Devuelve la secuencia preparada de `key`, construyéndola con `build()` solo la primera vez."""
+        frames = self.sequences.get(key)
+        if frames is None:
+            source = build()
+            if hasattr(source, "ndim"):
+                self.sources[key] = source
+            frames = self.output.prepare_sequence(source)
+            self.sequences[key] = frames
+        return frames
+
+    def play(self, key, build, duration=None, transition=0):
+        """
+        Reproduce en bucle la secuencia `key` (durante `duration` segundos si se indica). Con
+        `transition` > 0 y NumPy instalado, enlaza con la animación en curso mediante un fundido cruzado
+        de ese número de frames.
+        """
+        frames = self.prepare(key, build)
+        until = None if duration is None else self.clock() + duration
+        intro = self._transition(key, transition) if transition else ()
+        self._switch(Playback(key, frames, until, intro))
+
+    def _transition(self, key, steps):
+        with self._condition:
+            current = self._playback
+            shown = current.index - 1 if current is not None else -1
+        target = self.sources.get(key)
+        if led_numpy is None or target is None or current is None or shown < 0:
+            return ()
+        source = self.sources.get(current.key)
+        if source is None:
+            return ()
+        if shown < len(current.intro):
+            return ()  # Ya estaba en una transición: se salta directamente a la nueva secuencia
+        start = source[(shown - len(current.intro)) % len(source)]
+        # El último frame del fundido es el primero de la secuencia nueva: no se repite
+        return self.output.prepare_sequence(led_numpy.crossfade(start, target[0], steps)[:-1])
+
+    def show_still(self, key, pixels):
+        """Muestra un frame fijo (detiene la animación en curso)."""
+        self._switch(Playback(key, self.prepare(key, lambda: [pixels])))
+
+    def idle(self):
+        self._switch(None)
+
+    def _switch(self, playback):
+        with self._condition:
+            self._playback = playback
+            self.switches += 1
+            self._condition.notify()
+
+    def run(self):
+        clock = None
+        playback = None
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+                if self._playback is not playback:
+                    # Secuencia nueva: empieza en su primer frame y con plazos nuevos
+                    playback = self._playback
+                    clock = FixedRateClock(self.period, clock=self.clock)
+                    if playback is None:
+                        continue
+                elif playback is None or (len(playback.frames) == 1 and playback.index > len(playback.intro)):
+                    self._condition.wait()  # Sin animación o frame fijo ya mostrado
+                    continue
+                else:
+                    self._condition.wait(clock.delay())
+                    if self._stopping or self._playback is not playback or clock.delay() > 0:
+                        continue
+                if playback.until is not None and self.clock() >= playback.until:
+                    self._playback = None  # Deja el último frame a la vista
+                    continue
+
+            tick = clock.tick()
+            if tick.missed:
+                self.dropped += tick.missed
+                playback.index += tick.missed
+            started = time.perf_counter()
+            self.output.show(playback.frame(playback.index))
+            self.frame_times.append(time.perf_counter() - started)
+            self.shown += 1
+            playback.index += 1
+
+    def stop(self, timeout=None):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.join(timeout)
+
+    def stats(self):
+        return {
+            "shown": self.shown,
+            "dropped": self.dropped,
+            "switches": self.switches,
+            "sequences": len(self.sequences),
+            "frame_time_ms": summarize_latencies(list(self.frame_times)),
+        }
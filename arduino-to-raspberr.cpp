@@ -7,6 +7,7 @@ const char* password = "claudiac";  // Cambia esto por la contraseña de tu red
 
 // Configuración del broker MQTT
 const char* mqtt_server = "broker.hivemq.com";  // Cambia esto con la IP de tu Raspberry Pi si usas un broker local
+// Con el broker local de la Raspberry Pi (local_broker.py o MQTT_EMBEDDED_BROKER en mainprueba.py), el control del ventilador no sale de la LAN
 const int mqtt_port = 1883;  // Puerto MQTT estándar
 
 WiFiClient espClient;
@@ -0,0 +1,182 @@
+"""
+Publicador del estado del actuador del Arduino (ventilador) por MQTT.
+
+`send_to_arduino` publicaba cada comando con QoS 1 y `retain=True` aunque el ventilador ya estuviera en
+ese estado, y `raspberry-to-arduino2.py` repite "ON" cada dos segundos. `ArduinoPublisher` guarda el
+estado deseado y el último confirmado por el broker (PUBACK), y:
+
+   - no publica si el estado pedido ya es el último confirmado y no hay otro en vuelo,
+   - limita los mensajes QoS 1 en vuelo (`window`). Si la ventana está llena, o no hay conexión, el
+     estado se queda pendiente y un estado nuevo sustituye al pendiente (solo importa el último); se
+     publica en cuanto llega un PUBACK o se recupera la conexión,
+   - no deja huecos de la ventana ocupados para siempre: al desconectarse (paho no reenvía los mensajes
+     en vuelo con `clean_session`) o si el PUBACK no llega en `ack_timeout` segundos, los mensajes en
+     vuelo se descartan y el último estado publicado vuelve a quedar pendiente,
+   - mide la latencia publish → PUBACK.
+
+Funciona con un cliente `paho.mqtt`: hay que llamar a `on_publish(mid)` y `on_connect()` desde los
+callbacks del cliente. No se llama a `client.publish` con el lock tomado: paho invoca `on_publish` desde
+su hilo con sus propios locks tomados, y el PUBACK puede llegar antes de que `publish` devuelva el mid.
+"""
+
+import collections
+import threading
+import time
+
+from perf_stats import summarize_latencies
+
+LATENCY_WINDOW = 1000
+
+
+class ArduinoPublisher:
+    def __init__(self, client, topic, window=4, qos=1, retain=True, ack_timeout=10.0, clock=time.perf_counter):
+        self.client = client
+        self.topic = topic
+        self.window = window
+        self.qos = qos
+        self.retain = retain
+        self.ack_timeout = ack_timeout
+        self.clock = clock
+        self.connected = False
+        self.acked_state = None      # Último estado confirmado por el broker
+        self.published_state = None  # Último estado publicado (confirmado o en vuelo)
+        self.pending = None          # Estado a publicar cuando haya hueco o conexión
+        self.published = 0
+        self.acked = 0
+        self.suppressed = 0
+        self.conflated = 0
+        self.errors = 0
+        self.expired = 0             # Mensajes en vuelo descartados sin PUBACK
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._in_flight = {}         # mid -> (estado, publicado_en)
+        self._reserved = 0           # Publicaciones en curso que aún no tienen mid
+        self._early_acks = set()
+        self._lock = threading.Lock()
+
+    def set_state(self, state):
+        """Pide un estado ("ON"/"OFF"). Devuelve "published", "queued" o "suppressed"."""
+        with self._lock:
+            self._expire()
+            if self.pending is not None:
+                if state == self.pending:
+                    self.suppressed += 1
+                    return "suppressed"
+                self.conflated += 1  # Sustituye al pendiente sin llegar a publicarlo
+                self.pending = None
+            if self._confirmed(state):
+                self.suppressed += 1
+                return "suppressed"
+            if not self.connected or len(self._in_flight) + self._reserved >= self.window:
+                self.pending = state
+                return "queued"
+            self._reserved += 1
+        self._publish(state)
+        return "published"
+
+    def _publish(self, state):
+        published_at = self.clock()
+        result = self.client.publish(self.topic, state, qos=self.qos, retain=self.retain)
+        with self._lock:
+            self._reserved -= 1
+            if result.rc != 0:
+                self.errors += 1
+                if self.pending is None:
+                    self.pending = state  # Se reintenta al reconectar
+                print(f"Error al enviar mensaje a Arduino: {result.rc}")
+                return
+            self.published += 1
+            self.published_state = state
+            if self.qos == 0:
+                return
+            if result.mid in self._early_acks:
+                self._early_acks.discard(result.mid)
+                self._acknowledge(state, published_at)
+            else:
+                self._in_flight[result.mid] = (state, published_at)
+        print(f"Mensaje enviado a Arduino: {state}")
+        if self.qos == 0:
+            self.flush()
+
+    def _confirmed(self, state):
+        # Solo es un duplicado si el broker ya lo confirmó y no hay otro estado en camino
+        return state == self.acked_state and not self._in_flight and not self._reserved
+
+    def _drop_in_flight(self, mids):
+        """Descarta mensajes en vuelo; el último estado publicado vuelve a quedar pendiente."""
+        if not mids:
+            return
+        newest = max((self._in_flight[mid] for mid in mids), key=lambda entry: entry[1])
+        for mid in mids:
+            del self._in_flight[mid]
+        self.expired += len(mids)
+        if newest[0] != self.acked_state:
+            self.acked_state = None  # Puede haber llegado sin PUBACK: el estado real es desconocido
+        # Los que siguen en vuelo son posteriores y ya llevan un estado más reciente
+        if self.pending is None and not self._in_flight:
+            self.pending = newest[0]
+
+    def _expire(self):
+        if self.ack_timeout is None:
+            return
+        now = self.clock()
+        self._drop_in_flight([mid for mid, (_, published_at) in self._in_flight.items()
+                              if now - published_at >= self.ack_timeout])
+
+    def _acknowledge(self, state, published_at):
+        self.acked += 1
+        self.acked_state = state
+        self.latencies.append(self.clock() - published_at)
+
+    def on_publish(self, mid):
+        """Callback de PUBACK del cliente MQTT."""
+        with self._lock:
+            entry = self._in_flight.pop(mid, None)
+            if entry is None:
+                if self._reserved:
+                    self._early_acks.add(mid)  # Aún no ha vuelto `publish`
+                return  # Si no, es el PUBACK tardío de un mensaje ya descartado
+            self._acknowledge(*entry)
+        self.flush()
+
+    def on_connect(self):
+        with self._lock:
+            self.connected = True
+        self.flush()
+
+    def on_disconnect(self):
+        with self._lock:
+            self.connected = False
+            # Sin sesión persistente el broker no confirmará estos mensajes: se reenvía el último al reconectar
+            self._drop_in_flight(list(self._in_flight))
+            self._early_acks.clear()
+
+    def flush(self):
+        """Publica el estado pendiente si hay conexión y hueco en la ventana."""
+        with self._lock:
+            self._expire()
+            if self.pending is None or not self.connected:
+                return
+            if len(self._in_flight) + self._reserved >= self.window:
+                return
+            state = self.pending
+            self.pending = None
+            if self._confirmed(state):
+                self.suppressed += 1
+                return
+            self._reserved += 1
+        self._publish(state)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "acked_state": self.acked_state,
+                "pending": self.pending,
+                "in_flight": len(self._in_flight),
+                "published": self.published,
+                "acked": self.acked,
+                "suppressed": self.suppressed,
+                "conflated": self.conflated,
+                "errors": self.errors,
+                "expired": self.expired,
+                "puback_ms": summarize_latencies(list(self.latencies)),
+            }
@@ -0,0 +1,324 @@
+"""
+Benchmark de latencia comando → actuación de `mainprueba.py`.
+
+Mide, con sustitutos locales de IoT Hub y del broker MQTT, cuánto tarda un comando de la nube en
+convertirse en una acción:
+
+   - `receive`:           inyección del comando → `receive_message` lo entrega a `handle_command`
+   - `queue`:             inyección → un hilo del despachador empieza a ejecutar el handler
+   - `dispatch_arduino`:  inicio del handler → llamada a `send_to_arduino` ("Fan ON" / "Fan OFF")
+   - `puback`:            publish de paho → PUBACK del broker
+   - `arduino_delivery`:  publish de paho → el "Arduino" (suscriptor local) recibe el mensaje
+   - `end_to_end_arduino`: inyección → el Arduino recibe el mensaje
+   - `dispatch_render`:   inicio del handler → llamada a `set_pixels` ("Increase/Decrease Brightness")
+   - `end_to_end_render`: inyección → `set_pixels`
+
+El código que se mide es el de `mainprueba.py` tal cual (con el backend de hardware simulado, ver
+`hardware.py`); el benchmark solo envuelve las funciones para anotar los tiempos. Los comandos se
+inyectan a las tasas indicadas y el resultado (p50/p95/p99/max por etapa y throughput) se escribe en
+JSON para poder comparar entre versiones, junto con los contadores del despachador de comandos (los
+comandos coalescidos cuentan como atendidos).
+
+Uso:
+    python3 bench_commands.py --rates 10,50,200 --duration 10 --output bench_commands.json
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import os
+import platform
+import queue
+import subprocess
+import threading
+import time
+
+from hardware import BACKEND_ENV
+
+os.environ.setdefault(BACKEND_ENV, "sim")
+
+import mainprueba  # noqa: E402  (necesita el backend simulado ya elegido)
+from local_broker import BrokerThread  # noqa: E402
+from mqtt_lite import MqttLiteClient  # noqa: E402
+from perf_stats import summarize_latencies  # noqa: E402
+from sampling_clock import FixedRateClock  # noqa: E402
+
+BENCH_COMMANDS = ("Fan ON", "Increase Brightness", "Fan OFF", "Decrease Brightness")
+BENCH_FIELD = "bench_injected_at"  # Instante de inyección, viaja en el propio comando
+
+
+# SUSTITUTO LOCAL DE IOT HUB
+class StandInMessage:
+    def __init__(self, data, injected_at):
+        self.data = data
+        self.injected_at = injected_at
+        self.custom_properties = {}
+
+
+class StandInHubClient:
+    """Imita la parte de IoTHubDeviceClient que usa `handle_command`."""
+
+    def __init__(self, on_receive):
+        self.inbox = queue.Queue()
+        self.on_receive = on_receive
+
+    def inject(self, command):
+        injected_at = time.perf_counter()
+        self.inbox.put(StandInMessage(json.dumps({"command": command, BENCH_FIELD: injected_at}), injected_at))
+
+    def receive_message(self):
+        message = self.inbox.get()
+        self.on_receive(message)
+        return message
+
+    def send_message(self, message):
+        pass
+
+
+# ANOTACIÓN DE TIEMPOS
+class StageRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()  # (injected_at, started_at) del handler que ejecuta cada hilo
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = collections.defaultdict(list)
+            self.in_flight = {}               # mid de paho -> (injected_at, published_at)
+            self.early_acks = {}              # PUBACK recibidos antes de conocer el mid
+            self.arduino_pending = collections.deque()
+            self.arduino_current = None       # Último comando del ventilador (lo publica el hilo de paho si quedó pendiente)
+            self.completed = 0
+
+    def record(self, stage, seconds):
+        self.stages[stage].append(seconds)
+
+    # Hooks
+    def on_receive(self, message):
+        now = time.perf_counter()
+        with self.lock:
+            self.record("receive", now - message.injected_at)
+
+    def on_handler_start(self, payload):
+        now = time.perf_counter()
+        injected_at = payload[BENCH_FIELD]
+        self.local.current = (injected_at, now)
+        with self.lock:
+            self.record("queue", now - injected_at)
+
+    def on_send_to_arduino(self):
+        injected_at, started_at = self.local.current
+        with self.lock:
+            self.arduino_current = self.local.current
+            self.record("dispatch_arduino", time.perf_counter() - started_at)
+
+    def publishing_command(self):
+        return getattr(self.local, "current", None) or self.arduino_current
+
+    def on_paho_publishing(self, published_at):
+        # Antes de publicar: el mensaje puede llegar al Arduino antes de que `publish` devuelva el mid
+        injected_at, _ = self.publishing_command()
+        with self.lock:
+            self.arduino_pending.append((injected_at, published_at))
+
+    def on_paho_publish(self, mid, published_at):
+        injected_at, _ = self.publishing_command()
+        with self.lock:
+            acked_at = self.early_acks.pop(mid, None)
+            if acked_at is None:
+                self.in_flight[mid] = (injected_at, published_at)
+            else:
+                self.record("puback", acked_at - published_at)
+
+    def on_puback(self, mid):
+        now = time.perf_counter()
+        with self.lock:
+            entry = self.in_flight.pop(mid, None)
+            if entry is None:
+                self.early_acks[mid] = now
+            else:
+                self.record("puback", now - entry[1])
+
+    def on_arduino_message(self):
+        now = time.perf_counter()
+        with self.lock:
+            if not self.arduino_pending:
+                return  # Mensaje retenido de una ejecución anterior
+            injected_at, published_at = self.arduino_pending.popleft()
+            self.record("arduino_delivery", now - published_at)
+            self.record("end_to_end_arduino", now - injected_at)
+            self.completed += 1
+
+    def on_set_pixels(self):
+        now = time.perf_counter()
+        current = getattr(self.local, "current", None)
+        if current is None:
+            return  # Pintado fuera de un comando
+        injected_at, started_at = current
+        with self.lock:
+            self.record("dispatch_render", now - started_at)
+            self.record("end_to_end_render", now - injected_at)
+            self.completed += 1
+
+
+def traced_handler(handler, recorder):
+    def run(payload):
+        recorder.on_handler_start(payload)
+        try:
+            return handler(payload)
+        finally:
+            recorder.local.current = None
+    return run
+
+
+def instrument(recorder):
+    """Envuelve las funciones de mainprueba que marcan el final de cada etapa."""
+    original_send_to_arduino = mainprueba.send_to_arduino
+    original_publish = mainprueba.mqtt_client.publish
+    original_on_publish = mainprueba.mqtt_client.on_publish
+    original_set_pixels = mainprueba.sense.set_pixels
+
+    for route in mainprueba.command_dispatcher.routes.values():
+        route.handler = traced_handler(route.handler, recorder)
+
+    def send_to_arduino(message):
+        recorder.on_send_to_arduino()
+        return original_send_to_arduino(message)
+
+    def publish(*args, **kwargs):
+        published_at = time.perf_counter()
+        recorder.on_paho_publishing(published_at)
+        result = original_publish(*args, **kwargs)
+        recorder.on_paho_publish(result.mid, published_at)
+        return result
+
+    def on_publish(client, userdata, mid):
+        recorder.on_puback(mid)
+        if original_on_publish:
+            original_on_publish(client, userdata, mid)
+
+    def set_pixels(pixel_list):
+        result = original_set_pixels(pixel_list)
+        recorder.on_set_pixels()
+        return result
+
+    mainprueba.send_to_arduino = send_to_arduino
+    mainprueba.mqtt_client.publish = publish
+    mainprueba.mqtt_client.on_publish = on_publish
+    mainprueba.sense.set_pixels = set_pixels
+
+
+async def arduino_standin(host, port, topic, recorder):
+    client = MqttLiteClient("ArduinoClient-bench", keepalive=0)
+    await client.connect(host, port)
+    try:
+        await client.subscribe(topic, qos=0)
+        while True:
+            await client.messages.get()
+            recorder.on_arduino_message()
+    finally:
+        await client.close()
+
+
+def dropped_commands(dispatcher):
+    """
+    Comandos que no llegarán a actuar: coalescidos o rechazados por el despachador, o estados del
+    ventilador que el publicador no envía (repetidos o sustituidos por uno posterior).
+    """
+    counters = dispatcher.stats()["commands"].values()
+    arduino = mainprueba.arduino.stats()
+    return (sum(entry["superseded"] + entry["rejected"] for entry in counters)
+            + arduino["suppressed"] + arduino["conflated"])
+
+
+def run_rate(hub_client, recorder, rate, duration, drain_timeout=10):
+    dispatcher = mainprueba.command_dispatcher
+    recorder.reset()
+    dropped_before = dropped_commands(dispatcher)
+    commands = itertools.cycle(BENCH_COMMANDS)
+    clock = FixedRateClock(1 / rate)
+    started = time.perf_counter()
+    injected = 0
+    while time.perf_counter() - started < duration:
+        clock.wait()
+        hub_client.inject(next(commands))
+        injected += 1
+
+    deadline = time.perf_counter() + drain_timeout
+    while (recorder.completed + dropped_commands(dispatcher) - dropped_before < injected
+           and time.perf_counter() < deadline):
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    coalesced = dropped_commands(dispatcher) - dropped_before
+
+    with recorder.lock:
+        stages = {stage: summarize_latencies(values) for stage, values in sorted(recorder.stages.items())}
+        completed = recorder.completed
+    return {
+        "rate": rate,
+        "injected": injected,
+        "completed": completed,
+        "coalesced": coalesced,
+        "throughput": round((completed + coalesced) / elapsed, 2),
+        "injection_clock": clock.stats(),
+        "stages_ms": stages,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latencia comando → actuación")
+    parser.add_argument("--rates", default="10,50,200", help="Comandos por segundo, separados por comas")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos de inyección por tasa")
+    parser.add_argument("--port", type=int, default=0, help="Puerto del broker local (0 = libre)")
+    parser.add_argument("--output", help="Fichero JSON de resultados (por defecto, salida estándar)")
+    args = parser.parse_args()
+
+    recorder = StageRecorder()
+    broker = BrokerThread("127.0.0.1", args.port).start()
+    mainprueba.MQTT_BROKER = "127.0.0.1"
+    mainprueba.MQTT_PORT = broker.broker.port
+    broker.submit(arduino_standin("127.0.0.1", broker.broker.port, mainprueba.MQTT_TOPIC, recorder))
+
+    instrument(recorder)
+    mainprueba.mqtt_connect_with_retry()
+    hub_client = StandInHubClient(recorder.on_receive)
+    threading.Thread(target=mainprueba.handle_command, args=(hub_client,), daemon=True).start()
+
+    results = [run_rate(hub_client, recorder, float(rate), args.duration) for rate in args.rates.split(",")]
+    report = {
+        "benchmark": "command_to_actuation",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "hardware_backend": os.environ[BACKEND_ENV],
+        "results": results,
+        "dispatcher": mainprueba.command_dispatcher.stats(),
+        "arduino_publisher": mainprueba.arduino.stats(),
+        "connections": mainprueba.supervisor.stats(),
+    }
+
+    mainprueba.supervisor.stop()
+    broker.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
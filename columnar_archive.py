@@ -0,0 +1,460 @@
+"""
+Archivo columnar del histórico de telemetría.
+
+Para dibujar la temperatura de un local había que volver a decodificar el JSON de las exportaciones de
+IoT Hub (`00.json`). `ArchiveWriter` convierte las exportaciones (leídas con `export_reader.py`) a un
+directorio con una columna binaria por campo, partido en bloques de tiempo (un día por defecto):
+
+    archivo/
+      manifest.json            diccionario de dispositivos, bloques, filas y rango de horas de cada bloque
+      20241126T000000Z/
+        enqueued.bin           int64   EnqueuedTimeUtc en unidades de 100 ns desde epoch
+        device.bin             uint16  código del dispositivo (índice en `devices` del manifiesto)
+        temperature.bin        float32 grados (NaN si falta)
+        light.bin              uint8   códigos de `telemetry_codec.LIGHT_CODES` (255 = desconocido)
+        joystick.bin           uint8   códigos de `telemetry_codec.JOYSTICK_CODES`
+
+Todos los valores son little-endian. El escritor solo usa la biblioteca estándar (`array`): añade las
+filas al final de cada columna en tandas y actualiza el manifiesto al terminar (escribiendo un temporal y
+renombrándolo). Las filas de más que pudiera haber tras una interrupción se descartan, porque el
+manifiesto manda. De cada exportación el manifiesto anota hasta qué byte se ha convertido: si crece
+(el enrutado a blobs sigue escribiendo en ella) solo se añaden las líneas completas nuevas, y si se
+reemplaza o se acorta se avisa y no se vuelve a añadir.
+
+Las exportaciones de varias particiones se solapan en el tiempo, así que un bloque puede quedar
+desordenado. Con NumPy instalado, al cerrar se reescriben ordenados por hora en un directorio nuevo
+(`<bloque>-<filas>`) al que pasa a apuntar el manifiesto, y después se borra el anterior.
+
+`ColumnarArchive` (requiere NumPy) mapea en memoria las columnas con `numpy.memmap`, sin copiarlas.
+`select` y `query` descartan los bloques que no se solapan con el intervalo o no contienen los
+dispositivos pedidos. En los bloques ordenados por hora (lo normal) el intervalo se localiza con una
+búsqueda binaria y el resultado es una vista de las columnas. `summary` calcula los agregados bloque a
+bloque, sin copiar las columnas: un mes de datos a 1 Hz se resume en milisegundos.
+
+Uso:
+    python3 columnar_archive.py convert archivo/ exportaciones/ 00.json
+    python3 columnar_archive.py query archivo/ --device SenseHat --start 2024-11-26T17:00:00Z --end 2024-11-26T18:00:00Z
+"""
+
+import argparse
+import array
+import json
+import os
+import shutil
+import sys
+import time
+
+from export_index import HEAD_BYTES, INDEX_SUFFIX, complete_lines, head_digest
+from export_reader import (
+    DEVICE_FIELD,
+    ENQUEUED_FIELD,
+    TICKS_PER_SECOND,
+    ExportReader,
+    enqueued_ticks,
+    find_export_files,
+    to_ticks,
+)
+from telemetry_codec import JOYSTICK_CODES, LIGHT_CODES, UNKNOWN_CODE
+
+try:
+    import numpy as np
+except ImportError:  # NumPy solo hace falta para leer el archivo
+    np = None
+
+MANIFEST_FILE = "manifest.json"
+ARCHIVE_VERSION = 1
+DEFAULT_CHUNK_SECONDS = 24 * 3600
+FLUSH_ROWS = 65536
+
+# Columna -> (código de `array`, tipo de NumPy)
+COLUMNS = {
+    "enqueued": ("q", "<i8"),
+    "device": ("H", "<u2"),
+    "temperature": ("f", "<f4"),
+    "light": ("B", "u1"),
+    "joystick": ("B", "u1"),
+}
+MAX_DEVICES = 65535
+
+LIGHT_NAMES = {code: name for name, code in LIGHT_CODES.items()}
+JOYSTICK_NAMES = {code: name for name, code in JOYSTICK_CODES.items()}
+
+SOURCE_FIELDS = (DEVICE_FIELD, ENQUEUED_FIELD, "temperature", "light", "joystick_action")
+
+
+def chunk_name(start_ticks):
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(start_ticks // TICKS_PER_SECOND))
+
+
+def load_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != ARCHIVE_VERSION:
+        raise ValueError(f"Versión de archivo columnar no soportada: {manifest.get('version')}")
+    return manifest
+
+
+class ChunkBuffer:
+    """Filas pendientes de escribir de un bloque, más los metadatos del bloque."""
+
+    def __init__(self, meta):
+        self.meta = meta
+        self.columns = {name: array.array(code) for name, (code, _) in COLUMNS.items()}
+        self.devices = set(meta["devices"])
+        self.last = meta["max_enqueued"]
+
+    def add(self, ticks, device, temperature, light, joystick):
+        meta = self.meta
+        if self.last is not None and ticks < self.last:
+            meta["sorted"] = False
+        if meta["min_enqueued"] is None or ticks < meta["min_enqueued"]:
+            meta["min_enqueued"] = ticks
+        if meta["max_enqueued"] is None or ticks > meta["max_enqueued"]:
+            meta["max_enqueued"] = ticks
+        self.last = ticks
+        self.devices.add(device)
+        columns = self.columns
+        columns["enqueued"].append(ticks)
+        columns["device"].append(device)
+        columns["temperature"].append(temperature)
+        columns["light"].append(light)
+        columns["joystick"].append(joystick)
+        return len(columns["enqueued"])
+
+    def flush(self, directory):
+        pending = len(self.columns["enqueued"])
+        if not pending:
+            return
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.columns.items():
+            if sys.byteorder == "big":
+                values.byteswap()
+            with open(os.path.join(directory, name + ".bin"), "ab") as column_file:
+                values.tofile(column_file)
+            del values[:]
+        self.meta["rows"] += pending
+        self.meta["devices"] = sorted(self.devices)
+
+
+class ArchiveWriter:
+    def __init__(self, path, chunk_seconds=DEFAULT_CHUNK_SECONDS, flush_rows=FLUSH_ROWS):
+        self.path = path
+        self.flush_rows = flush_rows
+        os.makedirs(path, exist_ok=True)
+        manifest = load_manifest(path)
+        if manifest is None:
+            manifest = {"version": ARCHIVE_VERSION, "chunk_seconds": chunk_seconds, "devices": [],
+                        "columns": {name: dtype for name, (_, dtype) in COLUMNS.items()},
+                        "chunks": [], "sources": {}}
+        self.manifest = manifest
+        self.chunk_ticks = manifest["chunk_seconds"] * TICKS_PER_SECOND
+        self.device_codes = {device_id: code for code, device_id in enumerate(manifest["devices"])}
+        self.chunks = {chunk["name"]: chunk for chunk in manifest["chunks"]}
+        self._buffers = {}
+        self.rows = 0
+        self.replaced_sources = 0
+        self._truncate_to_manifest()
+
+    def _truncate_to_manifest(self):
+        """Quita las filas escritas después del último manifiesto guardado (conversión interrumpida)."""
+        for chunk in self.chunks.values():
+            for name, (code, _) in COLUMNS.items():
+                column_path = os.path.join(self.path, chunk["directory"], name + ".bin")
+                expected = chunk["rows"] * array.array(code).itemsize
+                if os.path.exists(column_path) and os.path.getsize(column_path) > expected:
+                    with open(column_path, "r+b") as column_file:
+                        column_file.truncate(expected)
+
+    def device_code(self, device_id):
+        code = self.device_codes.get(device_id)
+        if code is None:
+            if len(self.device_codes) >= MAX_DEVICES:
+                raise ValueError("Demasiados dispositivos para un archivo columnar")
+            code = self.device_codes[device_id] = len(self.manifest["devices"])
+            self.manifest["devices"].append(device_id)
+        return code
+
+    def _buffer(self, ticks):
+        start = ticks - ticks % self.chunk_ticks
+        name = chunk_name(start)
+        buffer = self._buffers.get(name)
+        if buffer is None:
+            meta = self.chunks.get(name)
+            if meta is None:
+                # Restos de una conversión interrumpida antes de guardar el manifiesto
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+                meta = self.chunks[name] = {"name": name, "directory": name, "start": start, "rows": 0,
+                                            "min_enqueued": None, "max_enqueued": None, "sorted": True,
+                                            "devices": []}
+            buffer = self._buffers[name] = ChunkBuffer(meta)
+        return buffer
+
+    def add(self, record):
+        ticks = enqueued_ticks(record[ENQUEUED_FIELD])
+        temperature = record.get("temperature")
+        buffer = self._buffer(ticks)
+        pending = buffer.add(
+            ticks,
+            self.device_code(record[DEVICE_FIELD]),
+            float("nan") if temperature is None else temperature,
+            LIGHT_CODES.get(record.get("light"), UNKNOWN_CODE),
+            JOYSTICK_CODES.get(record.get("joystick_action"), UNKNOWN_CODE),
+        )
+        self.rows += 1
+        if pending >= self.flush_rows:
+            buffer.flush(os.path.join(self.path, buffer.meta["directory"]))
+
+    def convert(self, paths):
+        """
+        Añade lo que no se hubiera convertido ya de las exportaciones indicadas (ficheros o directorios):
+        de cada una se guarda hasta qué byte se ha convertido y solo se leen las líneas completas nuevas.
+        """
+        reader = ExportReader(SOURCE_FIELDS)
+        sources = self.manifest["sources"]
+        for export_path in find_export_files(paths):
+            if export_path.endswith(INDEX_SUFFIX):
+                continue
+            key = os.path.abspath(export_path)
+            size = os.path.getsize(export_path)
+            source = sources.get(key)
+            if isinstance(source, int):
+                source = {"offset": source, "head": None}  # Manifiestos anteriores: solo el tamaño
+            offset = source["offset"] if source else 0
+            if source and (size < offset or (source["head"] is not None and
+                                             head_digest(export_path, min(offset, HEAD_BYTES)) != source["head"])):
+                # Sus filas ya están en el archivo y no se pueden separar del resto: no se añade otra vez
+                print(f"Aviso: {export_path} se ha reemplazado o acortado desde la última conversión; "
+                      f"no se convierte (hay que regenerar el archivo para incluirlo).")
+                self.replaced_sources += 1
+                continue
+            if size == offset:
+                continue
+            position = [offset]
+            with open(export_path, "rb") as export_file:
+                export_file.seek(offset)
+                for record in reader.records_from(complete_lines(export_file, position)):
+                    self.add(record)
+            if position[0] > offset:
+                head = source["head"] if source and offset >= HEAD_BYTES else None
+                sources[key] = {"offset": position[0],
+                                "head": head or head_digest(export_path, min(position[0], HEAD_BYTES))}
+        return reader.stats()
+
+    def _sort_chunk(self, meta):
+        """Escribe el bloque ordenado por hora en un directorio nuevo. Devuelve el directorio anterior."""
+        old_directory = meta["directory"]
+        new_directory = f"{meta['name']}-{meta['rows']}"
+        columns = {name: np.fromfile(os.path.join(self.path, old_directory, name + ".bin"), dtype=dtype,
+                                     count=meta["rows"])
+                   for name, (_, dtype) in COLUMNS.items()}
+        order = np.argsort(columns["enqueued"], kind="stable")
+        os.makedirs(os.path.join(self.path, new_directory), exist_ok=True)
+        for name, values in columns.items():
+            with open(os.path.join(self.path, new_directory, name + ".bin"), "wb") as column_file:
+                values[order].tofile(column_file)
+                column_file.flush()
+                os.fsync(column_file.fileno())
+        meta["directory"] = new_directory
+        meta["sorted"] = True
+        return old_directory
+
+    def close(self):
+        replaced = []
+        for buffer in self._buffers.values():
+            buffer.flush(os.path.join(self.path, buffer.meta["directory"]))
+            if not buffer.meta["sorted"] and np is not None:
+                replaced.append(self._sort_chunk(buffer.meta))
+        self._buffers.clear()
+        self.manifest["chunks"] = sorted(self.chunks.values(), key=lambda chunk: chunk["start"])
+        path = os.path.join(self.path, MANIFEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=1)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(tmp_path, path)
+        # Los bloques sustituidos solo se borran cuando el manifiesto ya apunta a los nuevos
+        for directory in replaced:
+            shutil.rmtree(os.path.join(self.path, directory), ignore_errors=True)
+
+
+class ColumnarArchive:
+    def __init__(self, path):
+        if np is None:
+            raise RuntimeError("Leer el archivo columnar requiere NumPy (pip3 install numpy)")
+        self.path = path
+        manifest = load_manifest(path)
+        if manifest is None:
+            raise FileNotFoundError(f"No hay archivo columnar en {path}")
+        self.manifest = manifest
+        self.devices = manifest["devices"]
+        self.device_codes = {device_id: code for code, device_id in enumerate(self.devices)}
+        self.chunks = manifest["chunks"]
+        self._mapped = {}
+
+    def columns(self, chunk):
+        """Columnas de un bloque como arrays mapeados en memoria (solo lectura)."""
+        mapped = self._mapped.get(chunk["directory"])
+        if mapped is None:
+            mapped = {}
+            for name, (_, dtype) in COLUMNS.items():
+                column_path = os.path.join(self.path, chunk["directory"], name + ".bin")
+                if chunk["rows"]:
+                    mapped[name] = np.memmap(column_path, dtype=dtype, mode="r", shape=(chunk["rows"],))
+                else:
+                    mapped[name] = np.empty(0, dtype=dtype)
+            self._mapped[chunk["directory"]] = mapped
+        return mapped
+
+    def select(self, start=None, end=None, devices=None, columns=tuple(COLUMNS)):
+        """
+        Filas con `start <= enqueued < end` (horas ISO 8601 o segundos epoch) de los dispositivos indicados,
+        bloque a bloque: genera un diccionario columna -> array por bloque. En los bloques ordenados y sin
+        filtro de dispositivo, los arrays son vistas del fichero mapeado.
+        """
+        start = to_ticks(start)
+        end = to_ticks(end)
+        codes = None
+        if devices is not None:
+            codes = {self.device_codes[device_id] for device_id in devices if device_id in self.device_codes}
+
+        for chunk in self.chunks:
+            if not chunk["rows"]:
+                continue
+            if end is not None and chunk["min_enqueued"] >= end:
+                continue
+            if start is not None and chunk["max_enqueued"] < start:
+                continue
+            if codes is not None and not codes.intersection(chunk["devices"]):
+                continue
+            data = self.columns(chunk)
+            enqueued = data["enqueued"]
+            if chunk["sorted"]:
+                low = 0 if start is None else int(np.searchsorted(enqueued, start, "left"))
+                high = len(enqueued) if end is None else int(np.searchsorted(enqueued, end, "left"))
+                selection = slice(low, high)
+            else:
+                selection = np.ones(len(enqueued), dtype=bool)
+                if start is not None:
+                    selection &= enqueued >= start
+                if end is not None:
+                    selection &= enqueued < end
+            part = {name: data[name][selection] for name in columns}
+            if codes is not None and set(chunk["devices"]) - codes:
+                device = data["device"][selection]
+                if len(codes) == 1:
+                    device_mask = device == next(iter(codes))
+                else:
+                    device_mask = np.isin(device, list(codes))
+                part = {name: values[device_mask] for name, values in part.items()}
+            yield part
+
+    def query(self, start=None, end=None, devices=None, columns=tuple(COLUMNS)):
+        """Como `select`, pero junta los bloques en un único array por columna."""
+        parts = list(self.select(start, end, devices, columns))
+        result = {}
+        for name in columns:
+            if not parts:
+                result[name] = np.empty(0, dtype=COLUMNS[name][1])
+            elif len(parts) == 1:
+                result[name] = parts[0][name]
+            else:
+                result[name] = np.concatenate([part[name] for part in parts])
+        return result
+
+    def summary(self, start=None, end=None, devices=None):
+        """Resumen del intervalo calculado bloque a bloque, sin juntar las columnas."""
+        return summarize(self.select(start, end, devices), self.devices)
+
+    def stats(self):
+        return {
+            "devices": len(self.devices),
+            "chunks": len(self.chunks),
+            "rows": sum(chunk["rows"] for chunk in self.chunks),
+        }
+
+
+def summarize(parts, devices):
+    """Filas, rango de horas, temperatura y recuentos de luz y joystick de una selección (por bloques)."""
+    if isinstance(parts, dict):
+        parts = [parts]
+    rows = 0
+    first = last = None
+    measured = 0
+    temperature_sum = 0.0
+    temperature_min = temperature_max = None
+    light_counts = np.zeros(256, dtype=np.int64)
+    joystick_counts = np.zeros(256, dtype=np.int64)
+    device_counts = np.zeros(max(len(devices), 1), dtype=np.int64)
+    for part in parts:
+        enqueued = part["enqueued"]
+        if not len(enqueued):
+            continue
+        rows += len(enqueued)
+        first = int(enqueued.min()) if first is None else min(first, int(enqueued.min()))
+        last = int(enqueued.max()) if last is None else max(last, int(enqueued.max()))
+        temperature = part["temperature"]
+        valid = temperature[~np.isnan(temperature)]
+        if len(valid):
+            measured += len(valid)
+            temperature_sum += float(valid.sum(dtype=np.float64))
+            low, high = float(valid.min()), float(valid.max())
+            temperature_min = low if temperature_min is None else min(temperature_min, low)
+            temperature_max = high if temperature_max is None else max(temperature_max, high)
+        light_counts += np.bincount(part["light"], minlength=256)
+        joystick_counts += np.bincount(part["joystick"], minlength=256)
+        device_counts += np.bincount(part["device"], minlength=len(device_counts))
+    return {
+        "rows": rows,
+        "first_enqueued": None if first is None else first / TICKS_PER_SECOND,
+        "last_enqueued": None if last is None else last / TICKS_PER_SECOND,
+        "devices": {devices[code]: int(count) for code, count in enumerate(device_counts) if count},
+        "temperature": {
+            "count": measured,
+            "min": None if temperature_min is None else round(temperature_min, 2),
+            "max": None if temperature_max is None else round(temperature_max, 2),
+            "mean": round(temperature_sum / measured, 3) if measured else None,
+        },
+        "light": {LIGHT_NAMES.get(code, "unknown"): int(count) for code, count in enumerate(light_counts) if count},
+        "joystick_action": {JOYSTICK_NAMES.get(code, "unknown"): int(count)
+                            for code, count in enumerate(joystick_counts) if count},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivo columnar de la telemetría exportada de IoT Hub")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="Añade exportaciones al archivo")
+    convert_parser.add_argument("archive")
+    convert_parser.add_argument("paths", nargs="+", help="Ficheros de exportación o directorios")
+    convert_parser.add_argument("--chunk-hours", type=float, default=DEFAULT_CHUNK_SECONDS / 3600,
+                                help="Horas por bloque (solo al crear el archivo)")
+
+    query_parser = commands.add_parser("query", help="Resumen de un intervalo")
+    query_parser.add_argument("archive")
+    query_parser.add_argument("--start", help="Hora inicial ISO 8601 (incluida)")
+    query_parser.add_argument("--end", help="Hora final ISO 8601 (excluida)")
+    query_parser.add_argument("--device", action="append", help="Solo este dispositivo (se puede repetir)")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        started = time.perf_counter()
+        writer = ArchiveWriter(args.archive, chunk_seconds=int(args.chunk_hours * 3600))
+        reading = writer.convert(args.paths)
+        writer.close()
+        print(json.dumps({"rows_added": writer.rows, "replaced_sources": writer.replaced_sources, "reading": reading,
+                          "elapsed_s": round(time.perf_counter() - started, 3)}, indent=2))
+    else:
+        archive = ColumnarArchive(args.archive)
+        started = time.perf_counter()
+        summary = archive.summary(args.start, args.end, args.device)
+        summary["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
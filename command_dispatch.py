@@ -0,0 +1,190 @@
+"""
+Despachador de comandos de Azure por tabla, con coalescencia y un pool de hilos.
+
+`handle_command` recibía cada mensaje y ejecutaba su acción en el mismo hilo con una cadena de
+if/elif: mientras se pintaba la matriz o se publicaba al Arduino no se leía el siguiente comando, y un
+JSON mal formado tumbaba el hilo. `CommandDispatcher`:
+
+   - busca el handler en un diccionario (`register(command, handler)`),
+   - ejecuta los handlers en un pool acotado de hilos, de modo que `receive_message` nunca espera,
+   - coalesce los comandos de un mismo grupo que aún no han empezado: de una ráfaga de
+     "Increase/Decrease Brightness" solo se ejecuta el último, y si el ventilador oscila entre
+     "Fan ON" y "Fan OFF" solo se aplica el estado final. Los comandos de un grupo nunca se ejecutan
+     a la vez ni fuera de orden,
+   - cuenta por comando los recibidos, ejecutados, descartados por coalescencia y errores, y la
+     latencia desde la recepción hasta el final del handler (`stats()`).
+"""
+
+import collections
+import itertools
+import json
+import threading
+import time
+
+from perf_stats import summarize_latencies
+
+LATENCY_WINDOW = 1000  # Latencias guardadas por comando para los percentiles
+
+
+class CommandRoute:
+    def __init__(self, handler, group=None, inline=False):
+        self.handler = handler
+        self.group = group
+        self.inline = inline
+
+
+class CommandCounters:
+    def __init__(self):
+        self.received = 0
+        self.executed = 0
+        self.superseded = 0
+        self.rejected = 0
+        self.errors = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def as_dict(self):
+        return {
+            "received": self.received,
+            "executed": self.executed,
+            "superseded": self.superseded,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "latency_ms": summarize_latencies(self.latencies),
+        }
+
+
+class CommandDispatcher:
+    def __init__(self, workers=2, max_pending=64, clock=time.perf_counter):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.clock = clock
+        self.routes = {}
+        self.counters = collections.defaultdict(CommandCounters)
+        self.malformed = 0
+        self.unknown = 0
+        self._pending = {}                 # grupo -> (comando, payload, recibido_en), el último sin empezar
+        self._ready = collections.deque()  # grupos con trabajo pendiente que no se están ejecutando
+        self._running = set()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._unique_groups = itertools.count()
+
+    def register(self, command, handler, group=None, inline=False):
+        """
+        Asocia `handler(payload)` a un comando. Los comandos con el mismo `group` se coalescen entre sí;
+        sin grupo, cada mensaje se ejecuta. `inline=True` lo ejecuta en el hilo de recepción (solo para
+        handlers triviales).
+        """
+        self.routes[command] = CommandRoute(handler, group, inline)
+
+    def start(self):
+        with self._condition:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"command-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def dispatch(self, data):
+        """Procesa un mensaje recibido (JSON con la clave "command"). Devuelve el comando o None."""
+        received_at = self.clock()
+        try:
+            payload = json.loads(data)
+        except (ValueError, TypeError):
+            payload = None
+        if not isinstance(payload, dict):
+            with self._condition:
+                self.malformed += 1
+            print(f"Mensaje no válido recibido: {data!r}")
+            return None
+
+        command = payload.get("command")
+        # Solo cadenas: un valor no hashable (una lista, un objeto) haría fallar la búsqueda en la tabla
+        route = self.routes.get(command) if isinstance(command, str) else None
+        if route is None:
+            with self._condition:
+                self.unknown += 1
+            print(f"Comando desconocido: {command}")
+            return None
+
+        if route.inline:
+            with self._condition:
+                self.counters[command].received += 1
+            self._run(command, route, payload, received_at)
+            return command
+
+        group = route.group if route.group is not None else ("_", next(self._unique_groups))
+        with self._condition:
+            counters = self.counters[command]
+            counters.received += 1
+            previous = self._pending.get(group)
+            if previous is not None:
+                # Sustituye al comando del mismo grupo que aún no ha empezado
+                self.counters[previous[0]].superseded += 1
+            elif len(self._pending) >= self.max_pending:
+                counters.rejected += 1
+                print(f"Cola de comandos llena, se descarta: {command}")
+                return None
+            elif group not in self._running:
+                self._ready.append(group)
+            self._pending[group] = (command, payload, received_at)
+            self._condition.notify()
+        return command
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._ready and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                group = self._ready.popleft()
+                command, payload, received_at = self._pending.pop(group)
+                self._running.add(group)
+
+            self._run(command, self.routes[command], payload, received_at)
+
+            with self._condition:
+                self._running.discard(group)
+                if group in self._pending:
+                    # Llegó otro comando del grupo mientras se ejecutaba este
+                    self._ready.append(group)
+                    self._condition.notify()
+
+    def _run(self, command, route, payload, received_at):
+        try:
+            route.handler(payload)
+        except Exception as e:
+            with self._condition:
+                self.counters[command].errors += 1
+            print(f"Error al ejecutar el comando {command}: {e}")
+            return
+        latency = self.clock() - received_at
+        with self._condition:
+            counters = self.counters[command]
+            counters.executed += 1
+            counters.latencies.append(latency)
+
+    def pending(self):
+        with self._condition:
+            return len(self._pending)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "malformed": self.malformed,
+                "unknown": self.unknown,
+                "pending": len(self._pending),
+                "commands": {command: counters.as_dict() for command, counters in sorted(self.counters.items())},
+            }
@@ -0,0 +1,256 @@
+"""
+Supervisión de las conexiones del dispositivo (broker MQTT del Arduino y Azure IoT Hub).
+
+`mqtt_connect_with_retry` llamaba a `connect` y `loop_start` en bucle con esperas fijas, sin límite, y el
+cliente de IoT Hub no tenía ninguna gestión de reconexión. Aquí cada conexión tiene un hilo propio
+(`SupervisedConnection`) que:
+
+   - conecta al arrancar; como cada conexión va en su hilo, MQTT e IoT Hub se establecen en paralelo
+     mientras el resto del programa se inicializa (`ConnectionSupervisor.start` al principio y
+     `wait_ready` justo antes de necesitarlas),
+   - reintenta con retardo exponencial y jitter (`Backoff`), para que las estaciones que pierden la red
+     a la vez no reconecten todas en el mismo instante. Los errores permanentes
+     (`PermanentConnectionError`, credenciales rechazadas) esperan directamente el retardo máximo,
+   - detecta la pérdida de conexión por el callback del cliente (`connection_lost`) o, si no llega, al
+     comprobar `is_connected` periódicamente, y reconecta enseguida si la sesión perdida había sido
+     estable (una caída transitoria); si la conexión cae nada más establecerse, sigue el backoff,
+   - mide el tiempo hasta conectar, el número de reconexiones, el tiempo conectado y el último error.
+
+`ConnectionSupervisor.stats()` devuelve las métricas de todas las conexiones y, con `report`, las
+publica periódicamente (en `mainprueba.py`, como propiedades reportadas del device twin).
+"""
+
+import random
+import threading
+import time
+
+
+class PermanentConnectionError(Exception):
+    """Error de conexión que no se arregla reintentando enseguida (credenciales, autorización...)."""
+
+
+def default_is_transient(error):
+    return not isinstance(error, PermanentConnectionError)
+
+
+class Backoff:
+    """Retardo exponencial con jitter: entre la mitad y el total de `initial * factor ** intentos`."""
+
+    def __init__(self, initial=0.5, maximum=60.0, factor=2.0, rng=random.random):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.rng = rng
+        self.attempts = 0
+
+    def next_delay(self):
+        ceiling = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        return ceiling * (0.5 + self.rng() / 2)
+
+    def longest_delay(self):
+        return self.maximum * (0.5 + self.rng() / 2)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class SupervisedConnection(threading.Thread):
+    """
+    Mantiene una conexión. `connect()` debe bloquear hasta que la conexión esté establecida (o lanzar
+    una excepción); `is_connected()` indica si sigue activa. `reset()` (opcional) se llama al perder la
+    conexión, antes de esperar al reintento, y `disconnect()` al parar.
+    """
+
+    def __init__(self, name, connect, is_connected, disconnect=None, reset=None, backoff=None,
+                 is_transient=default_is_transient, fast_retry=0.1, stable_after=30.0,
+                 check_interval=5.0, clock=time.monotonic):
+        super().__init__(name=f"conexion-{name}", daemon=True)
+        self.connection_name = name
+        self.connect = connect
+        self.is_connected = is_connected
+        self.disconnect = disconnect
+        self.reset = reset
+        self.backoff = backoff or Backoff()
+        self.is_transient = is_transient
+        self.fast_retry = fast_retry
+        self.stable_after = stable_after
+        self.check_interval = check_interval
+        self.clock = clock
+        self.connected = threading.Event()
+        self.state = "idle"
+        self.attempts = 0
+        self.failures = 0
+        self.reconnects = 0
+        self.disconnects = 0
+        self.last_error = None
+        self.time_to_connect = None  # Desde start() hasta la primera conexión, reintentos incluidos
+        self.last_connect_time = None
+        self.uptime = 0.0            # Suma de las sesiones ya terminadas
+        self._started_at = None
+        self._connected_since = None
+        self._lost = threading.Event()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self._started_at = self.clock()
+        while not self._stop_event.is_set():
+            if not self._connect_once():
+                continue
+            session = self._wait_for_loss()
+            if self._stop_event.is_set():
+                break
+            self.disconnects += 1
+            print(f"[{self.connection_name}] Conexión perdida tras {session:.1f} s")
+            if self.reset:
+                self._call_quietly(self.reset)
+            if session >= self.stable_after:
+                # Caída de una sesión estable: reconexión rápida y backoff desde el principio
+                self.backoff.reset()
+                delay = self.fast_retry
+            else:
+                delay = self.backoff.next_delay()
+            self._wait(delay)
+        self.state = "stopped"
+
+    def _connect_once(self):
+        self.state = "connecting"
+        self.attempts += 1
+        self._lost.clear()
+        attempt_start = self.clock()
+        try:
+            self.connect()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            delay = self.backoff.next_delay() if self.is_transient(e) else self.backoff.longest_delay()
+            print(f"[{self.connection_name}] Error al conectar: {self.last_error}. Reintento en {delay:.1f} s")
+            self._wait(delay)
+            return False
+        now = self.clock()
+        self.last_connect_time = now - attempt_start
+        if self.time_to_connect is None:
+            self.time_to_connect = now - self._started_at
+        else:
+            self.reconnects += 1
+        self._connected_since = now
+        self.state = "connected"
+        self.connected.set()
+        print(f"[{self.connection_name}] Conectado en {self.last_connect_time * 1000:.0f} ms")
+        return True
+
+    def _wait_for_loss(self):
+        """Espera a que se pierda la conexión o se pare el supervisor. Devuelve la duración de la sesión."""
+        while not self._stop_event.is_set():
+            if self._lost.wait(self.check_interval) or not self.is_connected():
+                break
+        now = self.clock()
+        session = now - self._connected_since
+        self.uptime += session
+        self._connected_since = None
+        self.connected.clear()
+        self.state = "waiting"
+        return session
+
+    def _wait(self, delay):
+        self.state = "waiting"
+        self._stop_event.wait(delay)
+
+    def _call_quietly(self, function):
+        try:
+            function()
+        except Exception as e:
+            print(f"[{self.connection_name}] {type(e).__name__}: {e}")
+
+    def connection_lost(self):
+        """Aviso del callback de desconexión del cliente."""
+        self._lost.set()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        self._lost.set()
+        if self.is_alive():
+            self.join(timeout)
+        if self.disconnect:
+            self._call_quietly(self.disconnect)
+
+    def stats(self):
+        now = self.clock()
+        connected_since = self._connected_since
+        session = now - connected_since if connected_since is not None else 0.0
+        running = now - self._started_at if self._started_at is not None else 0.0
+        return {
+            "state": self.state,
+            "attempts": self.attempts,
+            "failures": self.failures,
+            "reconnects": self.reconnects,
+            "disconnects": self.disconnects,
+            "time_to_connect_ms": None if self.time_to_connect is None else round(self.time_to_connect * 1000, 1),
+            "last_connect_ms": None if self.last_connect_time is None else round(self.last_connect_time * 1000, 1),
+            "session_uptime_s": round(session, 1),
+            "total_uptime_s": round(self.uptime + session, 1),
+            "availability": round((self.uptime + session) / running, 4) if running else None,
+            "last_error": self.last_error,
+        }
+
+
+class ConnectionSupervisor:
+    def __init__(self, report=None, report_period=300.0):
+        self.connections = {}
+        self.report = report
+        self.report_period = report_period
+        self._reporter = None
+        self._stop_event = threading.Event()
+
+    def add(self, connection):
+        self.connections[connection.connection_name] = connection
+        return connection
+
+    def start(self, *names):
+        """Arranca las conexiones indicadas (todas por defecto); cada una conecta en su propio hilo."""
+        for name, connection in self.connections.items():
+            if (not names or name in names) and connection.ident is None:
+                connection.start()
+        if self.report and self._reporter is None:
+            self._reporter = threading.Thread(target=self._report_loop, daemon=True)
+            self._reporter.start()
+
+    def connection_lost(self, name):
+        connection = self.connections.get(name)
+        if connection:
+            connection.connection_lost()
+
+    def is_connected(self, name):
+        connection = self.connections.get(name)
+        return bool(connection and connection.connected.is_set())
+
+    def wait_ready(self, *names, timeout=None):
+        """Espera a que las conexiones indicadas (todas por defecto) estén establecidas. Devuelve si lo están."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name, connection in self.connections.items():
+            if names and name not in names:
+                continue
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not connection.connected.wait(remaining):
+                return False
+        return True
+
+    def _report_loop(self):
+        # Primer informe en cuanto todo está conectado (tiempo de arranque) y después cada `report_period`
+        while not self.wait_ready(timeout=1.0):
+            if self._stop_event.is_set():
+                return
+        while not self._stop_event.is_set():
+            try:
+                self.report(self.stats())
+            except Exception as e:
+                print(f"Error al publicar el estado de las conexiones: {e}")
+            self._stop_event.wait(self.report_period)
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        for connection in self.connections.values():
+            connection.stop(timeout)
+
+    def stats(self):
+        return {name: connection.stats() for name, connection in self.connections.items()}
@@ -0,0 +1,75 @@
+"""
+Emisión de telemetría por cambios (deadband) para FlavourSense.
+
+El bucle principal envía una lectura por segundo aunque no cambie nada (ver `00.json`: 33.8, 33.82,
+33.79... con "No Selection"). `DeadbandFilter` decide, antes de `send_message`, si una lectura merece
+enviarse:
+
+   - un campo numérico (temperatura) se ha movido al menos su `delta` respecto al último valor enviado,
+   - un campo categórico (luz, joystick) ha cambiado de valor (delta 0), o
+   - ha pasado el intervalo de latido (`heartbeat`) desde el último envío, para que la nube sepa que el
+     dispositivo sigue vivo.
+
+Los campos que no aparecen en la configuración no se tienen en cuenta para decidir.
+"""
+
+import time
+
+# Delta por campo: cambio mínimo para enviar. 0 significa "cualquier cambio".
+DEFAULT_DEADBANDS = {
+    "temperature": 0.25,
+    "light": 0,
+    "joystick_action": 0,
+}
+DEFAULT_HEARTBEAT = 60  # Segundos
+
+
+class DeadbandFilter:
+    def __init__(self, deadbands=None, heartbeat=DEFAULT_HEARTBEAT, clock=time.monotonic):
+        self.deadbands = dict(DEFAULT_DEADBANDS if deadbands is None else deadbands)
+        self.heartbeat = heartbeat
+        self.clock = clock
+        self.last_sent = None
+        self.last_sent_at = None
+        self.emitted = 0
+        self.suppressed = 0
+
+    def check(self, sample):
+        """
+        Devuelve el motivo del envío ("first", "heartbeat" o el nombre del campo que ha cambiado),
+        o None si la lectura está dentro de la banda muerta.
+        """
+        if self.last_sent is None:
+            return "first"
+
+        for field, delta in self.deadbands.items():
+            value = sample.get(field)
+            previous = self.last_sent.get(field)
+            if isinstance(value, (int, float)) and isinstance(previous, (int, float)) and delta:
+                if abs(value - previous) >= delta:
+                    return field
+            elif value != previous:
+                return field
+
+        if self.heartbeat is not None and self.clock() - self.last_sent_at >= self.heartbeat:
+            return "heartbeat"
+        return None
+
+    def offer(self, sample):
+        """Registra la lectura si hay que enviarla. Devuelve el motivo o None si se descarta."""
+        reason = self.check(sample)
+        if reason is None:
+            self.suppressed += 1
+            return None
+        self.last_sent = dict(sample)
+        self.last_sent_at = self.clock()
+        self.emitted += 1
+        return reason
+
+    def stats(self):
+        total = self.emitted + self.suppressed
+        return {
+            "emitted": self.emitted,
+            "suppressed": self.suppressed,
+            "reduction": round(self.suppressed / total, 3) if total else 0.0,
+        }
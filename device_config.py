@@ -0,0 +1,110 @@
+"""
+Configuración y funciones comunes de los scripts del dispositivo (`mainprueba.py` y `main_async.py`).
+
+`main_async.py` importaba sus constantes y funciones de `mainprueba.py`, y con ello ejecutaba todo el
+arranque de ese script (backend de hardware, GPIO, cliente MQTT, caché de frames...). Este módulo no
+hace nada al importarlo: solo tiene constantes y funciones que reciben el hardware como argumento.
+
+También es común la tabla de comandos de Azure (`register_commands`), de modo que las dos versiones
+responden igual a cada comando.
+"""
+
+import random
+
+from hardware import get_speedup
+
+# Periodo de muestreo en segundos (a frecuencia fija, independiente de la latencia del envío)
+SAMPLE_PERIOD = 1.0 / get_speedup()
+
+# Formato de la telemetría: "json" o "struct" (binario), y compresión de los lotes: None, "gzip" o "deflate"
+TELEMETRY_ENCODING = "json"
+TELEMETRY_COMPRESSION = None
+
+# Modo lote: agrupa varias lecturas en un único mensaje a IoT Hub
+BATCH_MODE = False
+BATCH_MAX_SAMPLES = 10      # Envía al juntar este número de muestras...
+BATCH_MAX_WAIT_MS = 10000   # ...o al pasar este tiempo desde la primera
+
+# Comandos de Azure: hilos que ejecutan las acciones y máximo de grupos de comandos pendientes
+COMMAND_WORKERS = 2
+COMMAND_MAX_PENDING = 64
+
+# Frames de la matriz LED guardados en caché (notas × intensidades)
+FRAME_CACHE_SIZE = 32
+
+# Azure IoT Hub Connection String
+AUX_CONNECTION_STRING = "HostName=icaiiotflavoursense.azure-devices.net;DeviceId=SenseHat;SharedAccessKey=1zTmZeEfAeDwV7P7gf2ERKkiG1F/2mG79ou5RM8BYlA="
+
+# MQTT Broker Configuración
+MQTT_BROKER = "broker.hivemq.com"
+MQTT_PORT = 1883
+MQTT_TOPIC = "test-arduino"
+ARDUINO_WINDOW = 4  # Mensajes QoS 1 al Arduino en vuelo como máximo
+
+# Identificador de este arranque: `seq` vuelve a empezar en 1 cada vez que arranca el script, así que es
+# el par (boot, seq) el que identifica cada lectura (pérdidas y duplicados en `sequence_analysis.py`)
+BOOT_ID = random.SystemRandom().getrandbits(32)
+
+# MAP JOYSTICK INPUT TO WINE TYPE
+WINE_SELECTION = {
+    "up": "Red Wine",
+    "down": "White Wine",
+    "right": "Rosé Wine",
+}
+
+
+# LECTURA DE SENSORES
+def read_temperature(sense):
+    return round(sense.get_temperature(), 2)
+
+
+def read_light(sense):
+    humidity = sense.get_humidity()
+    return "Low Light" if humidity < 50 else "High Light"
+
+
+def get_joystick_action(event):
+    if event.direction in WINE_SELECTION:
+        return WINE_SELECTION[event.direction]
+    elif event.direction == "left":
+        return "Noise Detected"
+    return None
+
+
+def read_joystick(sense):
+    for event in sense.stick.get_events():
+        if event.action == "pressed":
+            action = get_joystick_action(event)
+            if action:
+                return action
+    return "No Selection"
+
+
+# COMANDOS DE AZURE
+def register_commands(dispatcher, set_fan, set_brightness):
+    """
+    Registra los comandos de Azure en un `command_dispatch.CommandDispatcher` y lo devuelve.
+    `set_fan(state)` recibe "ON" u "OFF"; `set_brightness(intensity)` vuelve a dibujar la nota actual.
+    """
+    def fan(state):
+        def handler(payload):
+            print(f"Command received: Fan {state}")
+            set_fan(state)
+        return handler
+
+    def brightness(command, intensity):
+        def handler(payload):
+            print(f"Command received: {command}")
+            set_brightness(intensity)
+        return handler
+
+    def temperature_low(payload):
+        print("Command received: Temperature Low - To be implemented.")
+
+    # Los comandos del mismo grupo se coalescen (solo se aplica el último pendiente)
+    dispatcher.register("Fan ON", fan("ON"), group="fan")
+    dispatcher.register("Fan OFF", fan("OFF"), group="fan")
+    dispatcher.register("Increase Brightness", brightness("Increase Brightness", 2), group="brightness")
+    dispatcher.register("Decrease Brightness", brightness("Decrease Brightness", 0.5), group="brightness")
+    dispatcher.register("Temperature Low", temperature_low, inline=True)
+    return dispatcher
@@ -0,0 +1,188 @@
+"""
+Seguimiento incremental de un directorio de exportaciones de IoT Hub, con checkpoint.
+
+El informe nocturno volvía a leer todo el histórico de exportaciones cada vez. `ExportFollower` guarda
+en un fichero de checkpoint (JSON) hasta qué byte se ha leído cada exportación y los agregados
+acumulados (por dispositivo y por dispositivo y ventana, los mismos que `export_ingest.py`). En cada
+pasada (`poll`):
+
+   - busca las exportaciones del directorio, también las que han aparecido desde la última vez,
+   - lee de cada una solo lo añadido desde su desplazamiento y lo suma a los agregados, de modo que el
+     coste de refrescar depende de los datos nuevos y no del histórico,
+   - solo consume líneas completas (la última, sin salto de línea, cuando ya es un JSON válido), así
+     que sirve con los ficheros que el enrutado a blobs aún está escribiendo,
+   - guarda desplazamientos y agregados juntos en el checkpoint (fichero temporal, `fsync` y
+     `os.replace`): si el proceso se corta a media pasada, la siguiente ejecución parte del último
+     checkpoint sin contar nada dos veces.
+
+Las exportaciones solo crecen; si un fichero se reemplaza (es más corto o cambian sus primeros bytes)
+se avisa y se vuelve a leer desde el principio, pero lo que ya se había sumado de él no se puede
+descontar. Con `--follow` las pasadas se repiten cada `--poll` segundos hasta Ctrl+C.
+
+Uso:
+    python3 export_follow.py exportaciones/ --checkpoint informe.ckpt --output resumen.json
+    python3 export_follow.py exportaciones/ --checkpoint informe.ckpt --follow --poll 30
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from export_index import HEAD_BYTES, INDEX_SUFFIX, complete_lines, head_digest
+from export_ingest import DEFAULT_WINDOW, IngestResult, aggregate_records
+from export_reader import AGGREGATE_FIELDS, DeviceAggregate, ExportReader, find_export_files
+
+CHECKPOINT_VERSION = 1
+DEFAULT_POLL = 30.0
+
+
+class ExportFollower:
+    def __init__(self, paths, checkpoint_path, window=DEFAULT_WINDOW, devices=None):
+        self.paths = paths
+        self.checkpoint_path = checkpoint_path
+        self.window = window
+        self.devices = sorted(devices) if devices else None
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.files = {}  # ruta -> {"offset": bytes leídos, "head": sha1 de los primeros bytes}
+        self.result = IngestResult(self.window)
+        self.replaced = 0
+        self._changed = False
+
+    def load(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as checkpoint_file:
+                data = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != CHECKPOINT_VERSION:
+            return False
+        if data["window"] != self.window or data["devices"] != self.devices:
+            print(f"El checkpoint {self.checkpoint_path} es de otra ventana o de otros dispositivos; "
+                  f"se empieza de cero", file=sys.stderr)
+            return False
+        self.files = data["files"]
+        self.replaced = data.get("replaced", 0)
+        self.result.reading = data["reading"]
+        self.result.devices = {device_id: DeviceAggregate.from_state(state)
+                               for device_id, state in data["aggregates"]}
+        self.result.windows = {(device_id, start): DeviceAggregate.from_state(state)
+                               for device_id, start, state in data["windows"]}
+        return True
+
+    def save(self):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump({
+                "version": CHECKPOINT_VERSION,
+                "window": self.window,
+                "devices": self.devices,
+                "files": self.files,
+                "replaced": self.replaced,
+                "reading": self.result.reading,
+                "aggregates": [[device_id, aggregate.to_state()]
+                               for device_id, aggregate in self.result.devices.items()],
+                "windows": [[device_id, start, aggregate.to_state()]
+                            for (device_id, start), aggregate in self.result.windows.items()],
+            }, checkpoint_file, separators=(",", ":"))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def poll(self):
+        """Lee lo añadido a las exportaciones desde la última pasada. Devuelve los bytes leídos."""
+        reader = ExportReader(AGGREGATE_FIELDS, devices=self.devices)
+        read = 0
+        for path in find_export_files(self.paths):
+            if path.endswith(INDEX_SUFFIX):
+                continue
+            read += self._read_new(path, reader)
+        if read or self._changed:
+            for name, value in reader.stats().items():
+                self.result.reading[name] = self.result.reading.get(name, 0) + value
+            self.save()
+            self._changed = False
+        return read
+
+    def _read_new(self, path, reader):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return 0  # Borrado entre el listado y la lectura
+        state = self.files.get(path)
+        offset = state["offset"] if state else 0
+        if offset and (size < offset or head_digest(path, min(offset, HEAD_BYTES)) != state["head"]):
+            print(f"{path} se ha reemplazado; se vuelve a leer desde el principio", file=sys.stderr)
+            self.replaced += 1
+            self.files[path] = state = {"offset": 0, "head": None}
+            self._changed = True
+            offset = 0
+        if size == offset:
+            return 0
+
+        position = [offset]
+        with open(path, "rb") as export_file:
+            export_file.seek(offset)
+            aggregate_records(reader.records_from(complete_lines(export_file, position)), self.window,
+                              self.result.devices, self.result.windows)
+        end = position[0]
+        if end == offset:
+            return 0
+        if state is None or offset < HEAD_BYTES:
+            head = head_digest(path, min(end, HEAD_BYTES))
+        else:
+            head = state["head"]
+        self.files[path] = {"offset": end, "head": head}
+        return end - offset
+
+    def summary(self):
+        self.result.files = len(self.files)
+        self.result.bytes = sum(state["offset"] for state in self.files.values())
+        summary = self.result.summary()
+        summary["replaced"] = self.replaced
+        return summary
+
+
+def write_summary(summary, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as output_file:
+        json.dump(summary, output_file, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seguimiento incremental de exportaciones de IoT Hub")
+    parser.add_argument("paths", nargs="+", help="Ficheros de exportación o directorios")
+    parser.add_argument("--checkpoint", required=True, help="Fichero de checkpoint (se crea si no existe)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Segundos por ventana de agregación")
+    parser.add_argument("--device", action="append", help="Solo este dispositivo (se puede repetir)")
+    parser.add_argument("--output", help="Fichero JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--follow", action="store_true", help="Repetir las pasadas hasta Ctrl+C")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL, help="Segundos entre pasadas con --follow")
+    args = parser.parse_args()
+
+    follower = ExportFollower(args.paths, args.checkpoint, args.window, args.device)
+    try:
+        while True:
+            started = time.monotonic()
+            read = follower.poll()
+            elapsed = time.monotonic() - started
+            print(f"Pasada: {read / 1e6:.2f} MB nuevos en {elapsed:.2f} s, "
+                  f"{len(follower.files)} ficheros", file=sys.stderr)
+            if args.output and (read or not os.path.exists(args.output)):
+                write_summary(follower.summary(), args.output)
+            if not args.follow:
+                break
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        pass
+    if not args.output:
+        print(json.dumps(follower.summary(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
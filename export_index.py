@@ -0,0 +1,355 @@
+"""
+Índice de intervalos de tiempo para las exportaciones de blobs de IoT Hub.
+
+Para responder "qué pasó en el local X entre las 20:00 y las 21:00" había que leer todas las
+exportaciones línea a línea. `ExportIndex` guarda junto a cada exportación un índice (`00.json.idx`,
+JSON) con:
+
+   - por dispositivo: la primera y la última hora de encolado y el número de mensajes, para descartar
+     ficheros enteros,
+   - bloques de líneas consecutivas: se empieza un bloque nuevo cada `interval` segundos de hora de
+     encolado (o cada `max_block_bytes`). Cada bloque es `[inicio, fin, ventana, mínimo, máximo,
+     dispositivos, mensajes]`: los desplazamientos en bytes, el inicio de su intervalo, la hora mínima y
+     máxima (unidades de 100 ns) y los códigos de los dispositivos que aparecen.
+
+Como cada bloque guarda su mínimo y su máximo, el índice sirve aunque las horas no estén ordenadas.
+`read_range` abre el índice de cada fichero, salta los ficheros y bloques que no se solapan con el
+intervalo o no tienen los dispositivos pedidos, y lee solo los bytes de los bloques restantes (juntando
+los contiguos) con `export_reader.ExportReader`, en trozos de `READ_CHUNK_BYTES` para que la memoria no
+dependa del tamaño del intervalo.
+
+El índice se construye de forma incremental: si la exportación ha crecido desde la última vez solo se
+leen los bytes nuevos, continuando el último bloque. Solo se indexan líneas completas (la última, que
+no lleva salto de línea, cuando ya es un JSON válido), de modo que sirve también con ficheros que aún se
+están escribiendo. Si el fichero se ha reemplazado (es más corto
+o cambian sus primeros bytes) se reconstruye.
+
+Uso:
+    python3 export_index.py build exportaciones/
+    python3 export_index.py query exportaciones/ --start 2024-11-26T20:00:00Z --end 2024-11-26T21:00:00Z --device SenseHat
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from export_reader import (
+    AGGREGATE_FIELDS,
+    ENQUEUED_FIELD,
+    TICKS_PER_SECOND,
+    ExportReader,
+    aggregate_by_device,
+    enqueued_ticks,
+    find_export_files,
+    read_envelope,
+    summarize_devices,
+    to_ticks,
+)
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+DEFAULT_INTERVAL = 60            # Segundos de hora de encolado por bloque
+DEFAULT_MAX_BLOCK_BYTES = 256 * 1024
+HEAD_BYTES = 4096                # Bytes del principio del fichero con los que se detecta un reemplazo
+READ_CHUNK_BYTES = 1024 * 1024   # Lectura de los rangos por trozos: memoria acotada con rangos grandes
+
+# Posiciones de cada bloque en la lista
+BLOCK_START, BLOCK_END, BLOCK_WINDOW, BLOCK_MIN, BLOCK_MAX, BLOCK_DEVICES, BLOCK_MESSAGES = range(7)
+
+
+def head_digest(path, length):
+    with open(path, "rb") as export_file:
+        return hashlib.sha1(export_file.read(length)).hexdigest()
+
+
+def is_complete_record(line):
+    """La última línea de una exportación cerrada no lleva salto de línea; una a medio escribir no es JSON válido."""
+    try:
+        json.loads(line)
+    except ValueError:
+        return False
+    return True
+
+
+def complete_lines(export_file, position):
+    """Líneas completas desde la posición actual del fichero; `position[0]` avanza con cada una."""
+    for line in export_file:
+        if not line.endswith(b"\n") and not is_complete_record(line):
+            return  # Línea a medio escribir: se leerá la próxima vez
+        position[0] += len(line)
+        yield line
+
+
+class ExportIndex:
+    def __init__(self, path, interval=DEFAULT_INTERVAL, max_block_bytes=DEFAULT_MAX_BLOCK_BYTES):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.interval = interval
+        self.max_block_bytes = max_block_bytes
+        self._reset()
+
+    def _reset(self):
+        self.size = 0          # Bytes indexados (hasta el último salto de línea)
+        self.head = None
+        self.devices = []      # Código -> dispositivo
+        self.device_ranges = {}  # dispositivo -> [mínimo, máximo, mensajes]
+        self.blocks = []
+        self.malformed = 0
+
+    @classmethod
+    def open(cls, path, interval=DEFAULT_INTERVAL, max_block_bytes=DEFAULT_MAX_BLOCK_BYTES):
+        """Carga el índice de `path` y lo pone al día con lo que se haya añadido al fichero."""
+        index = cls(path, interval, max_block_bytes)
+        index.load()
+        index.update()
+        return index
+
+    def load(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != INDEX_VERSION:
+            return False
+        self.interval = data["interval"]
+        self.size = data["size"]
+        self.head = data["head"]
+        self.devices = data["devices"]
+        self.device_ranges = data["device_ranges"]
+        self.blocks = data["blocks"]
+        self.malformed = data.get("malformed", 0)
+        return True
+
+    def save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            json.dump({
+                "version": INDEX_VERSION,
+                "interval": self.interval,
+                "size": self.size,
+                "head": self.head,
+                "devices": self.devices,
+                "device_ranges": self.device_ranges,
+                "blocks": self.blocks,
+                "malformed": self.malformed,
+            }, index_file, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def update(self):
+        """Indexa las líneas completas añadidas desde la última vez. Devuelve los bytes leídos."""
+        size = os.path.getsize(self.path)
+        if size < self.size or (self.size and head_digest(self.path, min(self.size, HEAD_BYTES)) != self.head):
+            self._reset()  # El fichero se ha reemplazado: se reconstruye
+        if size == self.size:
+            return 0
+
+        interval_ticks = int(self.interval * TICKS_PER_SECOND)
+        device_codes = {device_id: code for code, device_id in enumerate(self.devices)}
+        block = self.blocks[-1] if self.blocks else None
+        block_devices = set(block[BLOCK_DEVICES]) if block else set()
+        offset = self.size
+        with open(self.path, "rb") as export_file:
+            export_file.seek(offset)
+            for line in export_file:
+                if not line.endswith(b"\n") and not is_complete_record(line):
+                    break  # Línea a medio escribir: se indexará en la próxima actualización
+                line_start = offset
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    device_id, enqueued = read_envelope(line)
+                    ticks = enqueued_ticks(enqueued)
+                except (ValueError, KeyError, TypeError):
+                    self.malformed += 1
+                    continue
+
+                code = device_codes.get(device_id)
+                if code is None:
+                    code = device_codes[device_id] = len(self.devices)
+                    self.devices.append(device_id)
+                device_range = self.device_ranges.get(device_id)
+                if device_range is None:
+                    self.device_ranges[device_id] = [ticks, ticks, 1]
+                else:
+                    device_range[0] = min(device_range[0], ticks)
+                    device_range[1] = max(device_range[1], ticks)
+                    device_range[2] += 1
+
+                if (block is None or ticks >= block[BLOCK_WINDOW] + interval_ticks
+                        or line_start - block[BLOCK_START] >= self.max_block_bytes):
+                    block = [line_start, offset, ticks - ticks % interval_ticks, ticks, ticks, [], 0]
+                    block_devices = set()
+                    self.blocks.append(block)
+                block[BLOCK_END] = offset
+                block[BLOCK_MIN] = min(block[BLOCK_MIN], ticks)
+                block[BLOCK_MAX] = max(block[BLOCK_MAX], ticks)
+                block[BLOCK_MESSAGES] += 1
+                if code not in block_devices:
+                    block_devices.add(code)
+                    block[BLOCK_DEVICES] = sorted(block_devices)
+
+        scanned = offset - self.size
+        if scanned:
+            if self.size < HEAD_BYTES:
+                self.head = head_digest(self.path, min(offset, HEAD_BYTES))
+            self.size = offset
+            self.save()
+        return scanned
+
+    def overlaps(self, start=None, end=None, devices=None):
+        """Si algún dispositivo pedido tiene mensajes en [start, end) según los rangos del fichero."""
+        for device_id, (first, last, _) in self.device_ranges.items():
+            if devices is not None and device_id not in devices:
+                continue
+            if (end is None or first < end) and (start is None or last >= start):
+                return True
+        return False
+
+    def ranges(self, start=None, end=None, devices=None):
+        """Rangos de bytes [inicio, fin) que pueden contener mensajes del intervalo y los dispositivos."""
+        codes = None
+        if devices is not None:
+            codes = {code for code, device_id in enumerate(self.devices) if device_id in devices}
+        ranges = []
+        for block in self.blocks:
+            if end is not None and block[BLOCK_MIN] >= end:
+                continue
+            if start is not None and block[BLOCK_MAX] < start:
+                continue
+            if codes is not None and not codes.intersection(block[BLOCK_DEVICES]):
+                continue
+            if ranges and ranges[-1][1] == block[BLOCK_START]:
+                ranges[-1][1] = block[BLOCK_END]  # Bloques contiguos: una sola lectura
+            else:
+                ranges.append([block[BLOCK_START], block[BLOCK_END]])
+        return ranges
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "devices": len(self.devices),
+            "blocks": len(self.blocks),
+            "malformed": self.malformed,
+        }
+
+
+class RangeReader:
+    """Lee de varias exportaciones solo los mensajes de un intervalo, usando los índices."""
+
+    def __init__(self, start=None, end=None, devices=None, fields=None):
+        self.start = to_ticks(start)
+        self.end = to_ticks(end)
+        self.devices = set(devices) if devices else None
+        self.keep_enqueued = fields is None or ENQUEUED_FIELD in fields
+        if fields is not None and ENQUEUED_FIELD not in fields:
+            fields = list(fields) + [ENQUEUED_FIELD]  # Hace falta para el filtro exacto por hora
+        self.reader = ExportReader(fields, devices=self.devices)
+        self.files = 0
+        self.files_skipped = 0
+        self.bytes_total = 0
+        self.bytes_read = 0
+        self.indexed_bytes = 0
+
+    def read(self, paths):
+        for path in find_export_files(paths):
+            if path.endswith(INDEX_SUFFIX):
+                continue
+            index = ExportIndex(path)
+            index.load()
+            self.indexed_bytes += index.update()
+            self.files += 1
+            self.bytes_total += index.size
+            if not index.overlaps(self.start, self.end, self.devices):
+                self.files_skipped += 1
+                continue
+            yield from self._read_ranges(path, index.ranges(self.start, self.end, self.devices))
+
+    def _read_ranges(self, path, ranges):
+        start, end = self.start, self.end
+        with open(path, "rb") as export_file:
+            for range_start, range_end in ranges:
+                for record in self.reader.records_from(self._range_lines(export_file, range_start, range_end)):
+                    ticks = enqueued_ticks(record[ENQUEUED_FIELD])
+                    if (start is not None and ticks < start) or (end is not None and ticks >= end):
+                        continue
+                    if not self.keep_enqueued:
+                        del record[ENQUEUED_FIELD]
+                    yield record
+
+    def _range_lines(self, export_file, range_start, range_end):
+        """Líneas de [range_start, range_end), leídas en trozos de `READ_CHUNK_BYTES`."""
+        export_file.seek(range_start)
+        remaining = range_end - range_start
+        tail = b""
+        while remaining > 0:
+            chunk = export_file.read(min(READ_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            self.bytes_read += len(chunk)
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()  # Línea cortada al final del trozo: sigue en el siguiente
+            yield from lines
+        if tail:
+            yield tail
+
+    def stats(self):
+        return {
+            "files": self.files,
+            "files_skipped": self.files_skipped,
+            "bytes_total": self.bytes_total,
+            "bytes_read": self.bytes_read,
+            "bytes_indexed_now": self.indexed_bytes,
+            "reading": self.reader.stats(),
+        }
+
+
+def read_range(paths, start=None, end=None, devices=None, fields=None):
+    return RangeReader(start, end, devices, fields).read(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índices de tiempo de las exportaciones de IoT Hub")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Crea o pone al día los índices")
+    build_parser.add_argument("paths", nargs="+", help="Ficheros de exportación o directorios")
+    build_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                              help="Segundos por bloque (solo para índices nuevos)")
+
+    query_parser = commands.add_parser("query", help="Mensajes de un intervalo")
+    query_parser.add_argument("paths", nargs="+", help="Ficheros de exportación o directorios")
+    query_parser.add_argument("--start", help="Hora inicial ISO 8601 (incluida)")
+    query_parser.add_argument("--end", help="Hora final ISO 8601 (excluida)")
+    query_parser.add_argument("--device", action="append", help="Solo este dispositivo (se puede repetir)")
+    query_parser.add_argument("--fields", help="Campos separados por comas (por defecto, todos)")
+    query_parser.add_argument("--aggregate", action="store_true", help="Resumen por dispositivo")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for path in find_export_files(args.paths):
+            if path.endswith(INDEX_SUFFIX):
+                continue
+            index = ExportIndex(path, interval=args.interval)
+            index.load()
+            scanned = index.update()
+            print(f"{path}: {scanned} bytes nuevos, {index.stats()}")
+        return
+
+    fields = AGGREGATE_FIELDS if args.aggregate else (args.fields.split(",") if args.fields else None)
+    reader = RangeReader(args.start, args.end, args.device, fields)
+    if args.aggregate:
+        print(json.dumps(summarize_devices(aggregate_by_device(reader.read(args.paths))), indent=2,
+                         ensure_ascii=False))
+    else:
+        for record in reader.read(args.paths):
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Lectura: {reader.stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
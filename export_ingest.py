@@ -0,0 +1,197 @@
+"""
+Ingesta en paralelo de directorios de exportaciones de IoT Hub.
+
+El enrutado a blobs escribe un fichero por partición y ventana de tiempo (como `00.json`), así que un mes
+de un hub son miles de ficheros. `run_ingest` reparte los ficheros entre un pool de procesos; cada
+proceso lee su fichero con `export_reader.ExportReader` y devuelve agregados parciales:
+
+   - por dispositivo (`DeviceAggregate`),
+   - por dispositivo y ventana de tiempo de encolado (`--window` segundos, una hora por defecto).
+
+El proceso principal suma los parciales (`DeviceAggregate.merge`). Para que el resultado sea idéntico con
+cualquier número de procesos, los parciales se suman siempre en el orden de los ficheros (los que llegan
+antes de tiempo esperan en un diccionario), aunque los ficheros se repartan de mayor a menor para
+equilibrar la carga. Cada fichero es independiente, así que el tiempo escala casi linealmente con los
+núcleos hasta que manda el disco. El progreso (ficheros, MB y MB/s) se muestra en stderr.
+
+Uso:
+    python3 export_ingest.py exportaciones/ --processes 8 --window 3600 --output resumen.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from export_reader import (
+    AGGREGATE_FIELDS,
+    DEVICE_FIELD,
+    ENQUEUED_EPOCH_FIELD,
+    DeviceAggregate,
+    ExportReader,
+    find_export_files,
+    format_enqueued_time,
+)
+
+DEFAULT_WINDOW = 3600
+PROGRESS_PERIOD = 1.0
+
+
+def aggregate_records(records, window, per_device, per_window):
+    """Suma los registros a los agregados por dispositivo y por (dispositivo, inicio de ventana)."""
+    for record in records:
+        device_id = record[DEVICE_FIELD]
+        aggregate = per_device.get(device_id)
+        if aggregate is None:
+            aggregate = per_device[device_id] = DeviceAggregate()
+        aggregate.add(record)
+        key = (device_id, int(record[ENQUEUED_EPOCH_FIELD] // window * window))
+        aggregate = per_window.get(key)
+        if aggregate is None:
+            aggregate = per_window[key] = DeviceAggregate()
+        aggregate.add(record)
+
+
+def ingest_file(task):
+    """Agregados de un fichero. Se ejecuta en los procesos del pool."""
+    index, path, window, devices = task
+    cpu_start = time.process_time()
+    reader = ExportReader(AGGREGATE_FIELDS, devices=devices)
+    per_device = {}
+    per_window = {}
+    aggregate_records(reader.read(path), window, per_device, per_window)
+    return index, {
+        "bytes": os.path.getsize(path),
+        "devices": per_device,
+        "windows": per_window,
+        "reading": reader.stats(),
+        "cpu_s": time.process_time() - cpu_start,
+    }
+
+
+class IngestResult:
+    def __init__(self, window):
+        self.window = window
+        self.devices = {}
+        self.windows = {}
+        self.files = 0
+        self.bytes = 0
+        self.cpu = 0.0
+        self.reading = {}
+
+    def merge(self, partial):
+        for target, source in ((self.devices, partial["devices"]), (self.windows, partial["windows"])):
+            for key, aggregate in source.items():
+                if key in target:
+                    target[key].merge(aggregate)
+                else:
+                    target[key] = aggregate
+        for name, value in partial["reading"].items():
+            self.reading[name] = self.reading.get(name, 0) + value
+        self.files += 1
+        self.bytes += partial["bytes"]
+        self.cpu += partial["cpu_s"]
+
+    def summary(self):
+        """Resultado determinista: dispositivos y ventanas en orden."""
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "reading": self.reading,
+            "window_s": self.window,
+            "devices": {device_id: self.devices[device_id].summary() for device_id in sorted(self.devices, key=str)},
+            "windows": [
+                dict(device_id=device_id, window_start=format_enqueued_time(start), **self.windows[device_id, start].summary())
+                for device_id, start in sorted(self.windows, key=lambda key: (str(key[0]), key[1]))
+            ],
+        }
+
+
+class Progress:
+    def __init__(self, total_files, total_bytes, output=sys.stderr, period=PROGRESS_PERIOD):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.output = output
+        self.period = period
+        self.started = time.monotonic()
+        self._last = 0.0
+
+    def update(self, files, done_bytes, final=False):
+        now = time.monotonic()
+        if not final and now - self._last < self.period:
+            return
+        self._last = now
+        elapsed = now - self.started
+        rate = done_bytes / elapsed / 1e6 if elapsed else 0.0
+        print(f"[{files}/{self.total_files}] {done_bytes / 1e6:.1f}/{self.total_bytes / 1e6:.1f} MB, "
+              f"{rate:.1f} MB/s", file=self.output, flush=True)
+
+
+def run_ingest(paths, processes=None, window=DEFAULT_WINDOW, devices=None, progress=True):
+    files = find_export_files(paths)
+    sizes = [os.path.getsize(path) for path in files]
+    # Los ficheros grandes primero, para que ningún proceso se quede con uno grande al final
+    tasks = [(index, files[index], window, devices)
+             for index in sorted(range(len(files)), key=lambda index: (-sizes[index], index))]
+    processes = max(1, min(processes or os.cpu_count() or 1, len(files) or 1))
+    result = IngestResult(window)
+    reporter = Progress(len(files), sum(sizes)) if progress else None
+
+    pending = {}
+    next_index = 0
+    completed = 0
+    completed_bytes = 0
+    started = time.monotonic()
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        partials = pool.imap_unordered(ingest_file, tasks) if pool else map(ingest_file, tasks)
+        for index, partial in partials:
+            completed += 1
+            completed_bytes += partial["bytes"]
+            pending[index] = partial
+            while next_index in pending:
+                result.merge(pending.pop(next_index))
+                next_index += 1
+            if reporter:
+                reporter.update(completed, completed_bytes)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    elapsed = time.monotonic() - started
+    if reporter:
+        reporter.update(result.files, result.bytes, final=True)
+
+    run = {
+        "processes": processes,
+        "elapsed_s": round(elapsed, 3),
+        "cpu_s": round(result.cpu, 3),
+        "mb_per_s": round(result.bytes / elapsed / 1e6, 2) if elapsed else None,
+    }
+    return result, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta en paralelo de exportaciones de IoT Hub")
+    parser.add_argument("paths", nargs="+", help="Ficheros de exportación o directorios")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Segundos por ventana de agregación")
+    parser.add_argument("--device", action="append", help="Solo este dispositivo (se puede repetir)")
+    parser.add_argument("--output", help="Fichero JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--quiet", action="store_true", help="Sin progreso en stderr")
+    args = parser.parse_args()
+
+    result, run = run_ingest(args.paths, args.processes, args.window, args.device, progress=not args.quiet)
+    output = json.dumps(result.summary(), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    print(f"Ingesta: {run}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
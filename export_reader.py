@@ -0,0 +1,439 @@
+"""
+Lector en streaming de las exportaciones de blobs de IoT Hub (como `00.json`).
+
+Cada línea de una exportación es un registro con `EnqueuedTimeUtc`, `Properties`, `SystemProperties` y
+el cuerpo del mensaje en `Body`. `telemetry_batch.py` decodifica cada línea completa con `json.loads`,
+lo que con muchos gigabytes de exportaciones es lento. `ExportReader`:
+
+   - lee los ficheros línea a línea en binario, sin cargarlos en memoria,
+   - extrae el dispositivo, la hora de encolado y el formato del cuerpo buscando sus claves en la línea,
+     sin decodificar el sobre JSON entero; solo decodifica el objeto `Body` si se piden campos del
+     cuerpo, y no lo hace para los dispositivos descartados con `devices`,
+   - expande los lotes (`telemetry_codec.py`) en una fila por muestra,
+   - convierte `EnqueuedTimeUtc` (fracciones de 7 dígitos, "2024-11-26T17:00:26.7580000Z") cortando la
+     cadena por posiciones y reutilizando el inicio de cada minuto (`enqueued_ticks`), unas 6 veces más
+     rápido que `datetime.strptime`.
+
+Los campos disponibles son `device_id`, `enqueued_time_utc` (la cadena original), `enqueued` (segundos
+epoch) y cualquier campo del cuerpo (`temperature`, `light`, `joystick_action`, `seq`, `ts`...). Sin
+`fields` se devuelven todos. Si no se pide ningún campo del cuerpo, se produce un registro por mensaje.
+
+`DeviceAggregate` acumula en una sola pasada, con memoria constante por dispositivo, el número de
+muestras, la primera y la última hora de encolado, la temperatura mínima, máxima y media, y los
+recuentos de luz y de joystick. `to_state` y `from_state` lo guardan y lo recuperan de los checkpoints
+de `export_follow.py`, que sigue un directorio de exportaciones leyendo solo lo añadido desde la última
+vez.
+
+Uso:
+    python3 export_reader.py 00.json
+    python3 export_reader.py exportaciones/ --fields device_id,enqueued,temperature --csv
+    python3 export_reader.py exportaciones/ --device SenseHat --aggregate
+"""
+
+import argparse
+import calendar
+import collections
+import csv
+import datetime
+import json
+import math
+import os
+import re
+import sys
+
+from telemetry_codec import decode_body
+
+DEVICE_FIELD = "device_id"
+ENQUEUED_FIELD = "enqueued_time_utc"
+ENQUEUED_EPOCH_FIELD = "enqueued"
+ENVELOPE_FIELDS = (DEVICE_FIELD, ENQUEUED_FIELD, ENQUEUED_EPOCH_FIELD)
+
+TICKS_PER_SECOND = 10 ** 7  # EnqueuedTimeUtc tiene resolución de 100 ns
+
+# Claves del sobre que se buscan sin decodificar el JSON (las de `connectionAuthMethod` van escapadas)
+_ENQUEUED_KEY = b'"EnqueuedTimeUtc":"'
+_DEVICE_KEY = b'"connectionDeviceId":"'
+_CONTENT_TYPE_KEY = b'"contentType":"'
+_CONTENT_ENCODING_KEY = b'"contentEncoding":"'
+_BODY_KEY = b'"Body":'
+
+_TIMESTAMP = re.compile(
+    r"(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:\.(\d+))?(Z|[+-]\d\d:?\d\d)?$"
+)
+_MINUTE_CACHE_SIZE = 4096
+_minute_starts = {}
+_body_decoder = json.JSONDecoder()
+
+
+# HORA DE ENCOLADO
+def _minute_start(minute):
+    """Segundos epoch de "AAAA-MM-DDTHH:MM"; las horas de una exportación repiten el mismo minuto."""
+    start = _minute_starts.get(minute)
+    if start is None:
+        start = calendar.timegm((int(minute[0:4]), int(minute[5:7]), int(minute[8:10]),
+                                 int(minute[11:13]), int(minute[14:16]), 0))
+        if len(_minute_starts) >= _MINUTE_CACHE_SIZE:
+            _minute_starts.clear()
+        _minute_starts[minute] = start
+    return start
+
+
+def _fraction_ticks(fraction):
+    return int((fraction + "0000000")[:7]) if fraction else 0
+
+
+def enqueued_ticks(text):
+    """Hora ISO 8601 (UTC con "Z" o con desfase) → unidades de 100 ns desde epoch, sin pérdida de precisión."""
+    # Camino rápido: "AAAA-MM-DDTHH:MM:SS[.fffffff]Z"
+    if len(text) >= 20 and text[10] == "T" and text[-1] == "Z" and (len(text) == 20 or text[19] == "."):
+        minute = _minute_starts.get(text[:16])
+        if minute is None:
+            minute = _minute_start(text[:16])
+        ticks = (minute + int(text[17:19])) * TICKS_PER_SECOND
+        if len(text) == 28:
+            return ticks + int(text[20:27])  # 7 decimales, el formato de IoT Hub
+        return ticks + _fraction_ticks(text[20:-1])
+
+    match = _TIMESTAMP.match(text)
+    if match is None:
+        raise ValueError(f"Hora no reconocida: {text!r}")
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    seconds = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    if zone and zone != "Z":
+        sign = -1 if zone[0] == "-" else 1
+        digits = zone[1:].replace(":", "")
+        seconds -= sign * (int(digits[:2]) * 3600 + int(digits[2:]) * 60)
+    return seconds * TICKS_PER_SECOND + _fraction_ticks(fraction)
+
+
+def parse_enqueued_time(text):
+    """Hora ISO 8601 → segundos epoch (float)."""
+    return enqueued_ticks(text) / TICKS_PER_SECOND
+
+
+def to_ticks(value):
+    """Hora ISO 8601 o segundos epoch → unidades de 100 ns (None se queda en None)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return enqueued_ticks(value)
+    return int(round(value * TICKS_PER_SECOND))
+
+
+def format_enqueued_time(epoch):
+    moment = datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+# LECTURA
+def _string_value(line, key, end):
+    start = line.find(key, 0, end)
+    if start < 0:
+        return None
+    start += len(key)
+    return line[start:line.index(b'"', start)].decode("utf-8")
+
+
+def read_envelope(line):
+    """(dispositivo, EnqueuedTimeUtc) de una línea de exportación en bytes, sin decodificar el cuerpo."""
+    body_start = line.find(_BODY_KEY)
+    enqueued_start = line.find(_ENQUEUED_KEY, 0, body_start)
+    device_start = line.find(_DEVICE_KEY, 0, body_start)
+    if body_start < 0 or enqueued_start < 0 or device_start < 0:
+        record = json.loads(line)
+        return record.get("SystemProperties", {}).get("connectionDeviceId"), record["EnqueuedTimeUtc"]
+    device_start += len(_DEVICE_KEY)
+    enqueued_start += len(_ENQUEUED_KEY)
+    return (line[device_start:line.index(b'"', device_start)].decode("utf-8"),
+            line[enqueued_start:line.index(b'"', enqueued_start)].decode("ascii"))
+
+
+def find_export_files(paths):
+    """Ficheros de exportación (*.json) de las rutas indicadas; los directorios se recorren en orden."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(".json"))
+        else:
+            files.append(path)
+    return files
+
+
+class ExportReader:
+    def __init__(self, fields=None, devices=None):
+        self.fields = tuple(fields) if fields else None
+        self.devices = set(devices) if devices else None
+        self.body_fields = None if self.fields is None else tuple(
+            field for field in self.fields if field not in ENVELOPE_FIELDS)
+        self.want_body = self.body_fields is None or bool(self.body_fields)
+        self._envelope_fields = tuple(field for field in ENVELOPE_FIELDS if self.fields is None or field in self.fields)
+        self.lines = 0
+        self.messages = 0
+        self.records = 0
+        self.skipped = 0
+        self.malformed = 0
+
+    def read(self, path):
+        with open(path, "rb") as export_file:
+            yield from self.records_from(export_file)
+
+    def read_all(self, paths):
+        for path in find_export_files(paths):
+            yield from self.read(path)
+
+    def records_from(self, lines):
+        """Registros de un iterable de líneas (bytes o str) de una exportación."""
+        for line in lines:
+            self.lines += 1
+            if isinstance(line, str):
+                line = line.encode("utf-8")
+            if not line.strip():
+                continue
+            try:
+                records = self._parse_line(line)
+            except (ValueError, KeyError, TypeError):
+                self.malformed += 1
+                continue
+            if records is None:
+                self.skipped += 1
+                continue
+            self.messages += 1
+            for record in records:
+                self.records += 1
+                yield record
+
+    def _parse_line(self, line):
+        # Búsquedas de subcadenas (en C) en lugar de decodificar todo el sobre
+        body_start = line.find(_BODY_KEY)
+        enqueued_start = line.find(_ENQUEUED_KEY, 0, body_start)
+        device_start = line.find(_DEVICE_KEY, 0, body_start)
+        if body_start < 0 or enqueued_start < 0 or device_start < 0:
+            return self._parse_envelope(json.loads(line))
+        device_start += len(_DEVICE_KEY)
+        device_id = line[device_start:line.index(b'"', device_start)].decode("utf-8")
+        if self.devices is not None and device_id not in self.devices:
+            return None
+        enqueued_start += len(_ENQUEUED_KEY)
+        envelope = self._envelope(device_id, line[enqueued_start:line.index(b'"', enqueued_start)].decode("ascii"))
+        if not self.want_body:
+            return [envelope]
+
+        text = line[body_start + len(_BODY_KEY):].decode("utf-8")
+        try:
+            body, _ = _body_decoder.raw_decode(text)  # Solo el valor de `Body`, no el resto de la línea
+        except ValueError:
+            body, _ = _body_decoder.raw_decode(text.lstrip())
+        if isinstance(body, dict) and "rows" not in body:
+            return self._single(envelope, body)
+        return self._expand(envelope, body, _string_value(line, _CONTENT_TYPE_KEY, body_start),
+                            _string_value(line, _CONTENT_ENCODING_KEY, body_start))
+
+    def _parse_envelope(self, record):
+        """Camino lento: el registro no tiene la forma compacta habitual y se decodifica entero."""
+        system_properties = record.get("SystemProperties", {})
+        device_id = system_properties.get("connectionDeviceId")
+        if self.devices is not None and device_id not in self.devices:
+            return None
+        envelope = self._envelope(device_id, record["EnqueuedTimeUtc"])
+        if not self.want_body:
+            return [envelope]
+        return self._expand(envelope, record["Body"], system_properties.get("contentType"),
+                            system_properties.get("contentEncoding"))
+
+    def _envelope(self, device_id, enqueued):
+        envelope = {}
+        for field in self._envelope_fields:
+            if field == DEVICE_FIELD:
+                envelope[field] = device_id
+            elif field == ENQUEUED_FIELD:
+                envelope[field] = enqueued
+            else:
+                envelope[field] = enqueued_ticks(enqueued) / TICKS_PER_SECOND
+        return envelope
+
+    def _single(self, envelope, body):
+        """Mensaje de una sola lectura (el formato habitual)."""
+        if self.body_fields is None:
+            envelope.update(body)
+        else:
+            for field in self.body_fields:
+                envelope[field] = body.get(field)
+        return [envelope]
+
+    def _expand(self, envelope, body, content_type, content_encoding):
+        if isinstance(body, dict) and "rows" not in body:
+            return self._single(envelope, body)
+        samples = decode_body(body, content_type, content_encoding)
+        records = []
+        for sample in samples:
+            record = dict(envelope)
+            if self.body_fields is None:
+                record.update(sample)
+            else:
+                for field in self.body_fields:
+                    record[field] = sample.get(field)
+            records.append(record)
+        return records
+
+    def stats(self):
+        return {
+            "lines": self.lines,
+            "messages": self.messages,
+            "records": self.records,
+            "skipped": self.skipped,
+            "malformed": self.malformed,
+        }
+
+
+# AGREGADOS POR DISPOSITIVO
+class DeviceAggregate:
+    __slots__ = ("count", "first", "last", "temperature_count", "temperature_sum", "temperature_min",
+                 "temperature_max", "light", "joystick")
+
+    def __init__(self):
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.temperature_count = 0
+        self.temperature_sum = 0.0
+        self.temperature_min = math.inf
+        self.temperature_max = -math.inf
+        self.light = collections.Counter()
+        self.joystick = collections.Counter()
+
+    def add(self, record):
+        self.count += 1
+        enqueued = record.get(ENQUEUED_EPOCH_FIELD)
+        if enqueued is not None:
+            if self.first is None or enqueued < self.first:
+                self.first = enqueued
+            if self.last is None or enqueued > self.last:
+                self.last = enqueued
+        temperature = record.get("temperature")
+        if temperature is not None:
+            self.temperature_count += 1
+            self.temperature_sum += temperature
+            if temperature < self.temperature_min:
+                self.temperature_min = temperature
+            if temperature > self.temperature_max:
+                self.temperature_max = temperature
+        light = record.get("light")
+        if light is not None:
+            self.light[light] += 1
+        joystick = record.get("joystick_action")
+        if joystick is not None:
+            self.joystick[joystick] += 1
+
+    def merge(self, other):
+        """Suma los agregados de otra pasada (otro fichero o proceso) sobre el mismo dispositivo."""
+        self.count += other.count
+        if other.first is not None and (self.first is None or other.first < self.first):
+            self.first = other.first
+        if other.last is not None and (self.last is None or other.last > self.last):
+            self.last = other.last
+        self.temperature_count += other.temperature_count
+        self.temperature_sum += other.temperature_sum
+        self.temperature_min = min(self.temperature_min, other.temperature_min)
+        self.temperature_max = max(self.temperature_max, other.temperature_max)
+        self.light.update(other.light)
+        self.joystick.update(other.joystick)
+
+    def to_state(self):
+        """Estado serializable en JSON, para seguir acumulando en otra ejecución (checkpoints)."""
+        measured = self.temperature_count
+        return {
+            "count": self.count,
+            "first": self.first,
+            "last": self.last,
+            "temperature": [measured, self.temperature_sum, self.temperature_min if measured else None,
+                            self.temperature_max if measured else None],
+            # Pares en lugar de objetos: las claves de JSON son cadenas y los valores pueden ser números
+            "light": sorted(self.light.items(), key=str),
+            "joystick_action": sorted(self.joystick.items(), key=str),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        aggregate = cls()
+        aggregate.count = state["count"]
+        aggregate.first = state["first"]
+        aggregate.last = state["last"]
+        measured, total, minimum, maximum = state["temperature"]
+        aggregate.temperature_count = measured
+        aggregate.temperature_sum = total
+        if measured:
+            aggregate.temperature_min = minimum
+            aggregate.temperature_max = maximum
+        aggregate.light.update(dict(map(tuple, state["light"])))
+        aggregate.joystick.update(dict(map(tuple, state["joystick_action"])))
+        return aggregate
+
+    def summary(self):
+        measured = self.temperature_count
+        return {
+            "samples": self.count,
+            "first_enqueued": None if self.first is None else format_enqueued_time(self.first),
+            "last_enqueued": None if self.last is None else format_enqueued_time(self.last),
+            "temperature": {
+                "count": measured,
+                "min": self.temperature_min if measured else None,
+                "max": self.temperature_max if measured else None,
+                "mean": round(self.temperature_sum / measured, 3) if measured else None,
+            },
+            "light": dict(sorted(self.light.items())),
+            "joystick_action": dict(sorted(self.joystick.items())),
+        }
+
+
+AGGREGATE_FIELDS = (DEVICE_FIELD, ENQUEUED_EPOCH_FIELD, "temperature", "light", "joystick_action")
+
+
+def aggregate_by_device(records, aggregates=None):
+    aggregates = {} if aggregates is None else aggregates
+    for record in records:
+        device_id = record.get(DEVICE_FIELD)
+        aggregate = aggregates.get(device_id)
+        if aggregate is None:
+            aggregate = aggregates[device_id] = DeviceAggregate()
+        aggregate.add(record)
+    return aggregates
+
+
+def summarize_devices(aggregates):
+    return {device_id: aggregates[device_id].summary() for device_id in sorted(aggregates, key=str)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lector en streaming de exportaciones de IoT Hub")
+    parser.add_argument("paths", nargs="+", help="Ficheros de exportación o directorios con ficheros *.json")
+    parser.add_argument("--fields", help="Campos separados por comas (por defecto, todos)")
+    parser.add_argument("--device", action="append", help="Solo este dispositivo (se puede repetir)")
+    parser.add_argument("--csv", action="store_true", help="Salida CSV en lugar de JSON por línea")
+    parser.add_argument("--aggregate", action="store_true", help="Resumen por dispositivo en lugar de registros")
+    args = parser.parse_args()
+
+    fields = args.fields.split(",") if args.fields else None
+    if args.aggregate:
+        reader = ExportReader(AGGREGATE_FIELDS, devices=args.device)
+        aggregates = aggregate_by_device(reader.read_all(args.paths))
+        print(json.dumps(summarize_devices(aggregates), indent=2, ensure_ascii=False))
+    else:
+        reader = ExportReader(fields, devices=args.device)
+        records = reader.read_all(args.paths)
+        if args.csv:
+            first = next(records, None)
+            if first is not None:
+                writer = csv.DictWriter(sys.stdout, fieldnames=fields or list(first), extrasaction="ignore")
+                writer.writeheader()
+                writer.writerow(first)
+                writer.writerows(records)
+        else:
+            for record in records:
+                sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Lectura: {reader.stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
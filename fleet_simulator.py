@@ -0,0 +1,271 @@
+"""
+Simulador de una flota de estaciones FlavourSense virtuales.
+
+`iot-hub-client-dual.py` simula un único dispositivo con una cadena de conexión. Este script lanza miles
+de estaciones virtuales repartidas en un pool de procesos; cada proceso ejecuta sus estaciones como
+tareas asyncio con un cliente MQTT ligero (`mqtt_lite.py`). Cada estación:
+
+   - genera trazas de temperatura, luz y joystick con el backend simulado de `hardware.py` (con un
+     desfase de temperatura propio por local),
+   - publica una lectura por periodo en `devices/<id>/messages/events/` (el topic MQTT de IoT Hub) con
+     QoS 1, midiendo la latencia hasta el PUBACK.
+
+Si no se indica `--host`, se arranca en otro proceso un sustituto local del endpoint que responde
+CONNACK/PUBACK sin hacer nada más, para medir el propio lado de los dispositivos.
+
+Al terminar se muestra (y con `--json` se guarda) el total de mensajes por segundo, los percentiles de
+latencia de envío (globales y por dispositivo) y el tiempo de CPU por dispositivo.
+
+Uso:
+    python3 fleet_simulator.py --devices 2000 --processes 4 --duration 60
+    python3 fleet_simulator.py --devices 500 --host 192.168.1.10 --port 1883 --json flota.json
+
+Con muchos dispositivos hay que subir el límite de descriptores abiertos (`ulimit -n`).
+"""
+
+import argparse
+import array
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+
+from hardware import SimulatedBackend
+from mqtt_lite import (
+    CONNECT,
+    DISCONNECT,
+    PINGREQ,
+    PINGRESP,
+    PUBLISH,
+    MqttError,
+    MqttLiteClient,
+    connack_packet,
+    encode_packet,
+    parse_publish,
+    puback_packet,
+    read_packet,
+)
+from perf_stats import percentile, summarize_latencies
+from sampling_clock import FixedRateClock
+from telemetry_codec import encode_samples
+
+DEVICE_TOPIC = "devices/{device_id}/messages/events/"
+
+WINE_SELECTION = {
+    "up": "Red Wine",
+    "down": "White Wine",
+    "right": "Rosé Wine",
+}
+
+
+# SUSTITUTO LOCAL DEL ENDPOINT
+async def _standin_connection(reader, writer, counters):
+    try:
+        while True:
+            packet_type, flags, body = await read_packet(reader)
+            if packet_type == CONNECT:
+                writer.write(connack_packet(0))
+            elif packet_type == PUBLISH:
+                _, _, qos, _, packet_id = parse_publish(flags, body)
+                counters["messages"] += 1
+                if qos:
+                    writer.write(puback_packet(packet_id))
+            elif packet_type == PINGREQ:
+                writer.write(encode_packet(PINGRESP, 0))
+            elif packet_type == DISCONNECT:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _run_standin(host, port, ready, stop, results):
+    counters = {"messages": 0}
+    server = await asyncio.start_server(
+        lambda reader, writer: _standin_connection(reader, writer, counters), host, port, backlog=4096
+    )
+    ready.set()
+    cpu_start = time.process_time()
+    while not stop.is_set():
+        await asyncio.sleep(0.2)
+    server.close()
+    results.put({"messages": counters["messages"], "cpu_s": round(time.process_time() - cpu_start, 3)})
+
+
+def standin_endpoint(host, port, ready, stop, results):
+    asyncio.run(_run_standin(host, port, ready, stop, results))
+
+
+# ESTACIONES VIRTUALES
+async def run_station(index, options, deadline):
+    device_id = f"flavoursense-sim-{index:05d}"
+    backend = SimulatedBackend(seed=index, press_rate=options["press_rate"] * options["period"])
+    sense = backend.sense
+    rng = backend.rng
+    temperature_offset = rng.uniform(-15, 0)  # Cada local tiene su propia temperatura ambiente
+    topic = DEVICE_TOPIC.format(device_id=device_id)
+    latencies = array.array("d")
+    errors = 0
+
+    client = MqttLiteClient(device_id, keepalive=0)
+    connect_started = time.perf_counter()
+    try:
+        await client.connect(options["host"], options["port"])
+    except (OSError, asyncio.TimeoutError, MqttError):
+        return device_id, latencies, 1, None
+    connect_time = time.perf_counter() - connect_started
+
+    # Fase aleatoria para no enviar todas las estaciones en el mismo instante
+    await asyncio.sleep(rng.random() * options["period"])
+    clock = FixedRateClock(options["period"])
+    try:
+        while time.monotonic() < deadline:
+            await asyncio.sleep(clock.delay())
+            tick = clock.tick()
+
+            joystick_action = "No Selection"
+            for event in sense.stick.get_events():
+                if event.action == "pressed":
+                    if event.direction in WINE_SELECTION:
+                        joystick_action = WINE_SELECTION[event.direction]
+                    elif event.direction == "left":
+                        joystick_action = "Noise Detected"
+
+            sensor_data = {
+                "seq": tick.seq,
+                "ts": round(time.time(), 3),
+                "temperature": round(sense.get_temperature() + temperature_offset, 2),
+                "light": "Low Light" if sense.get_humidity() < 50 else "High Light",
+                "joystick_action": joystick_action,
+            }
+            body = encode_samples([sensor_data], batch=False).data
+            try:
+                latencies.append(await client.publish(topic, body, qos=options["qos"]))
+            except (MqttError, asyncio.TimeoutError, ConnectionError):
+                errors += 1
+                break
+    finally:
+        await client.close()
+    return device_id, latencies, errors, connect_time
+
+
+async def _run_worker(indices, options):
+    deadline = time.monotonic() + options["duration"]
+    return await asyncio.gather(*(run_station(index, options, deadline) for index in indices))
+
+
+def worker(indices, options):
+    cpu_start = time.process_time()
+    stations = asyncio.run(_run_worker(indices, options))
+    cpu = time.process_time() - cpu_start
+
+    devices = []
+    latencies = array.array("d")
+    for device_id, device_latencies, errors, connect_time in stations:
+        values = sorted(device_latencies)
+        devices.append({
+            "device_id": device_id,
+            "sent": len(values),
+            "errors": errors,
+            "connect_ms": None if connect_time is None else round(connect_time * 1000, 3),
+            "p50_ms": None if not values else round(percentile(values, 50) * 1000, 3),
+            "p99_ms": None if not values else round(percentile(values, 99) * 1000, 3),
+        })
+        latencies.extend(device_latencies)
+    return {"cpu_s": cpu, "devices": devices, "latencies": latencies}
+
+
+def run_fleet(options):
+    standin = None
+    stop = None
+    results = None
+    if not options["host"]:
+        options["host"] = "127.0.0.1"
+        ready = multiprocessing.Event()
+        stop = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        standin = multiprocessing.Process(
+            target=standin_endpoint, args=(options["host"], options["port"], ready, stop, results), daemon=True
+        )
+        standin.start()
+        ready.wait(10)
+
+    processes = options["processes"]
+    chunks = [list(range(start, options["devices"], processes)) for start in range(processes)]
+    chunks = [chunk for chunk in chunks if chunk]
+
+    started = time.monotonic()
+    with multiprocessing.Pool(len(chunks)) as pool:
+        partials = pool.starmap(worker, [(chunk, options) for chunk in chunks])
+    elapsed = time.monotonic() - started
+
+    standin_stats = None
+    if standin:
+        stop.set()
+        standin_stats = results.get(timeout=10)
+        standin.join(5)
+
+    devices = [device for partial in partials for device in partial["devices"]]
+    latencies = array.array("d")
+    for partial in partials:
+        latencies.extend(partial["latencies"])
+    worker_cpu = sum(partial["cpu_s"] for partial in partials)
+    sent = sum(device["sent"] for device in devices)
+    device_p99 = sorted(device["p99_ms"] for device in devices if device["p99_ms"] is not None)
+
+    return {
+        "devices": options["devices"],
+        "processes": len(chunks),
+        "period_s": options["period"],
+        "duration_s": round(elapsed, 3),
+        "messages": sent,
+        "errors": sum(device["errors"] for device in devices),
+        "msgs_per_sec": round(sent / elapsed, 2) if elapsed else 0.0,
+        "send_latency_ms": summarize_latencies(latencies),
+        "device_p99_ms": {
+            "median": round(percentile(device_p99, 50), 3) if device_p99 else None,
+            "worst": device_p99[-1] if device_p99 else None,
+        },
+        "cpu_per_device_ms_per_s": round(worker_cpu / options["devices"] / elapsed * 1000, 4) if elapsed else None,
+        "endpoint": standin_stats,
+        "per_device": devices,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de flota de estaciones FlavourSense")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de simulación")
+    parser.add_argument("--period", type=float, default=1.0, help="Segundos entre lecturas de cada estación")
+    parser.add_argument("--press-rate", type=float, default=0.02, help="Pulsaciones de joystick por segundo")
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=1)
+    parser.add_argument("--host", help="Broker MQTT existente (por defecto, sustituto local)")
+    parser.add_argument("--port", type=int, default=18830)
+    parser.add_argument("--json", help="Fichero donde guardar el informe completo")
+    args = parser.parse_args()
+
+    options = {
+        "devices": args.devices,
+        "processes": min(args.processes, args.devices),
+        "duration": args.duration,
+        "period": args.period,
+        "press_rate": args.press_rate,
+        "qos": args.qos,
+        "host": args.host,
+        "port": args.port,
+    }
+    report = run_fleet(options)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+
+    summary = {key: value for key, value in report.items() if key != "per_device"}
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
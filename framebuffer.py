@@ -0,0 +1,173 @@
+"""
+Escritura directa en el framebuffer de la matriz LED del Sense HAT.
+
+`sense.set_pixels` valida y convierte los 64 píxeles en Python en cada llamada, y es lo que más cuesta en
+los bucles de animación. El Sense HAT expone la matriz como un framebuffer (`/dev/fbN` con nombre
+"RPi-Sense FB") de 8x8 píxeles RGB565 (128 bytes). `FramebufferWriter` lo mapea en memoria con `mmap` y:
+
+   - convierte cada frame a RGB565 una sola vez (`prepare`), fuera del bucle de animación,
+   - no escribe nada si el frame es igual al último,
+   - si cambia, escribe solo las filas entre la primera y la última que han cambiado.
+
+Se puede usar con un fichero normal de 128 bytes en lugar del dispositivo, para probarlo sin hardware.
+
+`create_led_output(sense)` elige la salida según la variable de entorno `FLAVOURSENSE_FRAMEBUFFER`:
+
+   - sin definir: `sense.set_pixels` de siempre (`SenseHatOutput`),
+   - "auto": el framebuffer del Sense HAT si se encuentra,
+   - una ruta: ese dispositivo o fichero.
+
+Las dos salidas tienen la misma interfaz: `frame = output.prepare(pixels)` y `output.show(frame)`;
+`prepare_sequence` prepara de una vez una secuencia (también arrays de `led_numpy.py`).
+"""
+
+import glob
+import mmap
+import os
+import threading
+
+FRAMEBUFFER_ENV = "FLAVOURSENSE_FRAMEBUFFER"
+SENSE_HAT_FB_NAME = "RPi-Sense FB"
+
+WIDTH = 8
+HEIGHT = 8
+BYTES_PER_PIXEL = 2
+ROW_BYTES = WIDTH * BYTES_PER_PIXEL
+FRAME_BYTES = ROW_BYTES * HEIGHT
+
+
+def find_sense_hat_framebuffer():
+    """Busca el dispositivo del Sense HAT en /sys/class/graphics. Devuelve la ruta o None."""
+    for name_file in glob.glob("/sys/class/graphics/fb*/name"):
+        try:
+            with open(name_file) as f:
+                name = f.read().strip()
+        except OSError:
+            continue
+        if name == SENSE_HAT_FB_NAME:
+            return os.path.join("/dev", os.path.basename(os.path.dirname(name_file)))
+    return None
+
+
+def rgb565(red, green, blue):
+    return ((red >> 3) & 0x1F) << 11 | ((green >> 2) & 0x3F) << 5 | ((blue >> 3) & 0x1F)
+
+
+def pack_rgb565(pixels):
+    """Convierte 64 colores [r, g, b] a un frame RGB565 (little-endian, como lo espera el driver)."""
+    if len(pixels) != WIDTH * HEIGHT:
+        raise ValueError("Pixel lists must have 64 elements")
+    frame = bytearray(FRAME_BYTES)
+    for index, (red, green, blue) in enumerate(pixels):
+        value = rgb565(red, green, blue)
+        frame[index * 2] = value & 0xFF
+        frame[index * 2 + 1] = value >> 8
+    return bytes(frame)
+
+
+def unpack_rgb565(frame):
+    """Operación inversa (con la pérdida de precisión de RGB565), para comprobar lo escrito."""
+    pixels = []
+    for index in range(0, FRAME_BYTES, 2):
+        value = frame[index] | frame[index + 1] << 8
+        pixels.append([(value >> 11) << 3, ((value >> 5) & 0x3F) << 2, (value & 0x1F) << 3])
+    return pixels
+
+
+class FramebufferWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "r+b")
+        if os.fstat(self._file.fileno()).st_size < FRAME_BYTES and os.path.isfile(path):
+            self._file.truncate(FRAME_BYTES)  # Fichero de pruebas recién creado
+        self._map = mmap.mmap(self._file.fileno(), FRAME_BYTES)
+        self.last = bytes(self._map[:FRAME_BYTES])
+        # Dibujan varios hilos (motor de animaciones, vía rápida del joystick, comandos): el diff con
+        # `last` y la escritura tienen que ir juntos
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.bytes_written = 0
+
+    def prepare(self, pixels):
+        return pack_rgb565(pixels)
+
+    def prepare_sequence(self, frames):
+        """Prepara una secuencia: lista de frames de 64 colores o array NumPy (N, 8, 8, 3)."""
+        if hasattr(frames, "ndim"):
+            # Un único array RGB565 para toda la secuencia; cada frame es una vista sin copia
+            import led_numpy
+            return tuple(led_numpy.rgb565_view(frame) for frame in led_numpy.rgb565_frames(frames))
+        return tuple(self.prepare(pixels) for pixels in frames)
+
+    def show(self, frame):
+        """Escribe un frame RGB565. Devuelve el número de bytes escritos (0 si no había cambios)."""
+        with self._lock:
+            self.frames += 1
+            if frame == self.last:
+                self.skipped += 1
+                return 0
+            rows = [row for row in range(HEIGHT)
+                    if frame[row * ROW_BYTES:(row + 1) * ROW_BYTES] != self.last[row * ROW_BYTES:(row + 1) * ROW_BYTES]]
+            start = rows[0] * ROW_BYTES
+            end = (rows[-1] + 1) * ROW_BYTES
+            self._map[start:end] = frame[start:end]
+            self.last = bytes(frame)
+            self.bytes_written += end - start
+            return end - start
+
+    def set_pixels(self, pixels):
+        self.show(self.prepare(pixels))
+
+    def clear(self):
+        self.show(bytes(FRAME_BYTES))
+
+    def stats(self):
+        return {"frames": self.frames, "skipped": self.skipped, "bytes_written": self.bytes_written}
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class SenseHatOutput:
+    """Salida por `sense.set_pixels`, con la misma interfaz que FramebufferWriter."""
+
+    def __init__(self, sense):
+        self.sense = sense
+        self.frames = 0
+
+    def prepare(self, pixels):
+        return list(pixels)
+
+    def prepare_sequence(self, frames):
+        if hasattr(frames, "ndim"):
+            return tuple(frames.reshape(len(frames), 64, 3).tolist())
+        return tuple(self.prepare(pixels) for pixels in frames)
+
+    def show(self, frame):
+        self.frames += 1
+        self.sense.set_pixels(frame)
+
+    def set_pixels(self, pixels):
+        self.show(self.prepare(pixels))
+
+    def clear(self):
+        self.sense.clear()
+
+    def stats(self):
+        return {"frames": self.frames}
+
+    def close(self):
+        pass
+
+
+def create_led_output(sense, path=None):
+    path = path or os.environ.get(FRAMEBUFFER_ENV)
+    if path == "auto":
+        path = find_sense_hat_framebuffer()
+        if path is None:
+            print("No se encontró el framebuffer del Sense HAT; se usa set_pixels.")
+    if not path:
+        return SenseHatOutput(sense)
+    return FramebufferWriter(path)
@@ -0,0 +1,167 @@
+"""
+Capa de abstracción del hardware (Sense HAT, joystick y GPIO) de FlavourSense.
+
+Los scripts importaban `sense_hat.SenseHat` y `RPi.GPIO` directamente, así que no podían ejecutarse
+fuera de la Raspberry Pi. Ahora obtienen el hardware con `create_backend()`, que devuelve un backend
+con dos objetos:
+
+   - `backend.sense`: el subconjunto de la API de `SenseHat` que usamos: `get_temperature()`,
+     `get_humidity()`, `set_pixels(pixels)`, `clear()` y `stick` (con `get_events()` y
+     `wait_for_event(emptybuffer=False)`).
+   - `backend.gpio`: el subconjunto de `RPi.GPIO`: `setmode`, `setup`, `output`, `input`, `cleanup` y
+     las constantes `BCM`, `OUT`, `IN`, `HIGH` y `LOW`.
+
+Backends disponibles (variable de entorno `FLAVOURSENSE_BACKEND`):
+
+   - "sensehat" (por defecto): el hardware real.
+   - "sim": hardware simulado con generadores aleatorios como los de `iot-hub-client-dual.py`. Permite
+     probar y medir los bucles de telemetría, las animaciones LED y los comandos en cualquier Linux.
+     `FLAVOURSENSE_SPEEDUP` acelera el reloj de los scripts (p. ej. 100 = cien veces más rápido).
+"""
+
+import collections
+import os
+import queue
+import random
+import time
+
+BACKEND_ENV = "FLAVOURSENSE_BACKEND"
+SPEEDUP_ENV = "FLAVOURSENSE_SPEEDUP"
+
+# Misma forma que sense_hat.stick.InputEvent
+InputEvent = collections.namedtuple("InputEvent", ["timestamp", "direction", "action"])
+
+JOYSTICK_DIRECTIONS = ("up", "down", "left", "right", "middle")
+
+
+class SenseHatBackend:
+    name = "sensehat"
+
+    def __init__(self):
+        from sense_hat import SenseHat
+        import RPi.GPIO as GPIO
+
+        self.sense = SenseHat()
+        self.gpio = GPIO
+
+
+# BACKEND SIMULADO
+AUX_BASE_TEMPERATURE = 33.5
+AUX_BASE_HUMIDITY = 42.0
+
+
+class SimulatedStick:
+    def __init__(self, rng, press_rate=0.0):
+        self.rng = rng
+        self.press_rate = press_rate  # Pulsaciones aleatorias por segundo (0 = solo las inyectadas)
+        self._events = queue.Queue()
+
+    def press(self, direction, timestamp=None):
+        """Inyecta una pulsación completa (pressed + released)."""
+        timestamp = time.time() if timestamp is None else timestamp
+        self._events.put(InputEvent(timestamp, direction, "pressed"))
+        self._events.put(InputEvent(timestamp, direction, "released"))
+
+    def _random_press(self):
+        self.press(self.rng.choice(JOYSTICK_DIRECTIONS))
+
+    def get_events(self):
+        if self.press_rate and self.rng.random() < self.press_rate:
+            self._random_press()
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def wait_for_event(self, emptybuffer=False):
+        if emptybuffer:
+            self.get_events()
+        while True:
+            timeout = self.rng.expovariate(self.press_rate) if self.press_rate else None
+            try:
+                return self._events.get(timeout=timeout)
+            except queue.Empty:
+                self._random_press()
+
+
+class SimulatedSenseHat:
+    def __init__(self, rng, press_rate=0.0):
+        self.rng = rng
+        self.stick = SimulatedStick(rng, press_rate)
+        self.pixels = [[0, 0, 0]] * 64
+        self.frames_written = 0
+
+    def get_temperature(self):
+        return AUX_BASE_TEMPERATURE + (self.rng.random() * self.rng.random() * 1.5)
+
+    def get_humidity(self):
+        return AUX_BASE_HUMIDITY + (self.rng.random() * self.rng.random() * 15)
+
+    def set_pixels(self, pixel_list):
+        if len(pixel_list) != 64:
+            raise ValueError("Pixel lists must have 64 elements")
+        self.pixels = list(pixel_list)
+        self.frames_written += 1
+
+    def clear(self, *colour):
+        self.set_pixels([list(colour) if colour else [0, 0, 0]] * 64)
+
+
+class SimulatedGPIO:
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+        self.writes = 0
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, initial=LOW):
+        self.pins[pin] = initial
+
+    def output(self, pin, value):
+        self.pins[pin] = value
+        self.writes += 1
+
+    def input(self, pin):
+        return self.pins.get(pin, self.LOW)
+
+    def cleanup(self):
+        self.pins.clear()
+
+
+class SimulatedBackend:
+    name = "sim"
+
+    def __init__(self, seed=None, press_rate=0.0):
+        self.rng = random.Random(seed)
+        self.sense = SimulatedSenseHat(self.rng, press_rate)
+        self.gpio = SimulatedGPIO()
+
+
+BACKENDS = {
+    SenseHatBackend.name: SenseHatBackend,
+    SimulatedBackend.name: SimulatedBackend,
+}
+
+
+def create_backend(name=None, **kwargs):
+    """Crea el backend indicado o, si no se indica, el de la variable de entorno FLAVOURSENSE_BACKEND."""
+    name = name or os.environ.get(BACKEND_ENV, SenseHatBackend.name)
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de hardware desconocido: {name} (disponibles: {', '.join(BACKENDS)})")
+    return BACKENDS[name](**kwargs)
+
+
+def get_speedup():
+    """Factor de aceleración del reloj para pruebas con el backend simulado (1 = tiempo real)."""
+    return float(os.environ.get(SPEEDUP_ENV, "1"))
@@ -36,11 +36,11 @@ El script también asegura la limpieza de los recursos GPIO y la matriz LED al f
 import json
 import sys
 import time
-from sense_hat import SenseHat
+from hardware import create_backend
+from led_frames import FrameCache
 from azure.iot.device import IoTHubDeviceClient, Message
 import threading
 import paho.mqtt.client as mqtt  # Para comunicación con Arduino
-import RPi.GPIO as GPIO
 from tkinter import StringVar  # Import necesario para las variables de Tkinter
 
 # Azure IoT Hub Connection String
@@ -62,7 +62,9 @@ joystick_action = StringVar(value="No Selection")
 mqtt_status = StringVar(value="Disconnected")
 
 # Initialize SenseHat
-sense = SenseHat()
+hardware = create_backend()  # Sense HAT real o simulado (FLAVOURSENSE_BACKEND=sim)
+sense = hardware.sense
+GPIO = hardware.gpio
 
 # GPIO Setup
 GPIO.setmode(GPIO.BCM)
@@ -213,221 +215,14 @@ def get_sensor_joystick():
 
 
 # MATRICES DE NOTAS MUSICALES
+# Frames de las notas por (nota, intensidad), precalculados al arrancar
+frame_cache = FrameCache()
+frame_cache.warm()
+
+
 def get_note_matrix(note, intensity=1):
-    black = [0, 0, 0]
-    red = [int(139 * intensity), 0, 0]
-    pink = [int(255 * intensity), int(182 * intensity), int(193 * intensity)]
-    white = [int(255 * intensity), int(255 * intensity), int(255 * intensity)]
-
-    corchea = [
-        black,
-        black,
-        black,
-        red,
-        red,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        red,
-        red,
-        black,
-        black,
-        black,
-        black,
-        black,
-        red,
-        red,
-        red,
-        red,
-        black,
-        black,
-        black,
-        black,
-        red,
-        red,
-        red,
-        red,
-        black,
-        black,
-        black,
-        black,
-        black,
-        red,
-        red,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        red,
-        red,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        red,
-        red,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-    ]
-
-    semicorchea = [
-        black,
-        black,
-        pink,
-        pink,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        pink,
-        pink,
-        black,
-        black,
-        black,
-        black,
-        black,
-        pink,
-        pink,
-        pink,
-        pink,
-        black,
-        black,
-        black,
-        black,
-        pink,
-        pink,
-        pink,
-        pink,
-        black,
-        black,
-        black,
-        black,
-        black,
-        pink,
-        pink,
-        pink,
-        pink,
-        black,
-        black,
-        black,
-        black,
-        pink,
-        pink,
-        pink,
-        pink,
-        black,
-        black,
-        black,
-        black,
-        black,
-        pink,
-        pink,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-    ]
-
-    blanca = [
-        black,
-        black,
-        white,
-        white,
-        white,
-        white,
-        black,
-        black,
-        black,
-        white,
-        white,
-        black,
-        black,
-        white,
-        white,
-        black,
-        black,
-        white,
-        black,
-        black,
-        black,
-        black,
-        white,
-        black,
-        black,
-        white,
-        black,
-        black,
-        black,
-        black,
-        white,
-        black,
-        black,
-        white,
-        black,
-        black,
-        black,
-        black,
-        white,
-        black,
-        black,
-        white,
-        white,
-        black,
-        black,
-        white,
-        white,
-        black,
-        black,
-        black,
-        white,
-        white,
-        white,
-        white,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-        black,
-    ]
-
-    if note == "Red Wine":
-        return corchea
-    elif note == "Rosé Wine":
-        return semicorchea
-    elif note == "White Wine":
-        return blanca
-    else:
-        return [black] * 64
+    # Frame precalculado (ver led_frames.py): lista de 64 colores lista para set_pixels
+    return frame_cache.get(note, intensity).pixels
 
 
 # DISPLAY NOTES ON LED MATRIX
@@ -1,8 +1,9 @@
-from sense_hat import SenseHat
+from hardware import create_backend
 import time
 
 # Initialize the Sense HAT
-sense = SenseHat()
+hardware = create_backend()  # Sense HAT real o simulado (FLAVOURSENSE_BACKEND=sim)
+sense = hardware.sense
 
 
 # Function to display "Hello" on the LED matrix
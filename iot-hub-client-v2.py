@@ -9,15 +9,16 @@
 import json
 import sys
 import time
-from sense_hat import SenseHat
+from hardware import create_backend
 from azure.iot.device import IoTHubDeviceClient, Message
-import RPi.GPIO as GPIO
 
 # Azure IoT Hub Connection String
 AUX_CONNECTION_STRING = sys.argv[1]
 
 # Initialize SenseHat
-sense = SenseHat()
+hardware = create_backend()  # Sense HAT real o simulado (FLAVOURSENSE_BACKEND=sim)
+sense = hardware.sense
+GPIO = hardware.gpio
 
 # GPIO Setup
 GPIO.setmode(GPIO.BCM)
@@ -0,0 +1,55 @@
+"""
+Captura del joystick del Sense HAT sin pérdida de eventos.
+
+`get_sensor_joystick` vaciaba `sense.stick.get_events()` una vez por segundo y devolvía solo la primera
+pulsación: el resto se perdía y una selección podía esperar hasta un segundo entero. `JoystickReader`
+es un hilo dedicado que se bloquea en `stick.wait_for_event()` (lee directamente el dispositivo de
+entrada del joystick) y, en cuanto llega una pulsación:
+
+   - la mete con su marca de tiempo en una cola que el bucle principal vacía entera en cada tick
+     (`drain()`), y
+   - llama a `on_event`, que permite una vía rápida (mostrar la nota y enviar la telemetría al instante).
+"""
+
+import queue
+import threading
+
+
+class JoystickReader(threading.Thread):
+    def __init__(self, stick, on_event=None, actions=("pressed",)):
+        super().__init__(daemon=True)
+        self.stick = stick
+        self.on_event = on_event
+        self.actions = actions
+        self.events = queue.Queue()
+        self.received = 0
+        self.callback_errors = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            # Bloquea hasta el siguiente evento sin descartar los que estén en el buffer
+            event = self.stick.wait_for_event(emptybuffer=False)
+            if event.action not in self.actions:
+                continue
+            self.received += 1
+            self.events.put(event)
+            if self.on_event:
+                try:
+                    self.on_event(event)
+                except Exception as e:
+                    self.callback_errors += 1
+                    print(f"Error al procesar el evento del joystick: {e}")
+
+    def drain(self):
+        """Devuelve todos los eventos pendientes, del más antiguo al más reciente."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self):
+        # El hilo es daemon: si está bloqueado esperando un evento termina con el proceso
+        self._stop_event.set()
@@ -0,0 +1,195 @@
+"""
+Caché de frames precalculados para la matriz LED 8x8 del Sense HAT.
+
+`get_note_matrix` construía en cada llamada las tres notas completas (64 listas de color cada una) para
+quedarse con una. Aquí cada nota se define una vez como máscara, y cada frame (nota, intensidad) se
+genera la primera vez que se pide y se guarda empaquetado en bytes RGB (192 bytes), junto con la lista
+de píxeles inmutable que espera `sense.set_pixels`. La caché es LRU, con un número máximo de frames, y
+se precalienta al arrancar con las intensidades habituales (normal, "Increase" y "Decrease Brightness"),
+de forma que pintar una nota es una búsqueda en un diccionario.
+
+Las componentes de color se limitan a 0-255: con intensidad 2 el Sense HAT rechazaba los valores.
+
+También están aquí los generadores en Python de las secuencias de onda que reproduce `animation.py`
+(`render_wave`, `render_shifted_wave`); `led_numpy.py` tiene las versiones vectorizadas.
+"""
+
+import collections
+import math
+import threading
+
+WIDTH = 8
+HEIGHT = 8
+PIXELS = WIDTH * HEIGHT
+
+# Colores base de cada nota (a intensidad 1)
+RED = (139, 0, 0)
+PINK = (255, 182, 193)
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+# Máscaras de las notas: "#" = color de la nota, "." = apagado
+CORCHEA = (
+    "...##...",
+    "...##...",
+    "..####..",
+    "..####..",
+    "...##...",
+    "...##...",
+    "...##...",
+    "........",
+)
+
+SEMICORCHEA = (
+    "..##....",
+    "..##....",
+    ".####...",
+    ".####...",
+    "..####..",
+    "..####..",
+    "...##...",
+    "........",
+)
+
+BLANCA = (
+    "..####..",
+    ".##..##.",
+    ".#....#.",
+    ".#....#.",
+    ".#....#.",
+    ".##..##.",
+    "..####..",
+    "........",
+)
+
+# Nota y color de cada vino
+GLYPHS = {
+    "Red Wine": (CORCHEA, RED),
+    "Rosé Wine": (SEMICORCHEA, PINK),
+    "White Wine": (BLANCA, WHITE),
+}
+
+# Intensidades usadas por los comandos de brillo
+COMMON_INTENSITIES = (1, 2, 0.5)
+
+WAVE_PHASE_STEP = 0.5  # Avance de fase por frame de la onda sinusoidal original (rad)
+
+
+def scale_colour(colour, intensity):
+    return tuple(min(255, max(0, int(component * intensity))) for component in colour)
+
+
+def render_glyph(note, intensity=1):
+    """Genera el frame de una nota como bytes RGB (fila a fila). Las notas desconocidas dan un frame negro."""
+    if note not in GLYPHS:
+        return bytes(PIXELS * 3)
+    mask, colour = GLYPHS[note]
+    lit = bytes(scale_colour(colour, intensity))
+    off = bytes(BLACK)
+    return b"".join(lit if cell == "#" else off for row in mask for cell in row)
+
+
+# ONDAS
+def cyclic_phase_step(step=WAVE_PHASE_STEP):
+    """Paso de fase más cercano a `step` que recorre 2π en un número entero de frames."""
+    frames = max(1, round(2 * math.pi / step))
+    return 2 * math.pi / frames, frames
+
+
+def wave_frame(amplitude, frequency, phase_shift, color):
+    """Frame (64 colores) de la onda sinusoidal continua de `mainprueba-copy.py`."""
+    pixels = [list(BLACK)] * 64
+    prev_y = None  # Para unir puntos de forma continua
+    for x in range(8):
+        y_position = int(3.5 + amplitude * math.sin(frequency * x + phase_shift))
+        y_position = min(7, max(0, y_position))
+        pixels[y_position * 8 + x] = color
+        if prev_y is not None and prev_y != y_position:
+            step = 1 if y_position > prev_y else -1
+            for intermediate_y in range(prev_y, y_position, step):
+                pixels[intermediate_y * 8 + x] = color
+        prev_y = y_position
+    return pixels
+
+
+def render_wave(amplitude, frequency, color, phase_step=WAVE_PHASE_STEP):
+    step, frames = cyclic_phase_step(phase_step)
+    return [wave_frame(amplitude, frequency, index * step, color) for index in range(frames)]
+
+
+def render_shifted_wave(wave_pattern, color):
+    """Secuencia de `leds.py`: barras de altura `wave_pattern[x]` desplazándose a la izquierda."""
+    sequence = []
+    for shift in range(len(wave_pattern)):
+        pattern = wave_pattern[shift:] + wave_pattern[:shift]
+        pixels = [list(BLACK)] * 64
+        for x in range(8):
+            for y in range(7, 7 - pattern[x], -1):
+                pixels[y * 8 + x] = color
+        sequence.append(pixels)
+    return sequence
+
+
+class Frame:
+    """Frame empaquetado. `pixels` es la lista de 64 colores (tuplas) para `set_pixels`."""
+
+    __slots__ = ("data", "pixels")
+
+    def __init__(self, data):
+        self.data = data
+        self.pixels = tuple(tuple(data[index:index + 3]) for index in range(0, len(data), 3))
+
+
+class FrameCache:
+    def __init__(self, max_frames=32, render=render_glyph):
+        self.max_frames = max_frames
+        self.render = render
+        self.frames = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()  # Se pinta desde el bucle, el joystick y los comandos
+
+    @staticmethod
+    def key(note, intensity):
+        return note, round(float(intensity), 3)
+
+    def get(self, note, intensity=1):
+        key = self.key(note, intensity)
+        with self._lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+                self.hits += 1
+                return frame
+            self.misses += 1
+        frame = Frame(self.render(note, intensity))
+        with self._lock:
+            self.frames[key] = frame
+            self.frames.move_to_end(key)
+            while len(self.frames) > self.max_frames:
+                self.frames.popitem(last=False)
+                self.evictions += 1
+        return frame
+
+    def warm(self, notes=None, intensities=COMMON_INTENSITIES):
+        """Precalcula los frames de las notas indicadas (todas por defecto) sin contar aciertos ni fallos."""
+        for note in GLYPHS if notes is None else notes:
+            for intensity in intensities:
+                key = self.key(note, intensity)
+                if key not in self.frames:
+                    frame = Frame(self.render(note, intensity))
+                    with self._lock:
+                        self.frames[key] = frame
+                        while len(self.frames) > self.max_frames:
+                            self.frames.popitem(last=False)
+                            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "frames": len(self.frames),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,106 @@
+"""
+Generación vectorizada de frames de la matriz LED con NumPy.
+
+Un frame es un array `uint8` de forma (8, 8, 3) (fila, columna, RGB) y una secuencia es un array
+(N, 8, 8, 3). Los generadores calculan todas las filas, columnas y frames de una vez en lugar de recorrer
+listas de listas en Python:
+
+   - `wave_frames`: onda sinusoidal continua (`mainprueba-copy.py`), ciclo completo.
+   - `shifted_wave_frames`: barras desplazándose a la izquierda (`leds.py`).
+   - `glyph_frame`: notas de `led_frames.py` escaladas a cualquier intensidad.
+   - `fade` y `crossfade`: transiciones entre un frame y negro o entre dos vinos.
+
+`rgb565_frames` convierte una secuencia entera al formato del framebuffer y `rgb565_view` da la vista en
+bytes de un frame sin copiarlo, que es lo que escribe `FramebufferWriter`.
+
+Dependencia adicional: `pip3 install numpy` (si no está, `animation.py` usa los generadores en Python).
+"""
+
+import numpy as np
+
+from led_frames import GLYPHS, WAVE_PHASE_STEP, cyclic_phase_step
+
+HEIGHT = 8
+WIDTH = 8
+
+ROWS = np.arange(HEIGHT).reshape(1, HEIGHT, 1)   # Para comparar con (N, 1, WIDTH)
+COLUMNS = np.arange(WIDTH)
+
+
+def blank(frames=None):
+    shape = (HEIGHT, WIDTH, 3) if frames is None else (frames, HEIGHT, WIDTH, 3)
+    return np.zeros(shape, dtype=np.uint8)
+
+
+def from_pixels(pixels):
+    """Lista de 64 colores [r, g, b] → frame (8, 8, 3)."""
+    return np.asarray(pixels, dtype=np.uint8).reshape(HEIGHT, WIDTH, 3)
+
+
+def to_pixels(frame):
+    """Frame (8, 8, 3) → lista de 64 colores para `sense.set_pixels`."""
+    return frame.reshape(HEIGHT * WIDTH, 3).tolist()
+
+
+def paint(mask, color):
+    """Pinta con `color` las posiciones de una máscara booleana (..., 8, 8)."""
+    frames = np.zeros(mask.shape + (3,), dtype=np.uint8)
+    frames[mask] = np.asarray(color, dtype=np.uint8)
+    return frames
+
+
+def wave_frames(amplitude, frequency, color, phase_step=WAVE_PHASE_STEP):
+    """Ciclo completo de la onda sinusoidal, con la columna unida al punto de la columna anterior."""
+    step, count = cyclic_phase_step(phase_step)
+    phases = (np.arange(count) * step).reshape(count, 1)
+    y = (3.5 + amplitude * np.sin(frequency * COLUMNS + phases)).astype(np.int64)
+    y = np.clip(y, 0, HEIGHT - 1)                         # (N, 8)
+    previous = np.concatenate([y[:, :1], y[:, :-1]], axis=1)
+    low = np.minimum(y, previous)[:, np.newaxis, :]
+    high = np.maximum(y, previous)[:, np.newaxis, :]
+    return paint((ROWS >= low) & (ROWS <= high), color)
+
+
+def shifted_wave_frames(wave_pattern, color):
+    """Barras de altura `wave_pattern[x]` desde abajo, una secuencia por cada desplazamiento."""
+    pattern = np.asarray(wave_pattern)
+    shifts = np.arange(len(pattern)).reshape(-1, 1)
+    heights = pattern[(COLUMNS + shifts) % len(pattern)]  # (N, 8)
+    return paint(ROWS >= HEIGHT - heights[:, np.newaxis, :], color)
+
+
+def glyph_frame(note, intensity=1):
+    """Nota musical escalada a `intensity` (las componentes se limitan a 0-255)."""
+    if note not in GLYPHS:
+        return blank()
+    mask, color = GLYPHS[note]
+    lit = np.array([[cell == "#" for cell in row] for row in mask])
+    scaled = np.clip(np.asarray(color, dtype=np.float64) * intensity, 0, 255).astype(np.uint8)
+    return paint(lit, scaled)
+
+
+def crossfade(start, end, steps):
+    """`steps` frames que pasan de `start` a `end` (sin incluir `start`, incluyendo `end`)."""
+    weights = (np.arange(1, steps + 1, dtype=np.float64) / steps).reshape(steps, 1, 1, 1)
+    start = start.astype(np.float64)
+    end = end.astype(np.float64)
+    return np.rint(start + (end - start) * weights).astype(np.uint8)
+
+
+def fade(frame, steps, fade_in=False):
+    """Fundido a negro (o desde negro con `fade_in`)."""
+    if fade_in:
+        return crossfade(blank(), frame, steps)
+    return crossfade(frame, blank(), steps)
+
+
+def rgb565_frames(frames):
+    """Convierte frames (..., 8, 8, 3) a RGB565 little-endian, como los escribe el driver del Sense HAT."""
+    frames = frames.astype(np.uint16)
+    packed = (frames[..., 0] >> 3) << 11 | (frames[..., 1] >> 2) << 5 | frames[..., 2] >> 3
+    return np.ascontiguousarray(packed, dtype="<u2")
+
+
+def rgb565_view(packed_frame):
+    """Vista en bytes (sin copia) de un frame RGB565 de `rgb565_frames`."""
+    return memoryview(packed_frame).cast("B")
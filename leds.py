@@ -1,8 +1,11 @@
-import time
-from sense_hat import SenseHat
+from hardware import create_backend
+from framebuffer import create_led_output
+from animation import AnimationEngine, shifted_wave_sequence
 
 # Inicializar Sense HAT
-sense = SenseHat()
+hardware = create_backend()  # Sense HAT real o simulado (FLAVOURSENSE_BACKEND=sim)
+sense = hardware.sense
+led = create_led_output(sense)  # set_pixels o framebuffer directo (FLAVOURSENSE_FRAMEBUFFER)
 
 # Colores
 black = [0, 0, 0]
@@ -22,52 +25,35 @@ corchea_wave = [0, 1, 2, 3, 2, 1, 0, 0]
 semicorchea_wave = [0, 1, 1, 2, 1, 1, 0, 0]
 blanca_wave = [0, 2, 4, 6, 4, 2, 0, 0]
 
-# Función para generar una matriz de onda
-def generate_wave_matrix(wave_pattern, color):
-    matrix = [[black for _ in range(8)] for _ in range(8)]
-    for x in range(8):
-        amplitude = wave_pattern[x]
-        for y in range(7, 7 - amplitude, -1):
-            matrix[y][x] = color
-    return matrix
+# Animaciones: un único hilo que reproduce secuencias precalculadas (ver animation.py)
+animation = AnimationEngine(led, period=0.2)
+animation.start()
+WAVE_TRANSITION_FRAMES = 4  # Fundido entre ondas al cambiar de vino (requiere NumPy)
 
-# Desplazar la onda hacia la izquierda
-def shift_wave_left(wave_pattern):
-    return wave_pattern[1:] + [wave_pattern[0]]
-
-# Mostrar onda en el Sense HAT
-def display_wave(wave_pattern, color):
-    wave_matrix = generate_wave_matrix(wave_pattern, color)
-    flattened_matrix = [pixel for row in wave_matrix for pixel in row]
-    sense.set_pixels(flattened_matrix)
-
-# Animar la onda en la matriz
-def animate_wave(wave_pattern, color, duration=3):
-    start_time = time.time()
-    while time.time() - start_time < duration:
-        display_wave(wave_pattern, color)
-        wave_pattern = shift_wave_left(wave_pattern)
-        time.sleep(0.2)
+# Animar la onda en la matriz (sin bloquear: la siguiente selección sustituye a la animación en curso)
+def animate_wave(wine, wave_pattern, color, duration=3):
+    animation.play(("wave", wine), lambda: shifted_wave_sequence(wave_pattern, color), duration=duration,
+                   transition=WAVE_TRANSITION_FRAMES)
 
 # Controlador principal
 try:
     while True:
         print("Esperando selección del joystick...")
-        events = sense.stick.get_events()
-        for event in events:
-            if event.action == "pressed":
-                if event.direction in WINE_SELECTION:
-                    wine = WINE_SELECTION[event.direction]
-                    print(f"Seleccionado: {wine}")
-
-                    if wine == "Red Wine":
-                        animate_wave(corchea_wave, red)
-                    elif wine == "Rosé Wine":
-                        animate_wave(semicorchea_wave, pink)
-                    elif wine == "White Wine":
-                        animate_wave(blanca_wave, white)
-                else:
-                    print("Joystick movido en una dirección no configurada.")
+        event = sense.stick.wait_for_event()
+        if event.action == "pressed":
+            if event.direction in WINE_SELECTION:
+                wine = WINE_SELECTION[event.direction]
+                print(f"Seleccionado: {wine}")
+
+                if wine == "Red Wine":
+                    animate_wave(wine, corchea_wave, red)
+                elif wine == "Rosé Wine":
+                    animate_wave(wine, semicorchea_wave, pink)
+                elif wine == "White Wine":
+                    animate_wave(wine, blanca_wave, white)
+            else:
+                print("Joystick movido en una dirección no configurada.")
 except KeyboardInterrupt:
+    animation.stop(timeout=1)
     sense.clear()
     print("Programa detenido.")
@@ -0,0 +1,249 @@
+"""
+Broker MQTT 3.1.1 ligero sobre asyncio (ver `mqtt_lite.py`) para la red local.
+
+El control del ventilador pasaba por el broker público `broker.hivemq.com`, así que la latencia de
+actuación dependía de internet. Este broker implementa solo lo que usan la Raspberry Pi y el Arduino:
+
+   - CONNECT (sesiones limpias), SUBSCRIBE con comodines `+` y `#`, PINGREQ y DISCONNECT,
+   - PUBLISH con QoS 0/1: responde PUBACK al emisor y reenvía a cada suscriptor con el menor QoS de la
+     publicación y de su suscripción,
+   - mensajes retenidos: se guarda el último por topic (un payload vacío lo borra) y se envía a cada
+     suscripción nueva que encaje.
+
+Se puede usar de tres formas:
+
+   - como proceso aparte en la Raspberry Pi: `python3 local_broker.py --host 0.0.0.0 --port 1883`,
+   - dentro del proceso del dispositivo (`MQTT_EMBEDDED_BROKER` en `mainprueba.py`), con `BrokerThread`,
+     que lo ejecuta en un hilo con su propio bucle de eventos,
+   - como sustituto local del broker en pruebas y benchmarks (`bench_commands.py`).
+
+El Arduino (`arduino-to-raspberr.cpp`) debe apuntar entonces a la IP de la Raspberry Pi en la LAN.
+"""
+
+import argparse
+import asyncio
+import itertools
+import threading
+
+from mqtt_lite import (
+    CONNECT,
+    DISCONNECT,
+    PINGREQ,
+    PINGRESP,
+    PUBACK,
+    PUBLISH,
+    SUBSCRIBE,
+    connack_packet,
+    encode_packet,
+    parse_connect,
+    parse_publish,
+    parse_subscribe,
+    puback_packet,
+    publish_packet,
+    read_packet,
+    suback_packet,
+    topic_matches,
+)
+
+
+class Session:
+    def __init__(self, client_id, writer):
+        self.client_id = client_id
+        self.writer = writer
+        self.subscriptions = {}  # filtro -> QoS concedido
+        self.in_flight = set()   # packet_id de los QoS 1 enviados sin PUBACK
+        self._packet_ids = itertools.cycle(range(1, 65536))
+
+    def deliver(self, topic, payload, qos, retain=False):
+        packet_id = None
+        if qos:
+            packet_id = next(self._packet_ids)
+            self.in_flight.add(packet_id)
+        self.writer.write(publish_packet(topic, payload, qos, retain, packet_id))
+
+    def granted_qos(self, topic):
+        """QoS más alto de los filtros de la sesión que encajan con el topic, o None si ninguno encaja."""
+        matches = [qos for topic_filter, qos in self.subscriptions.items() if topic_matches(topic_filter, topic)]
+        return max(matches) if matches else None
+
+
+class LocalBroker:
+    def __init__(self, host="127.0.0.1", port=1883, verbose=False):
+        self.host = host
+        self.port = port
+        self.verbose = verbose
+        self.sessions = {}  # client_id -> Session
+        self.retained = {}  # topic -> payload
+        self.published = 0
+        self.delivered = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Broker MQTT local escuchando en {self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for session in list(self.sessions.values()):
+            session.writer.close()
+        self.sessions.clear()
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    async def _handle_connection(self, reader, writer):
+        session = None
+        try:
+            packet_type, _, body = await read_packet(reader)
+            if packet_type != CONNECT:
+                return
+            client_id = parse_connect(body)["client_id"] or f"anon-{id(writer)}"
+            previous = self.sessions.get(client_id)
+            if previous:
+                previous.writer.close()  # Mismo client_id: se desconecta la sesión anterior
+            session = Session(client_id, writer)
+            self.sessions[client_id] = session
+            writer.write(connack_packet(0))
+            self.log(f"Cliente conectado: {client_id}")
+
+            while True:
+                packet_type, flags, body = await read_packet(reader)
+                if packet_type == PUBLISH:
+                    topic, payload, qos, retain, packet_id = parse_publish(flags, body)
+                    if qos:
+                        writer.write(puback_packet(packet_id))
+                    self.publish(topic, payload, qos, retain)
+                elif packet_type == PUBACK:
+                    session.in_flight.discard(int.from_bytes(body[:2], "big"))
+                elif packet_type == SUBSCRIBE:
+                    packet_id, topics = parse_subscribe(body)
+                    granted = [min(qos, 1) for _, qos in topics]
+                    for (topic_filter, _), qos in zip(topics, granted):
+                        session.subscriptions[topic_filter] = qos
+                    writer.write(suback_packet(packet_id, granted))
+                    for (topic_filter, _), qos in zip(topics, granted):
+                        self._send_retained(session, topic_filter, qos)
+                elif packet_type == PINGREQ:
+                    writer.write(encode_packet(PINGRESP, 0))
+                elif packet_type == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session and self.sessions.get(session.client_id) is session:
+                del self.sessions[session.client_id]
+                self.log(f"Cliente desconectado: {session.client_id}")
+            writer.close()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Distribuye una publicación (también la usa el propio proceso en modo embebido)."""
+        self.published += 1
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        for session in list(self.sessions.values()):
+            granted = session.granted_qos(topic)
+            if granted is not None:
+                # Los mensajes reenviados en vivo van sin la marca de retenido (MQTT 3.1.1, 3.3.1.3)
+                session.deliver(topic, payload, min(qos, granted))
+                self.delivered += 1
+
+    def _send_retained(self, session, topic_filter, granted):
+        for topic, payload in self.retained.items():
+            if topic_matches(topic_filter, topic):
+                session.deliver(topic, payload, granted, retain=True)
+                self.delivered += 1
+
+    def stats(self):
+        return {
+            "clients": len(self.sessions),
+            "retained": len(self.retained),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+class BrokerThread(threading.Thread):
+    """Ejecuta un LocalBroker en un hilo propio. `loop` permite programar corrutinas en él."""
+
+    def __init__(self, host="127.0.0.1", port=1883, verbose=False):
+        super().__init__(daemon=True)
+        self.broker = LocalBroker(host, port, verbose)
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._submitted = []
+        self.error = None  # Excepción del arranque del broker (p. ej. puerto ocupado)
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.broker.start())
+        except Exception as e:
+            self.error = e
+            self.loop.close()
+            return
+        finally:
+            self._ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    def start(self, timeout=10):
+        """Arranca el hilo y espera a que el broker escuche; si no lo consigue, lanza la excepción."""
+        super().start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"El broker MQTT local no ha arrancado en {timeout} s")
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def submit(self, coroutine):
+        """Ejecuta una corrutina en el bucle del broker desde otro hilo (devuelve un Future)."""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        self._submitted.append(future)
+        return future
+
+    async def _shutdown(self):
+        await self.broker.stop()
+        # Deja terminar las conexiones que acaban de cerrarse
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=1)
+
+    def stop(self):
+        # Cancela primero las corrutinas programadas con submit() (clientes de prueba, etc.)
+        for future in self._submitted:
+            future.cancel()
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broker MQTT local para el tráfico Raspberry Pi ↔ Arduino")
+    parser.add_argument("--host", default="0.0.0.0", help="Dirección en la que escuchar (por defecto, toda la LAN)")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--verbose", action="store_true", help="Muestra las conexiones de los clientes")
+    args = parser.parse_args()
+
+    broker = LocalBroker(args.host, args.port, args.verbose)
+    try:
+        asyncio.run(broker.serve_forever())
+    except KeyboardInterrupt:
+        print(f"Broker detenido: {broker.stats()}")
+
+
+if __name__ == "__main__":
+    main()
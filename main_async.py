@@ -0,0 +1,327 @@
+"""
+Versión asíncrona (asyncio) del script principal de FlavourSense.
+
+En lugar de un hilo bloqueado en `receive_message`, el hilo de red de paho (`loop_start`), un hilo por
+animación y un bucle principal que duerme, todo se ejecuta en un único bucle de eventos con tareas
+cooperativas:
+
+   - `sampler_task`:   lee los sensores del Sense HAT una vez por periodo y prepara la telemetría.
+   - `telemetry_task`: envía la telemetría a Azure IoT Hub con `azure.iot.device.aio.IoTHubDeviceClient`.
+   - `arduino_task`:   mantiene la conexión MQTT asíncrona (aiomqtt) por la que `ArduinoPublisher`
+                       publica el estado del ventilador, con la misma ventana y deduplicación que
+                       `mainprueba.py`.
+   - `led_task`:       dibuja las notas en la matriz LED y las animaciones de onda; una nueva petición
+                       cancela la animación en curso en vez de crear y unir un hilo nuevo.
+
+Los comandos de Azure se despachan con la misma tabla que `mainprueba.py` (`device_config.register_commands`
+en un `command_dispatch.CommandDispatcher`); sus handlers solo pasan el trabajo al bucle de eventos. La
+configuración común está en `device_config.py`, que se importa sin efectos: el hardware de este script es
+el suyo propio (`hardware.create_backend`).
+
+Al pulsar Ctrl-C se cancelan todas las tareas y se liberan la matriz LED, el GPIO y las conexiones.
+
+Dependencias adicionales: `pip3 install aiomqtt`
+"""
+
+import asyncio
+import collections
+import itertools
+import time
+
+import aiomqtt
+from azure.iot.device import Message
+from azure.iot.device.aio import IoTHubDeviceClient
+
+from device_config import (
+    ARDUINO_WINDOW,
+    AUX_CONNECTION_STRING,
+    BATCH_MAX_SAMPLES,
+    BATCH_MAX_WAIT_MS,
+    BATCH_MODE,
+    BOOT_ID,
+    COMMAND_MAX_PENDING,
+    COMMAND_WORKERS,
+    FRAME_CACHE_SIZE,
+    MQTT_BROKER,
+    MQTT_PORT,
+    MQTT_TOPIC,
+    SAMPLE_PERIOD,
+    TELEMETRY_COMPRESSION,
+    TELEMETRY_ENCODING,
+    WINE_SELECTION,
+    read_joystick,
+    read_light,
+    read_temperature,
+    register_commands,
+)
+from telemetry_batch import TelemetryBatcher, BATCH_PROPERTY
+from telemetry_codec import encode_samples
+from sampling_clock import FixedRateClock
+from hardware import create_backend, get_speedup
+from animation import wave_sequence
+from framebuffer import SenseHatOutput
+from led_frames import FrameCache
+from command_dispatch import CommandDispatcher
+from arduino_publisher import ArduinoPublisher
+from connection_supervisor import Backoff
+
+ANIMATION_PERIOD = 0.2 / get_speedup()  # Segundos entre fotogramas de la animación de onda
+ANIMATE_WAVES = False    # Al elegir vino: onda animada (True) o la nota fija de mainprueba.py (False)
+MQTT_RETRY_DELAY = 5     # Retardo máximo (s) del backoff entre reintentos de conexión MQTT
+TELEMETRY_RETRY_DELAY = 30  # Retardo máximo (s) del backoff entre reintentos de envío a IoT Hub
+
+# Parámetros de onda (amplitud, frecuencia, color) para cada vino
+WAVE_SETTINGS = {
+    "Red Wine": (3, 0.8, [255, 0, 0]),
+    "Rosé Wine": (2, 1, [200, 85, 160]),
+    "White Wine": (1, 1.2, [255, 255, 255]),
+}
+
+# Initialize SenseHat
+hardware = create_backend()  # Sense HAT real o simulado (FLAVOURSENSE_BACKEND=sim)
+sense = hardware.sense
+GPIO = hardware.gpio
+
+# Frames de las notas por (nota, intensidad), precalculados al arrancar
+frame_cache = FrameCache(max_frames=FRAME_CACHE_SIZE)
+frame_cache.warm()
+
+# Secuencias cíclicas de cada onda, calculadas una sola vez (ver animation.py). Con NumPy son arrays
+# (N, 8, 8, 3); `prepare_sequence` las convierte en listas de 64 colores para `set_pixels`
+led_output = SenseHatOutput(sense)
+WAVE_FRAMES = {wine: led_output.prepare_sequence(wave_sequence(*settings)) for wine, settings in WAVE_SETTINGS.items()}
+
+
+# Resultado de `publish` con la forma del de paho (rc, mid), que es lo que espera `ArduinoPublisher`
+PublishResult = collections.namedtuple("PublishResult", ["rc", "mid"])
+MQTT_ERR_NO_CONN = 4  # Mismo código que paho.mqtt.client.MQTT_ERR_NO_CONN
+
+
+class AsyncMqttPublisher:
+    """
+    Adapta un cliente aiomqtt a la interfaz de paho que usa `ArduinoPublisher`: `publish` devuelve al
+    momento (rc, mid) y programa el envío; el PUBACK llega después por `on_publish(mid)`. Se usa solo
+    desde el bucle de eventos. Si un envío falla, `failed` avisa a `arduino_task` para que reconecte.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.on_publish = None
+        self.failed = asyncio.Event()
+        self._mids = itertools.count(1)
+        self._tasks = set()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if self.client is None:
+            return PublishResult(MQTT_ERR_NO_CONN, None)
+        mid = next(self._mids)
+        task = asyncio.get_running_loop().create_task(self._publish(self.client, mid, topic, payload, qos, retain))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return PublishResult(0, mid)
+
+    async def _publish(self, client, mid, topic, payload, qos, retain):
+        try:
+            await client.publish(topic, payload, qos=qos, retain=retain)  # Con QoS 1 espera el PUBACK
+        except aiomqtt.MqttError as e:
+            print(f"Error al enviar mensaje a Arduino: {e}")
+            if client is self.client:
+                self.failed.set()
+            return
+        if self.on_publish:
+            self.on_publish(mid)
+
+
+class DeviceRuntime:
+    def __init__(self, client, animate_waves=False):
+        self.client = client
+        self.animate_waves = animate_waves
+        self.sensor_data = {}
+        self.sampling_clock = FixedRateClock(SAMPLE_PERIOD)
+        self.telemetry_queue = asyncio.Queue()
+        self.led_queue = asyncio.Queue()
+        self.loop = None
+        # Estado del ventilador: solo se publican los cambios, con ventana de mensajes en vuelo
+        self.mqtt = AsyncMqttPublisher()
+        self.arduino = ArduinoPublisher(self.mqtt, MQTT_TOPIC, window=ARDUINO_WINDOW)
+        self.mqtt.on_publish = self.arduino.on_publish
+        # Los handlers se ejecutan en los hilos del despachador: pasan el trabajo al bucle de eventos
+        self.command_dispatcher = register_commands(
+            CommandDispatcher(workers=COMMAND_WORKERS, max_pending=COMMAND_MAX_PENDING),
+            set_fan=lambda state: self.loop.call_soon_threadsafe(self.send_to_arduino, state),
+            set_brightness=lambda intensity: self.loop.call_soon_threadsafe(
+                self.led_queue.put_nowait, ("note", self.sensor_data.get('joystick_action', 'No Selection'), intensity)),
+        )
+        self.batcher = None
+        if BATCH_MODE:
+            self.batcher = TelemetryBatcher(
+                lambda body, count: self.telemetry_queue.put_nowait((body, count)),
+                max_samples=BATCH_MAX_SAMPLES,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                encoding=TELEMETRY_ENCODING,
+                compression=TELEMETRY_COMPRESSION,
+            )
+
+    # LECTURA DE SENSORES
+    async def sampler_task(self):
+        while True:
+            await asyncio.sleep(self.sampling_clock.delay())
+            tick = self.sampling_clock.tick()
+            if self.batcher:
+                self.batcher.flush_if_due()  # El lote abierto no espera más de `max_wait_ms`
+            joystick_action = read_joystick(sense)
+            self.sensor_data.update({
+                'boot': BOOT_ID,
+                'seq': tick.seq,
+                'ts': round(time.time(), 3),
+                'temperature': read_temperature(sense),
+                'light': read_light(sense),
+                'joystick_action': joystick_action,
+            })
+
+            if joystick_action in WINE_SELECTION.values():
+                self.led_queue.put_nowait(("wave" if self.animate_waves else "note", joystick_action, 1))
+
+            if self.batcher:
+                self.batcher.add(dict(self.sensor_data), urgent=joystick_action != "No Selection")
+            else:
+                body = encode_samples([self.sensor_data], TELEMETRY_ENCODING, batch=False)
+                self.telemetry_queue.put_nowait((body, None))
+
+    # ENVÍO DE TELEMETRÍA A AZURE
+    async def send_telemetry(self, body, batch_size=None):
+        azure_iot_message = Message(body.data)
+        azure_iot_message.content_encoding = body.content_encoding
+        azure_iot_message.content_type = body.content_type
+        if batch_size is not None:
+            azure_iot_message.custom_properties[BATCH_PROPERTY] = str(batch_size)
+        await self.client.send_message(azure_iot_message)
+        print(f"Message sent: {azure_iot_message}")
+
+    async def telemetry_task(self):
+        backoff = Backoff(maximum=TELEMETRY_RETRY_DELAY)
+        while True:
+            body, batch_size = await self.telemetry_queue.get()
+            # Un envío fallido se reintenta con backoff; mientras, las lecturas nuevas esperan en la cola
+            while True:
+                try:
+                    await self.send_telemetry(body, batch_size)
+                except Exception as e:
+                    delay = backoff.next_delay()
+                    print(f"Error al enviar la telemetría ({self.telemetry_queue.qsize() + 1} mensajes "
+                          f"pendientes): {e}. Reintento en {delay:.1f} s")
+                    await asyncio.sleep(delay)
+                    continue
+                backoff.reset()
+                break
+
+    # HANDLE INCOMING COMMANDS FROM AZURE
+    def on_message_received(self, message):
+        # El SDK llama a este handler desde otro hilo; el despachador no espera a que acabe el comando
+        self.command_dispatcher.dispatch(message.data)
+
+    # CONTROL DEL ARDUINO VÍA MQTT
+    def send_to_arduino(self, message):
+        outcome = self.arduino.set_state(message)
+        if outcome == "suppressed":
+            print(f"Arduino ya en estado {message}, no se publica.")
+        elif outcome == "queued" and self.mqtt.client is None:
+            print("No conectado al broker MQTT. El mensaje se enviará al reconectar.")
+
+    async def arduino_task(self):
+        backoff = Backoff(maximum=MQTT_RETRY_DELAY)
+        while True:
+            try:
+                async with aiomqtt.Client(MQTT_BROKER, MQTT_PORT, keepalive=60) as mqtt_client:
+                    print("Conectado exitosamente al broker MQTT.")
+                    backoff.reset()
+                    self.mqtt.client = mqtt_client
+                    self.mqtt.failed.clear()
+                    self.arduino.on_connect()  # Envía el estado que quedó pendiente sin conexión
+                    await self.mqtt.failed.wait()
+                    print("Desconectado del broker MQTT.")
+            except aiomqtt.MqttError as e:
+                print(f"Error al conectar al broker MQTT: {e}")
+            finally:
+                self.mqtt.client = None
+                self.arduino.on_disconnect()
+            await asyncio.sleep(backoff.next_delay())
+
+    # MATRIZ LED
+    async def led_task(self):
+        animation = None
+        try:
+            while True:
+                mode, wine, intensity = await self.led_queue.get()
+                if animation:
+                    animation.cancel()
+                    animation = None
+                if mode == "wave" and wine in WAVE_SETTINGS:
+                    animation = asyncio.create_task(animate_continuous_wave(WAVE_FRAMES[wine]))
+                else:
+                    sense.set_pixels(frame_cache.get(wine, intensity).pixels)
+        finally:
+            if animation:
+                animation.cancel()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.command_dispatcher.start()
+        self.client.on_message_received = self.on_message_received
+        await self.client.connect()
+
+        print("IoT Hub Sensor Telemetry and Command Listener")
+        print("Press Ctrl-C to exit")
+
+        tasks = [
+            asyncio.create_task(self.sampler_task()),
+            asyncio.create_task(self.telemetry_task()),
+            asyncio.create_task(self.arduino_task()),
+            asyncio.create_task(self.led_task()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Envía lo que quede pendiente antes de cerrar la conexión
+            if self.batcher:
+                self.batcher.flush()
+            try:
+                while not self.telemetry_queue.empty():
+                    await self.send_telemetry(*self.telemetry_queue.get_nowait())
+            except Exception as e:
+                print(f"Telemetría sin enviar al cerrar ({self.telemetry_queue.qsize() + 1} mensajes): {e}")
+            await self.client.shutdown()
+            self.command_dispatcher.stop(timeout=1)
+            print(f"Comandos: {self.command_dispatcher.stats()}")
+            print(f"Arduino: {self.arduino.stats()}")
+
+
+# ANIMACIÓN DE ONDA SINUSOIDAL (equivalente a `animate_continuous_wave` de mainprueba-copy.py)
+async def animate_continuous_wave(frames):
+    # Recorre en bucle la secuencia precalculada, con plazos fijos
+    clock = FixedRateClock(ANIMATION_PERIOD)
+    for frame in itertools.cycle(frames):
+        await asyncio.sleep(clock.delay())
+        clock.tick()
+        led_output.show(frame)
+
+
+# MAIN SCRIPT
+def main():
+    client = IoTHubDeviceClient.create_from_connection_string(AUX_CONNECTION_STRING)
+    GPIO.setmode(GPIO.BCM)
+    runtime = DeviceRuntime(client, animate_waves=ANIMATE_WAVES)
+    try:
+        asyncio.run(runtime.run())
+    except KeyboardInterrupt:
+        print("IoTHubClient sample stopped")
+    finally:
+        GPIO.cleanup()
+        sense.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -36,11 +36,12 @@ El script también asegura la limpieza de los recursos GPIO y la matriz LED al f
 import json
 import sys
 import time
-from sense_hat import SenseHat
+from hardware import create_backend
+from framebuffer import create_led_output
+from animation import AnimationEngine, wave_sequence
 from azure.iot.device import IoTHubDeviceClient, Message
 import threading
 import paho.mqtt.client as mqtt  # Para comunicación con Arduino
-import RPi.GPIO as GPIO
 
 # Azure IoT Hub Connection String
 AUX_CONNECTION_STRING = "HostName=icaiiotflavoursense.azure-devices.net;DeviceId=SenseHat;SharedAccessKey=1zTmZeEfAeDwV7P7gf2ERKkiG1F/2mG79ou5RM8BYlA="
@@ -55,7 +56,10 @@ mqtt_client = mqtt.Client("RaspberryPiClient")
 mqtt_connected = False
 
 # Initialize SenseHat
-sense = SenseHat()
+hardware = create_backend()  # Sense HAT real o simulado (FLAVOURSENSE_BACKEND=sim)
+sense = hardware.sense
+GPIO = hardware.gpio
+led = create_led_output(sense)  # set_pixels o framebuffer directo (FLAVOURSENSE_FRAMEBUFFER)
 
 # GPIO Setup
 GPIO.setmode(GPIO.BCM)
@@ -133,44 +137,27 @@ def get_sensor_joystick():
                 return "Noise Detected"
     return "No Selection"
 
-# Función para generar una onda sinusoidal
-def generate_continuous_wave_matrix(amplitude, frequency, phase_shift, color):
-    matrix = [[black for _ in range(8)] for _ in range(8)]
-    prev_y = None  # Para unir puntos de forma continua
-
-    for x in range(8):
-        y_position = int(3.5 + amplitude * math.sin(frequency * x + phase_shift))
-        matrix[y_position][x] = color
-        if prev_y is not None and prev_y != y_position:
-            step = 1 if y_position > prev_y else -1
-            for intermediate_y in range(prev_y, y_position, step):
-                matrix[intermediate_y][x] = color
-        prev_y = y_position
-    return matrix
+# Animaciones de la matriz: un único hilo que reproduce secuencias precalculadas (ver animation.py)
+animation = AnimationEngine(led, period=0.2)
+WAVE_TRANSITION_FRAMES = 4  # Fundido entre ondas al cambiar de vino (requiere NumPy)
 
 # Función para mostrar una onda sinusoidal continuamente
-def animate_continuous_wave(wave_settings, stop_flag):
+def animate_continuous_wave(wine, wave_settings):
     amplitude, frequency, color = wave_settings
-    phase_shift = 0
-    while not stop_flag[0]:
-        wave_matrix = generate_continuous_wave_matrix(amplitude, frequency, phase_shift, color)
-        flattened_matrix = [pixel for row in wave_matrix for pixel in row]
-        sense.set_pixels(flattened_matrix)
-        phase_shift += 0.5
-        time.sleep(0.2)
+    animation.play(("wave", wine, amplitude, frequency, tuple(color)),
+                   lambda: wave_sequence(amplitude, frequency, color), transition=WAVE_TRANSITION_FRAMES)
 
 # Función para mostrar una línea horizontal azul
 def display_horizontal_line(color):
-    matrix = [[black for _ in range(8)] for _ in range(8)]
+    pixels = [[0, 0, 0]] * 64
     for x in range(8):
-        matrix[3][x] = color  # Línea centrada
-    flattened_matrix = [pixel for row in matrix for pixel in row]
-    sense.set_pixels(flattened_matrix)
+        pixels[3 * 8 + x] = color  # Línea centrada
+    animation.show_still(("line", tuple(color)), pixels)
 
 # DISPLAY NOTES ON LED MATRIX
 def display_note(note, intensity=1):
     matrix = get_note_matrix(note, intensity)
-    sense.set_pixels(matrix)
+    led.set_pixels(matrix)
 
 # HANDLE INCOMING COMMANDS FROM AZURE
 def handle_command(client):
@@ -201,9 +188,6 @@ def handle_command(client):
 # MAIN SCRIPT
 def iothub_client_telemetry_sample_run():
     try:
-        current_thread = None  # Control del hilo actual
-        stop_flag = [False]  # Señal para detener el hilo de animación
-
        # Definición de colores
         black = [0, 0, 0]
         red = [255, 0, 0]  # Corchea - Red Wine
@@ -220,6 +204,7 @@ def iothub_client_telemetry_sample_run():
         print("Press Ctrl-C to exit")
 
         threading.Thread(target=handle_command, args=(client,), daemon=True).start()
+        animation.start()
 
         while True:
             temperature = get_sensor_temperature()
@@ -229,9 +214,6 @@ def iothub_client_telemetry_sample_run():
                 if event.action == "pressed":
                     if event.direction == "middle":
                         print("Joystick presionado en el centro.")
-                        if current_thread:
-                            stop_flag[0] = True
-                            current_thread.join()
                         display_horizontal_line([0, 0, 255])  # Línea azul
                     elif event.direction in WINE_SELECTION:
                         wine = WINE_SELECTION[event.direction]
@@ -244,14 +226,8 @@ def iothub_client_telemetry_sample_run():
                         elif wine == "White Wine":
                             wave_settings = (1, 1.2, white)
 
-                        if current_thread:
-                            stop_flag[0] = True
-                            current_thread.join()
-                        stop_flag = [False]
-                        current_thread = threading.Thread(
-                            target=animate_continuous_wave, args=(wave_settings, stop_flag)
-                        )
-                        current_thread.start()
+                        # Cambia la animación en curso sin parar el hilo
+                        animate_continuous_wave(wine, wave_settings)
 
             sensor_data.update({
                 'temperature': temperature,
@@ -270,9 +246,9 @@ def iothub_client_telemetry_sample_run():
     except KeyboardInterrupt:
         print("IoTHubClient sample stopped")
     finally:
-        stop_flag[0] = True  # Asegurarse de detener cualquier animación activa
-        if current_thread:
-            current_thread.join()
+        if animation.is_alive():
+            animation.stop(timeout=1)  # Asegurarse de detener cualquier animación activa
+            print(f"Animaciones: {animation.stats()}")
         mqtt_client.loop_stop()
         mqtt_client.disconnect()
         GPIO.cleanup()
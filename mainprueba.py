@@ -24,38 +24,111 @@ y reaccionar a comandos recibidos desde la nube. Las principales funciones del s
      - `"Increase Brightness"`: Aumenta la intensidad de las notas en la matriz LED.
      - `"Decrease Brightness"`: Reduce la intensidad de las notas en la matriz LED.
      - `"Temperature Low"`: Indicación recibida, pero sin acción implementada por ahora.
+   - Los comandos se despachan por tabla en un pool de hilos (`command_dispatch.py`): una ráfaga de
+     comandos de brillo o de ventilador se reduce al último.
 
 4. **Intercambio de datos:**
    - Los datos se envían a Azure IoT Hub en tiempo real, en mensajes codificados en JSON.
    - Azure procesa estos datos y puede devolver comandos que la Raspberry Pi ejecuta.
    - Este flujo permite una interacción bidireccional entre la Raspberry Pi y Azure.
+   - Las conexiones con IoT Hub y con el broker MQTT las mantiene `connection_supervisor.py`: se
+     establecen en paralelo al arrancar y se reconectan con backoff exponencial y jitter. Mientras IoT
+     Hub está desconectado, la telemetría espera en memoria (`TELEMETRY_PENDING_MAX` mensajes).
 
 El script también asegura la limpieza de los recursos GPIO y la matriz LED al finalizar la ejecución.
 """
 
+import collections
+import itertools
 import json
 import sys
 import time
-from sense_hat import SenseHat
+from hardware import create_backend
 from azure.iot.device import IoTHubDeviceClient, Message
+from azure.iot.device.exceptions import ClientError, CredentialError, OperationCancelled, OperationTimeout
 import threading
 import paho.mqtt.client as mqtt  # Para comunicación con Arduino
-import RPi.GPIO as GPIO
+from telemetry_batch import TelemetryBatcher, BATCH_PROPERTY
+from telemetry_codec import encode_samples
+from store_forward import SegmentQueue, Drainer
+from deadband import DeadbandFilter
+from sampling_clock import FixedRateClock
+from aggregation import Oversampler
+from joystick_events import JoystickReader
+from command_dispatch import CommandDispatcher
+from led_frames import FrameCache
+from arduino_publisher import ArduinoPublisher
+from local_broker import BrokerThread
+from connection_supervisor import Backoff, ConnectionSupervisor, PermanentConnectionError, SupervisedConnection
+# Configuración común con main_async.py (periodo, formato, lotes, conexiones, comandos): ver device_config.py
+from device_config import (
+    ARDUINO_WINDOW,
+    AUX_CONNECTION_STRING,
+    BATCH_MAX_SAMPLES,
+    BATCH_MAX_WAIT_MS,
+    BATCH_MODE,
+    BOOT_ID,
+    COMMAND_MAX_PENDING,
+    COMMAND_WORKERS,
+    FRAME_CACHE_SIZE,
+    MQTT_BROKER,
+    MQTT_PORT,
+    MQTT_TOPIC,
+    SAMPLE_PERIOD,
+    TELEMETRY_COMPRESSION,
+    TELEMETRY_ENCODING,
+    WINE_SELECTION,
+    get_joystick_action,
+    read_joystick,
+    read_light,
+    read_temperature,
+    register_commands,
+)
+
+# Sobremuestreo: lecturas por segundo agregadas en cada periodo (None para leer una vez por periodo)
+OVERSAMPLE_HZ = None
+
+# Lector dedicado del joystick: no pierde pulsaciones y envía selecciones y ruido al instante
+JOYSTICK_FAST_PATH = True
+
+# Cola en disco para no perder lecturas sin conexión (None para desactivarla)
+STORE_FORWARD_DIR = None    # Por ejemplo "/home/pi/flavoursense-queue"
+STORE_FORWARD_MAX_BYTES = 64 * 1024 * 1024
+STORE_FORWARD_BATCH = 50    # Lecturas por mensaje al vaciar la cola
+
+# Envío solo por cambios: delta mínimo por campo (0 = cualquier cambio) y latido en segundos
+DEADBAND_MODE = False
+DEADBANDS = {
+    "temperature": 0.25,
+    "light": 0,
+    "joystick_action": 0,
+}
+DEADBAND_HEARTBEAT = 60
 
-# Azure IoT Hub Connection String
-AUX_CONNECTION_STRING = "HostName=icaiiotflavoursense.azure-devices.net;DeviceId=SenseHat;SharedAccessKey=1zTmZeEfAeDwV7P7gf2ERKkiG1F/2mG79ou5RM8BYlA="
+# Broker MQTT propio en la Raspberry Pi (local_broker.py): el Arduino se conecta a la IP de la Pi en la LAN
+MQTT_EMBEDDED_BROKER = False
+MQTT_EMBEDDED_HOST = "0.0.0.0"
+MQTT_CONNACK_TIMEOUT = 10
 
-# MQTT Broker Configuración
-MQTT_BROKER = "broker.hivemq.com"
-MQTT_PORT = 1883
-MQTT_TOPIC = "test-arduino"
+# Supervisión de conexiones (connection_supervisor.py): MQTT e IoT Hub conectan en paralelo al arrancar
+CONNECT_TIMEOUT = 30         # Espera máxima a las conexiones antes de empezar el bucle
+RECONNECT_MIN_DELAY = 0.5    # Backoff exponencial con jitter entre estos dos valores (s)
+RECONNECT_MAX_DELAY = 60
+HEALTH_REPORT_PERIOD = 300   # Estado de las conexiones en el device twin cada N s (None = no publicar)
+TELEMETRY_PENDING_MAX = 300  # Mensajes guardados en memoria sin conexión con IoT Hub (se descartan los más antiguos)
 
 # Variables de control para MQTT
 mqtt_client = mqtt.Client("RaspberryPiClient")
 mqtt_connected = False
+mqtt_connack = threading.Event()
+mqtt_connack_rc = None
+# Estado del ventilador: solo se publican los cambios, con ventana de mensajes en vuelo
+arduino = ArduinoPublisher(mqtt_client, MQTT_TOPIC, window=ARDUINO_WINDOW)
 
 # Initialize SenseHat
-sense = SenseHat()
+hardware = create_backend()  # Sense HAT real o simulado (FLAVOURSENSE_BACKEND=sim)
+sense = hardware.sense
+GPIO = hardware.gpio
 
 # GPIO Setup
 GPIO.setmode(GPIO.BCM)
@@ -63,19 +136,15 @@ GPIO.setmode(GPIO.BCM)
 # SENSOR DATA STRUCTURE
 sensor_data = {}
 
-# MAP JOYSTICK INPUT TO WINE TYPE
-WINE_SELECTION = {
-    "up": "Red Wine",
-    "down": "White Wine",
-    "right": "Rosé Wine",
-}
-
 # MQTT Callbacks
 def on_connect(client, userdata, flags, rc):
-    global mqtt_connected
+    global mqtt_connected, mqtt_connack_rc
+    mqtt_connack_rc = rc
+    mqtt_connack.set()
     if rc == 0:
         print("Conectado exitosamente al broker MQTT.")
         mqtt_connected = True
+        arduino.on_connect()  # Envía el estado que quedó pendiente sin conexión
     else:
         print(f"Error al conectar al broker MQTT: {rc}")
         mqtt_connected = False
@@ -84,176 +153,350 @@ def on_disconnect(client, userdata, rc):
     global mqtt_connected
     print("Desconectado del broker MQTT.")
     mqtt_connected = False
+    arduino.on_disconnect()
+    supervisor.connection_lost("mqtt")
 
 def on_publish(client, userdata, mid):
     print(f"Mensaje publicado exitosamente. ID del mensaje: {mid}")
+    arduino.on_publish(mid)
 
 mqtt_client.on_connect = on_connect
 mqtt_client.on_disconnect = on_disconnect
 mqtt_client.on_publish = on_publish
 
-# Reconexión periódica al broker MQTT
-def mqtt_connect_with_retry():
-    global mqtt_connected
-    while not mqtt_connected:
-        try:
-            print("Intentando conectar al broker MQTT...")
-            mqtt_client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
-            mqtt_client.loop_start()
-            time.sleep(2)  # Espera antes de verificar el estado
-        except Exception as e:
-            print(f"Error al conectar al broker MQTT: {e}")
-            time.sleep(5)  # Reintentar tras un breve retraso
+# Conexión al broker MQTT: la reintenta el supervisor de conexiones
+def mqtt_connect():
+    # Para el hilo de red anterior: los reintentos los hace el supervisor, no paho
+    mqtt_client.loop_stop()
+    mqtt_connack.clear()
+    print("Intentando conectar al broker MQTT...")
+    mqtt_client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
+    mqtt_client.loop_start()
+    if not mqtt_connack.wait(MQTT_CONNACK_TIMEOUT):
+        raise TimeoutError("El broker MQTT no respondió al CONNECT")
+    if mqtt_connack_rc in (4, 5):
+        raise PermanentConnectionError(f"Conexión MQTT rechazada (rc={mqtt_connack_rc})")
+    if mqtt_connack_rc != 0:
+        raise ConnectionError(f"Conexión MQTT rechazada (rc={mqtt_connack_rc})")
+
+def mqtt_disconnect():
+    mqtt_client.disconnect()
+    mqtt_client.loop_stop()
+
+def mqtt_connect_with_retry(timeout=None):
+    supervisor.start("mqtt")
+    return supervisor.wait_ready("mqtt", timeout=timeout)
+
+def create_iothub_connection(client):
+    # Sin `connection_retry` en el cliente: al caer la conexión avisa y el supervisor reconecta
+    def on_connection_state_change():
+        if not client.connected:
+            print("Desconectado de IoT Hub.")
+            supervisor.connection_lost("iothub")
+
+    client.on_connection_state_change = on_connection_state_change
+    return SupervisedConnection(
+        "iothub",
+        connect=client.connect,
+        is_connected=lambda: client.connected,
+        disconnect=client.disconnect,
+        backoff=Backoff(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY),
+        is_transient=lambda error: not isinstance(error, CredentialError),
+    )
+
+def report_connection_health(client, stats):
+    client.patch_twin_reported_properties({"connectionHealth": stats})
+
+supervisor = ConnectionSupervisor(report_period=HEALTH_REPORT_PERIOD)
+supervisor.add(SupervisedConnection(
+    "mqtt",
+    connect=mqtt_connect,
+    is_connected=lambda: mqtt_connected,
+    disconnect=mqtt_disconnect,
+    reset=mqtt_client.loop_stop,
+    backoff=Backoff(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY),
+))
+
+# Arranca el broker local dentro de este proceso y se conecta a él
+def start_embedded_broker():
+    global MQTT_BROKER
+    broker = BrokerThread(MQTT_EMBEDDED_HOST, MQTT_PORT).start()
+    MQTT_BROKER = "127.0.0.1"
+    print(f"Broker MQTT local en {MQTT_EMBEDDED_HOST}:{broker.broker.port}")
+    return broker
 
 # Métodos para controlar el Arduino vía MQTT
 def send_to_arduino(message):
-    if mqtt_connected:
-        result = mqtt_client.publish(MQTT_TOPIC, message, qos=1, retain=True)
-        if result.rc == 0:
-            print(f"Mensaje enviado a Arduino: {message}")
-        else:
-            print(f"Error al enviar mensaje a Arduino: {result.rc}")
-    else:
-        print("No conectado al broker MQTT. No se pudo enviar el mensaje.")
+    outcome = arduino.set_state(message)
+    if outcome == "suppressed":
+        print(f"Arduino ya en estado {message}, no se publica.")
+    elif outcome == "queued" and not mqtt_connected:
+        print("No conectado al broker MQTT. El mensaje se enviará al reconectar.")
 
 # Métodos para obtener valores del Sense HAT
 def get_sensor_temperature():
-    return round(sense.get_temperature(), 2)
+    return read_temperature(sense)
 
 def get_sensor_light():
-    humidity = sense.get_humidity()
-    return "Low Light" if humidity < 50 else "High Light"
+    return read_light(sense)
 
 def get_sensor_joystick():
-    for event in sense.stick.get_events():
-        if event.action == "pressed":
-            if event.direction in WINE_SELECTION:
-                return WINE_SELECTION[event.direction]
-            elif event.direction == "left":
-                return "Noise Detected"
-    return "No Selection"
+    return read_joystick(sense)
 
 # MATRICES DE NOTAS MUSICALES
+# Frames de las notas por (nota, intensidad), precalculados al arrancar
+frame_cache = FrameCache(max_frames=FRAME_CACHE_SIZE)
+frame_cache.warm()
+
 def get_note_matrix(note, intensity=1):
-    black = [0, 0, 0]
-    red = [int(139 * intensity), 0, 0]
-    pink = [int(255 * intensity), int(182 * intensity), int(193 * intensity)]
-    white = [int(255 * intensity), int(255 * intensity), int(255 * intensity)]
-
-    corchea = [
-        black, black, black, red, red, black, black, black,
-        black, black, black, red, red, black, black, black,
-        black, black, red, red, red, red, black, black,
-        black, black, red, red, red, red, black, black,
-        black, black, black, red, red, black, black, black,
-        black, black, black, red, red, black, black, black,
-        black, black, black, red, red, black, black, black,
-        black, black, black, black, black, black, black, black,
-    ]
-
-    semicorchea = [
-        black, black, pink, pink, black, black, black, black,
-        black, black, pink, pink, black, black, black, black,
-        black, pink, pink, pink, pink, black, black, black,
-        black, pink, pink, pink, pink, black, black, black,
-        black, black, pink, pink, pink, pink, black, black,
-        black, black, pink, pink, pink, pink, black, black,
-        black, black, black, pink, pink, black, black, black,
-        black, black, black, black, black, black, black, black,
-    ]
-
-    blanca = [
-        black, black, white, white, white, white, black, black,
-        black, white, white, black, black, white, white, black,
-        black, white, black, black, black, black, white, black,
-        black, white, black, black, black, black, white, black,
-        black, white, black, black, black, black, white, black,
-        black, white, white, black, black, white, white, black,
-        black, black, white, white, white, white, black, black,
-        black, black, black, black, black, black, black, black,
-    ]
-
-    if note == "Red Wine":
-        return corchea
-    elif note == "Rosé Wine":
-        return semicorchea
-    elif note == "White Wine":
-        return blanca
-    else:
-        return [black] * 64
+    # Frame precalculado (ver led_frames.py): lista de 64 colores lista para set_pixels
+    return frame_cache.get(note, intensity).pixels
 
 # DISPLAY NOTES ON LED MATRIX
 def display_note(note, intensity=1):
     matrix = get_note_matrix(note, intensity)
     sense.set_pixels(matrix)
 
-# HANDLE INCOMING COMMANDS FROM AZURE
-def handle_command(client):
-    while True:
-        message = client.receive_message()
-        payload = json.loads(message.data)
-        command = payload.get("command", None)
-
-        if command == "Fan ON":
-            print("Command received: Fan ON")
-            send_to_arduino("ON")
+# ENVÍO DE TELEMETRÍA A AZURE
+def send_telemetry(client, body, batch_size=None):
+    azure_iot_message = Message(body.data)
+    azure_iot_message.content_encoding = body.content_encoding
+    azure_iot_message.content_type = body.content_type
+    if batch_size is not None:
+        azure_iot_message.custom_properties[BATCH_PROPERTY] = str(batch_size)
+    client.send_message(azure_iot_message)
+    print(f"Message sent: {azure_iot_message}")
+
+# El cliente no reintenta por su cuenta (`connection_retry=False`): sin conexión, `send_message` falla.
+# Los mensajes se guardan en memoria y se envían en orden cuando el supervisor recupera la conexión (el
+# bucle principal lo comprueba en cada periodo).
+SEND_ERRORS = (ClientError, OperationTimeout, OperationCancelled)
+pending_telemetry = collections.deque()
+telemetry_delivery = {"sent": 0, "failed": 0, "dropped": 0}
+
+def deliver_telemetry(client, body, batch_size=None):
+    if len(pending_telemetry) >= TELEMETRY_PENDING_MAX:
+        pending_telemetry.popleft()
+        telemetry_delivery["dropped"] += 1
+    pending_telemetry.append((body, batch_size))
+    flush_pending_telemetry(client)
+
+def flush_pending_telemetry(client):
+    """Envía los mensajes pendientes mientras haya conexión. Devuelve si se han enviado todos."""
+    while pending_telemetry and supervisor.is_connected("iothub"):
+        body, batch_size = pending_telemetry[0]
+        try:
+            send_telemetry(client, body, batch_size)
+        except SEND_ERRORS as e:
+            telemetry_delivery["failed"] += 1
+            print(f"Error al enviar la telemetría ({len(pending_telemetry)} mensajes pendientes): {e}")
+            return False
+        pending_telemetry.popleft()
+        telemetry_delivery["sent"] += 1
+    return not pending_telemetry
+
+def send_urgent_telemetry(client, record):
+    try:
+        send_telemetry(client, encode_samples([json.loads(record)], TELEMETRY_ENCODING, batch=False))
+    except SEND_ERRORS:
+        telemetry_delivery["failed"] += 1
+        raise
+    telemetry_delivery["sent"] += 1
 
-        elif command == "Fan OFF":
-            print("Command received: Fan OFF")
-            send_to_arduino("OFF")
+def send_queued_telemetry(client, records):
+    samples = [json.loads(record) for record in records]
+    body = encode_samples(samples, TELEMETRY_ENCODING, TELEMETRY_COMPRESSION)
+    send_telemetry(client, body, batch_size=len(samples))
 
-        elif command == "Increase Brightness":
-            print("Command received: Increase Brightness")
-            display_note(sensor_data.get('joystick_action', 'No Selection'), intensity=2)
+# HANDLE INCOMING COMMANDS FROM AZURE
+def set_brightness(intensity):
+    display_note(sensor_data.get('joystick_action', 'No Selection'), intensity=intensity)
 
-        elif command == "Decrease Brightness":
-            print("Command received: Decrease Brightness")
-            display_note(sensor_data.get('joystick_action', 'No Selection'), intensity=0.5)
+# Tabla de comandos común con main_async.py (device_config.register_commands)
+command_dispatcher = register_commands(
+    CommandDispatcher(workers=COMMAND_WORKERS, max_pending=COMMAND_MAX_PENDING),
+    set_fan=lambda state: send_to_arduino(state),  # Se busca al llamar: bench_commands.py la sustituye
+    set_brightness=set_brightness,
+)
 
-        elif command == "Temperature Low":
-            print("Command received: Temperature Low - To be implemented.")
+def handle_command(client):
+    command_dispatcher.start()
+    while True:
+        message = client.receive_message()
+        command_dispatcher.dispatch(message.data)
 
 # MAIN SCRIPT
 def iothub_client_telemetry_sample_run():
+    batcher = None
+    queue = None
+    drainer = None
+    deadband = None
+    sampling_clock = FixedRateClock(SAMPLE_PERIOD)
+    oversampler = None
+    joystick = None
+    broker = None
+    client = None
+    telemetry_lock = threading.Lock()  # El bucle y la vía rápida del joystick: envíos y `sensor_data`
+    event_seq = itertools.count(1)
+    suppressed_readings = 0  # Lecturas con `seq` que la banda muerta no ha enviado en este arranque
     try:
-        client = IoTHubDeviceClient.create_from_connection_string(AUX_CONNECTION_STRING)
+        if MQTT_EMBEDDED_BROKER:
+            broker = start_embedded_broker()
+
+        client = IoTHubDeviceClient.create_from_connection_string(AUX_CONNECTION_STRING, connection_retry=False)
+        supervisor.add(create_iothub_connection(client))
+        if HEALTH_REPORT_PERIOD:
+            supervisor.report = lambda stats: report_connection_health(client, stats)
+        # Las dos conexiones se establecen en paralelo mientras se prepara el resto
+        print("Conectando al broker MQTT y a IoT Hub...")
+        supervisor.start()
+
+        if DEADBAND_MODE:
+            deadband = DeadbandFilter(DEADBANDS, heartbeat=DEADBAND_HEARTBEAT)
+
+        if OVERSAMPLE_HZ:
+            oversampler = Oversampler(sense.get_temperature, sense.get_humidity, rate_hz=OVERSAMPLE_HZ)
+            oversampler.start()
+
+        if STORE_FORWARD_DIR:
+            # El bucle solo escribe en disco; el envío lo hace el hilo Drainer
+            queue = SegmentQueue(STORE_FORWARD_DIR, max_bytes=STORE_FORWARD_MAX_BYTES)
+            drainer = Drainer(queue, lambda records: send_queued_telemetry(client, records),
+                              batch_size=STORE_FORWARD_BATCH,
+                              send_one=lambda record: send_urgent_telemetry(client, record))
+            drainer.start()
+            print(f"Cola de telemetría en disco: {queue.stats()}")
+        elif BATCH_MODE:
+            batcher = TelemetryBatcher(
+                lambda body, count: deliver_telemetry(client, body, batch_size=count),
+                max_samples=BATCH_MAX_SAMPLES,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                encoding=TELEMETRY_ENCODING,
+                compression=TELEMETRY_COMPRESSION,
+            )
+
+        def emit_telemetry(sample, urgent=False):
+            nonlocal suppressed_readings
+            with telemetry_lock:
+                if deadband:
+                    if deadband.offer(sample) is None and not urgent:
+                        if 'seq' in sample:
+                            suppressed_readings += 1
+                        return  # Dentro de la banda muerta: no se envía
+                    if 'seq' in sample:
+                        # Total acumulado: el análisis de secuencias no cuenta como perdidas las `seq` que faltan
+                        # por la banda muerta, aunque se pierda algún mensaje intermedio
+                        sample = dict(sample, suppressed=suppressed_readings)
+                if queue:
+                    # Las selecciones y el ruido no esperan detrás de la cola en disco si hay conexión: los
+                    # envía el hilo Drainer antes que la cola (y, si fallan, los guarda en ella)
+                    if urgent and supervisor.is_connected("iothub"):
+                        drainer.send_urgent(json.dumps(sample))
+                    else:
+                        queue.append(json.dumps(sample))
+                elif batcher:
+                    # Las selecciones y el ruido se envían sin esperar a completar el lote
+                    batcher.add(dict(sample), urgent=urgent)
+                else:
+                    deliver_telemetry(client, encode_samples([sample], TELEMETRY_ENCODING, batch=False))
+
+        def on_joystick_event(event):
+            action = get_joystick_action(event)
+            if action is None:
+                return
+            if action in WINE_SELECTION.values():
+                display_note(action)
+            # Mensaje de evento: lleva su propio contador para no mezclarse con la secuencia de lecturas. La
+            # copia se hace con el lock: el bucle principal actualiza `sensor_data` desde otro hilo
+            with telemetry_lock:
+                sample = {key: value for key, value in sensor_data.items() if key != 'seq'}
+            sample.update({
+                'event_seq': next(event_seq),
+                'ts': round(event.timestamp, 3),
+                'joystick_action': action,
+            })
+            emit_telemetry(sample, urgent=True)
 
-        print("Conectando al broker MQTT...")
-        mqtt_connect_with_retry()
+        if not supervisor.wait_ready(timeout=CONNECT_TIMEOUT):
+            print("Conexiones aún sin establecer; se siguen reintentando en segundo plano.")
+        print(f"Conexiones: {supervisor.stats()}")
 
         print("IoT Hub Sensor Telemetry and Command Listener")
         print("Press Ctrl-C to exit")
 
         threading.Thread(target=handle_command, args=(client,), daemon=True).start()
 
-        while True:
-            temperature = get_sensor_temperature()
-            light = get_sensor_light()
-            joystick_action = get_sensor_joystick()
-
-            if joystick_action in WINE_SELECTION.values():
-                display_note(joystick_action)
-
-            sensor_data.update({
-                'temperature': temperature,
-                'light': light,
-                'joystick_action': joystick_action,
-            })
-
-            json_sensor_data = json.dumps(sensor_data)
-            azure_iot_message = Message(json_sensor_data)
-            azure_iot_message.content_encoding = 'utf-8'
-            azure_iot_message.content_type = 'application/json'
-            client.send_message(azure_iot_message)
-            print(f"Message sent: {azure_iot_message}")
+        if JOYSTICK_FAST_PATH:
+            joystick = JoystickReader(sense.stick, on_event=on_joystick_event)
+            joystick.start()
 
-            time.sleep(1)
+        while True:
+            tick = sampling_clock.wait()
+            # Con sobremuestreo se publica el agregado de la ventana en lugar de una única lectura
+            readings = oversampler.take_window() if oversampler else None
+            if not readings:
+                readings = {
+                    'temperature': get_sensor_temperature(),
+                    'light': get_sensor_light(),
+                }
+            if joystick:
+                # Todas las pulsaciones del periodo ya se enviaron por la vía rápida; la lectura lleva la última
+                actions = [get_joystick_action(event) for event in joystick.drain()]
+                actions = [action for action in actions if action]
+                joystick_action = actions[-1] if actions else "No Selection"
+            else:
+                joystick_action = get_sensor_joystick()
+                if joystick_action in WINE_SELECTION.values():
+                    display_note(joystick_action)
+
+            with telemetry_lock:
+                sensor_data.update({
+                    'boot': BOOT_ID,
+                    'seq': tick.seq,  # Contador de lecturas de este arranque
+                    'ts': round(time.time(), 3),  # Hora del dispositivo (epoch en segundos)
+                    'joystick_action': joystick_action,
+                })
+                sensor_data.update(readings)
+
+            if batcher:
+                # Con banda muerta o sin lecturas nuevas el lote no se cerraría solo al añadir muestras
+                with telemetry_lock:
+                    batcher.flush_if_due()
+            if pending_telemetry:
+                # Tras reconectar, lo guardado sin conexión sale sin esperar al siguiente envío
+                with telemetry_lock:
+                    flush_pending_telemetry(client)
+            emit_telemetry(sensor_data, urgent=joystick_action != "No Selection" and not joystick)
 
     except KeyboardInterrupt:
         print("IoTHubClient sample stopped")
+        if batcher:
+            batcher.flush()
+        if client and not flush_pending_telemetry(client):
+            print(f"Telemetría sin enviar: {len(pending_telemetry)} mensajes")
+        print(f"Envío de telemetría: {telemetry_delivery}")
+        if queue:
+            print(f"Cola de telemetría en disco: {queue.stats()}")
+        if deadband:
+            print(f"Mensajes por cambios: {deadband.stats()}")
+        print(f"Reloj de muestreo: {sampling_clock.stats()}")
+        if oversampler:
+            print(f"Sobremuestreo: {oversampler.errors} lecturas con error (último: {oversampler.last_error})")
+        print(f"Comandos: {command_dispatcher.stats()}")
+        print(f"Arduino: {arduino.stats()}")
+        print(f"Conexiones: {supervisor.stats()}")
     finally:
-        mqtt_client.loop_stop()
-        mqtt_client.disconnect()
+        if joystick:
+            joystick.stop()
+        if oversampler:
+            oversampler.stop(timeout=1)
+        if drainer:
+            drainer.stop(timeout=5)
+        if queue:
+            queue.close()
+        supervisor.stop()
+        if broker:
+            broker.stop()
         GPIO.cleanup()
         sense.clear()
 
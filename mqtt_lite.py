@@ -0,0 +1,261 @@
+"""
+Implementación mínima de MQTT 3.1.1 sobre asyncio.
+
+Solo cubre lo que usamos entre la Raspberry Pi, el Arduino y las herramientas de prueba: CONNECT,
+SUBSCRIBE, PUBLISH con QoS 0/1 (y su PUBACK), PINGREQ y DISCONNECT. Sirve para:
+
+   - `MqttLiteClient`: cliente asíncrono ligero, pensado para abrir miles de conexiones en un mismo
+     proceso (simulador de flota, benchmarks) sin un hilo por cliente como `paho.mqtt`.
+   - las funciones de codificación de paquetes, que reutilizan el broker local y los sustitutos locales
+     de IoT Hub.
+"""
+
+import asyncio
+import itertools
+import struct
+import time
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+PROTOCOL_NAME = "MQTT"
+PROTOCOL_LEVEL = 4  # MQTT 3.1.1
+
+
+class MqttError(Exception):
+    pass
+
+
+# CODIFICACIÓN DE PAQUETES
+def encode_remaining_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value):
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return struct.pack("!H", len(value)) + value
+
+
+def decode_string(data, offset):
+    (length,) = struct.unpack_from("!H", data, offset)
+    start = offset + 2
+    return data[start:start + length].decode("utf-8"), start + length
+
+
+def encode_packet(packet_type, flags, body=b""):
+    return bytes([(packet_type << 4) | flags]) + encode_remaining_length(len(body)) + body
+
+
+async def read_packet(reader):
+    """Lee un paquete completo. Devuelve (tipo, flags, cuerpo)."""
+    header = await reader.readexactly(1)
+    multiplier = 1
+    length = 0
+    while True:
+        (byte,) = await reader.readexactly(1)
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+        if multiplier > 128 ** 3:
+            raise MqttError("Longitud de paquete no válida")
+    body = await reader.readexactly(length) if length else b""
+    return header[0] >> 4, header[0] & 0x0F, body
+
+
+def connect_packet(client_id, keepalive=60, clean_session=True):
+    flags = 0x02 if clean_session else 0x00
+    body = (encode_string(PROTOCOL_NAME) + bytes([PROTOCOL_LEVEL, flags]) + struct.pack("!H", keepalive)
+            + encode_string(client_id))
+    return encode_packet(CONNECT, 0, body)
+
+
+def parse_connect(body):
+    protocol, offset = decode_string(body, 0)
+    level, flags = body[offset], body[offset + 1]
+    (keepalive,) = struct.unpack_from("!H", body, offset + 2)
+    client_id, _ = decode_string(body, offset + 4)
+    return {"protocol": protocol, "level": level, "flags": flags, "keepalive": keepalive, "client_id": client_id}
+
+
+def connack_packet(return_code=0, session_present=False):
+    return encode_packet(CONNACK, 0, bytes([1 if session_present else 0, return_code]))
+
+
+def publish_packet(topic, payload, qos=0, retain=False, packet_id=None, dup=False):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    flags = (0x08 if dup else 0) | (qos << 1) | (0x01 if retain else 0)
+    body = encode_string(topic)
+    if qos:
+        body += struct.pack("!H", packet_id)
+    return encode_packet(PUBLISH, flags, body + payload)
+
+
+def parse_publish(flags, body):
+    """Devuelve (topic, payload, qos, retain, packet_id)."""
+    qos = (flags >> 1) & 0x03
+    topic, offset = decode_string(body, 0)
+    packet_id = None
+    if qos:
+        (packet_id,) = struct.unpack_from("!H", body, offset)
+        offset += 2
+    return topic, body[offset:], qos, bool(flags & 0x01), packet_id
+
+
+def puback_packet(packet_id):
+    return encode_packet(PUBACK, 0, struct.pack("!H", packet_id))
+
+
+def subscribe_packet(packet_id, topics):
+    body = struct.pack("!H", packet_id)
+    for topic, qos in topics:
+        body += encode_string(topic) + bytes([qos])
+    return encode_packet(SUBSCRIBE, 0x02, body)
+
+
+def parse_subscribe(body):
+    (packet_id,) = struct.unpack_from("!H", body, 0)
+    offset = 2
+    topics = []
+    while offset < len(body):
+        topic, offset = decode_string(body, offset)
+        topics.append((topic, body[offset]))
+        offset += 1
+    return packet_id, topics
+
+
+def suback_packet(packet_id, granted_qos):
+    return encode_packet(SUBACK, 0, struct.pack("!H", packet_id) + bytes(granted_qos))
+
+
+def topic_matches(pattern, topic):
+    """Comprueba si un topic encaja con un filtro de suscripción con comodines `+` y `#`."""
+    pattern_levels = pattern.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[index]:
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+# CLIENTE
+class MqttLiteClient:
+    def __init__(self, client_id, keepalive=60):
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.messages = asyncio.Queue()  # Mensajes recibidos: (topic, payload, qos, retain)
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._ping_task = None
+        self._pending = {}
+        self._packet_ids = itertools.cycle(range(1, 65536))
+        self._connack = None
+
+    @property
+    def connected(self):
+        return self._reader_task is not None and not self._reader_task.done()
+
+    async def connect(self, host, port=1883, timeout=10):
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        self._connack = asyncio.get_running_loop().create_future()
+        self._reader_task = asyncio.create_task(self._read_loop())
+        self._writer.write(connect_packet(self.client_id, self.keepalive))
+        return_code = await asyncio.wait_for(self._connack, timeout)
+        if return_code != 0:
+            await self.close()
+            raise MqttError(f"Conexión rechazada por el broker: {return_code}")
+        if self.keepalive:
+            self._ping_task = asyncio.create_task(self._ping_loop())
+
+    async def _read_loop(self):
+        try:
+            while True:
+                packet_type, flags, body = await read_packet(self._reader)
+                if packet_type == CONNACK:
+                    self._connack.set_result(body[1])
+                elif packet_type in (PUBACK, SUBACK):
+                    (packet_id,) = struct.unpack_from("!H", body, 0)
+                    future = self._pending.pop(packet_id, None)
+                    if future and not future.done():
+                        future.set_result(body[2:])
+                elif packet_type == PUBLISH:
+                    topic, payload, qos, retain, packet_id = parse_publish(flags, body)
+                    if qos:
+                        self._writer.write(puback_packet(packet_id))
+                    self.messages.put_nowait((topic, payload, qos, retain))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = MqttError(f"Conexión cerrada: {e}")
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+            if self._connack and not self._connack.done():
+                self._connack.set_exception(error)
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive / 2)
+            self._writer.write(encode_packet(PINGREQ, 0))
+
+    def _acknowledged(self):
+        packet_id = next(self._packet_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[packet_id] = future
+        return packet_id, future
+
+    async def publish(self, topic, payload, qos=0, retain=False, timeout=30):
+        """Publica un mensaje. Con QoS 1 espera al PUBACK y devuelve la latencia en segundos."""
+        if not self.connected:
+            raise MqttError("No conectado al broker")
+        started = time.perf_counter()
+        if not qos:
+            self._writer.write(publish_packet(topic, payload, 0, retain))
+            await self._writer.drain()
+            return 0.0
+        packet_id, future = self._acknowledged()
+        self._writer.write(publish_packet(topic, payload, qos, retain, packet_id))
+        await self._writer.drain()
+        await asyncio.wait_for(future, timeout)
+        return time.perf_counter() - started
+
+    async def subscribe(self, topic, qos=0, timeout=10):
+        packet_id, future = self._acknowledged()
+        self._writer.write(subscribe_packet(packet_id, [(topic, qos)]))
+        granted = await asyncio.wait_for(future, timeout)
+        return granted[0] if granted else None
+
+    async def close(self):
+        if self._ping_task:
+            self._ping_task.cancel()
+        if self._writer:
+            try:
+                self._writer.write(encode_packet(DISCONNECT, 0))
+                await self._writer.drain()
+            except ConnectionError:
+                pass
+            self._writer.close()
+        if self._reader_task:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
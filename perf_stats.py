@@ -0,0 +1,33 @@
+"""
+Utilidades comunes para las medidas de rendimiento (simulador de flota, benchmarks y métricas de
+los componentes): percentiles y resúmenes de latencias.
+"""
+
+import math
+
+
+def percentile(sorted_values, q):
+    """Percentil `q` (0-100) de una lista ya ordenada, por interpolación lineal."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize_latencies(latencies, scale=1000.0, digits=3):
+    """Resumen (en milisegundos por defecto) de una lista de latencias en segundos."""
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) * scale, digits),
+        "p95": round(percentile(values, 95) * scale, digits),
+        "p99": round(percentile(values, 99) * scale, digits),
+        "max": round(values[-1] * scale, digits),
+        "mean": round(math.fsum(values) / len(values) * scale, digits),
+    }
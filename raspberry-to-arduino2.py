@@ -1,5 +1,6 @@
 import paho.mqtt.client as mqtt
 import time
+from arduino_publisher import ArduinoPublisher
 
 # Configuración del broker
 broker = "broker.hivemq.com"
@@ -12,12 +13,16 @@ client = mqtt.Client("RaspberryPiClient")
 # Variables de control
 is_connected = False
 
+# Solo publica cuando cambia el estado (y lo reenvía tras reconectar si quedó pendiente)
+publisher = ArduinoPublisher(client, topic, retain=False)
+
 # Función de callback al conectar
 def on_connect(client, userdata, flags, rc):
     global is_connected
     if rc == 0:
         print("Conectado exitosamente al broker.")
         is_connected = True
+        publisher.on_connect()
     else:
         print(f"Error al conectar: {rc}")
         is_connected = False
@@ -27,10 +32,12 @@ def on_disconnect(client, userdata, rc):
     global is_connected
     print("Desconectado del broker.")
     is_connected = False
+    publisher.on_disconnect()
 
 # Función de callback al publicar
 def on_publish(client, userdata, mid):
     print(f"Mensaje publicado exitosamente. ID del mensaje: {mid}")
+    publisher.on_publish(mid)
 
 # Configurar callbacks
 client.on_connect = on_connect
@@ -49,12 +56,8 @@ try:
     while True:
         if is_connected:
             message = "ON"
-            result = client.publish(topic, message, qos=1)
-            status = result[0]
-            if status == 0:
+            if publisher.set_state(message) == "published":
                 print(f"Publicado correctamente en el tema `{topic}`: {message}")
-            else:
-                print(f"Error al publicar el mensaje en el tema `{topic}`")
         else:
             print("Esperando reconexión al broker...")
 
@@ -62,6 +65,7 @@ try:
 
 except KeyboardInterrupt:
     print("\nPublicación detenida.")
+    print(f"Publicador: {publisher.stats()}")
 finally:
     client.loop_stop()
     client.disconnect()
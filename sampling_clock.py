@@ -0,0 +1,74 @@
+"""
+Reloj de muestreo a frecuencia fija y sin deriva para FlavourSense.
+
+Los bucles principales hacen `time.sleep(1)` después de un envío bloqueante, así que el periodo real es
+1 s + la latencia del envío (en `00.json` se ven 1,2-1,3 s entre mensajes). `FixedRateClock` calcula
+cada plazo a partir del reloj monótono (`inicio + n * periodo`), de modo que el tiempo gastado en leer y
+enviar se descuenta de la espera y el error no se acumula.
+
+Si el bucle se retrasa más de un periodo completo, los ticks perdidos no se recuperan en ráfaga: se
+cuentan como `missed` y el reloj se realinea con el siguiente plazo. Los ticks que llegan tarde pero
+dentro del periodo se cuentan como `late` si superan `late_tolerance`.
+
+Uso síncrono:           tick = clock.wait()
+Uso con asyncio:        await asyncio.sleep(clock.delay()); tick = clock.tick()
+"""
+
+import collections
+import time
+
+Tick = collections.namedtuple("Tick", ["seq", "scheduled", "lateness", "missed"])
+
+
+class FixedRateClock:
+    def __init__(self, period, late_tolerance=None, clock=time.monotonic, sleep=time.sleep):
+        self.period = period
+        self.late_tolerance = period / 10 if late_tolerance is None else late_tolerance
+        self.clock = clock
+        self.sleep = sleep
+        self.seq = 0
+        self.missed = 0
+        self.late = 0
+        self.max_lateness = 0.0
+        self._next = None
+
+    def delay(self):
+        """Segundos que faltan hasta el próximo plazo (0 si ya ha pasado)."""
+        if self._next is None:
+            self._next = self.clock()
+        return max(0.0, self._next - self.clock())
+
+    def tick(self):
+        """Registra el tick actual y programa el siguiente plazo."""
+        now = self.clock()
+        if self._next is None:
+            self._next = now
+
+        lateness = now - self._next
+        missed = 0
+        if lateness >= self.period:
+            missed = int(lateness // self.period)
+            self._next += missed * self.period
+            lateness = now - self._next
+            self.missed += missed
+        if lateness > self.late_tolerance:
+            self.late += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+
+        self.seq += 1
+        tick = Tick(self.seq, self._next, lateness, missed)
+        self._next += self.period
+        return tick
+
+    def wait(self):
+        """Duerme hasta el próximo plazo y devuelve el tick."""
+        self.sleep(self.delay())
+        return self.tick()
+
+    def stats(self):
+        return {
+            "ticks": self.seq,
+            "missed": self.missed,
+            "late": self.late,
+            "max_lateness_ms": round(self.max_lateness * 1000, 1),
+        }
@@ -0,0 +1,270 @@
+"""
+Análisis de pérdidas, duplicados, desorden y latencia de la telemetría a partir de las exportaciones.
+
+En una exportación como `00.json` no se distinguía una lectura perdida de una lenta, y como IoT Hub
+entrega "al menos una vez" también aparecen duplicados. Cada lectura de `mainprueba.py` lleva `boot`
+(identificador del arranque), `seq` (contador de lecturas de ese arranque, desde 1) y `ts` (hora del
+dispositivo al tomarla). `SequenceAnalyzer` recorre los registros en el orden de la exportación (el de
+encolado) y calcula por dispositivo, con memoria acotada:
+
+   - pérdidas: en cada arranque se esperan todas las `seq` entre la menor y la mayor vista; las que no
+     llegan son pérdidas (las del final de un arranque, después de la última recibida, no se ven).
+     Con la banda muerta (`DEADBAND_MODE`) el dispositivo no envía todas las lecturas: cada lectura
+     enviada lleva en `suppressed` cuántas ha descartado la banda muerta en ese arranque, y las
+     descartadas entre la menor y la mayor `seq` no se cuentan como esperadas (`suppressed` en el
+     resumen),
+   - duplicados: un filtro de Bloom (`BloomFilter`) con los (dispositivo, arranque, seq) ya vistos. Con
+     un millón de lecturas y 0,1 % de falsos positivos ocupa 1,8 MB, frente a más de 100 MB de un
+     `set` de tuplas; un falso positivo cuenta una lectura nueva como duplicado (y como perdida),
+   - desorden: una `seq` menor que la mayor ya vista llega desordenada; la profundidad es la diferencia,
+   - latencia del dispositivo al encolado (`enqueued - ts`): número, media, mínimo y máximo exactos y
+     percentiles (`perf_stats.summarize_latencies`) sobre una muestra uniforme de tamaño fijo
+     (reservoir sampling). Depende del reloj del dispositivo: las latencias negativas indican desfase.
+
+Los mensajes sin `seq` (eventos del joystick, exportaciones antiguas) solo cuentan para la latencia. El
+formato "struct" lleva `boot`, `suppressed` y marca los eventos desde su versión 2; en los cuerpos de la
+versión 1 no viajan `boot` ni `suppressed`, así que todas sus lecturas se tratan como un solo arranque
+(tras un reinicio las `seq` repetidas cuentan como duplicados) y, con banda muerta, las lecturas
+descartadas cuentan como perdidas.
+
+Uso:
+    python3 sequence_analysis.py exportaciones/
+    python3 sequence_analysis.py exportaciones/ --device SenseHat --start 2024-11-26T20:00:00Z --expected 5000000
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+
+from export_index import RangeReader
+from export_reader import DEVICE_FIELD, ENQUEUED_EPOCH_FIELD, ExportReader
+from perf_stats import summarize_latencies
+
+ANALYSIS_FIELDS = (DEVICE_FIELD, ENQUEUED_EPOCH_FIELD, "boot", "seq", "ts", "suppressed")
+DEFAULT_EXPECTED = 1000000
+DEFAULT_ERROR_RATE = 0.001
+DEFAULT_RESERVOIR = 10000
+
+
+class BloomFilter:
+    """Conjunto probabilístico de tamaño fijo: sin falsos negativos y con falsos positivos acotados."""
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, key):
+        """Añade `key` (bytes). Devuelve si ya estaba (o es un falso positivo)."""
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        # Doble hash: las k posiciones salen de dos valores de 64 bits
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        bits = self.bits
+        size = self.size
+        present = True
+        for i in range(self.hashes):
+            position = (first + i * step) % size
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                present = False
+        if not present:
+            self.count += 1
+        return present
+
+    def false_positive_rate(self):
+        """Probabilidad actual de falso positivo según las claves añadidas."""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "keys": self.count,
+            "bytes": len(self.bits),
+            "hashes": self.hashes,
+            "false_positive_rate": round(self.false_positive_rate(), 6),
+        }
+
+
+class Reservoir:
+    """Muestra uniforme de tamaño fijo de una secuencia de longitud desconocida (algoritmo R)."""
+
+    def __init__(self, size=DEFAULT_RESERVOIR, rng=None):
+        self.size = size
+        self.rng = rng or random.Random(0)
+        self.values = []
+        self.seen = 0
+
+    def add(self, value):
+        self.seen += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            slot = self.rng.randrange(self.seen)
+            if slot < self.size:
+                self.values[slot] = value
+
+
+class DeviceSequenceStats:
+    __slots__ = ("boots", "messages", "duplicates", "reordered", "max_reorder_depth", "reorder_depth_sum",
+                 "without_seq", "latencies", "latency_count", "latency_sum", "latency_min", "latency_max",
+                 "negative_latencies")
+
+    def __init__(self, reservoir=DEFAULT_RESERVOIR, rng=None):
+        # arranque -> [menor seq, mayor seq, seq distintas recibidas, `suppressed` en la menor, en la mayor]
+        self.boots = {}
+        self.messages = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.max_reorder_depth = 0
+        self.reorder_depth_sum = 0
+        self.without_seq = 0
+        self.latencies = Reservoir(reservoir, rng)
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_min = math.inf
+        self.latency_max = -math.inf
+        self.negative_latencies = 0
+
+    def add_latency(self, latency):
+        self.latency_count += 1
+        self.latency_sum += latency
+        if latency < self.latency_min:
+            self.latency_min = latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+        if latency < 0:
+            self.negative_latencies += 1
+        self.latencies.add(latency)
+
+    def add_sequence(self, boot, seq, duplicate, suppressed=0):
+        self.messages += 1
+        if duplicate:
+            self.duplicates += 1
+            return
+        stream = self.boots.get(boot)
+        if stream is None:
+            self.boots[boot] = [seq, seq, 1, suppressed, suppressed]
+            return
+        stream[2] += 1
+        if seq < stream[1]:
+            depth = stream[1] - seq
+            self.reordered += 1
+            self.reorder_depth_sum += depth
+            if depth > self.max_reorder_depth:
+                self.max_reorder_depth = depth
+            if seq < stream[0]:
+                stream[0] = seq
+                stream[3] = suppressed
+        else:
+            stream[1] = seq
+            stream[4] = suppressed
+
+    def summary(self):
+        # Lecturas descartadas por la banda muerta entre la menor y la mayor `seq` de cada arranque
+        suppressed = sum(max(0, last_suppressed - first_suppressed)
+                         for _, _, _, first_suppressed, last_suppressed in self.boots.values())
+        expected = sum(last - first + 1 for first, last, _, _, _ in self.boots.values()) - suppressed
+        received = sum(count for _, _, count, _, _ in self.boots.values())
+        lost = max(0, expected - received)
+        latency = summarize_latencies(self.latencies.values)
+        if self.latency_count:
+            # Recuento, media y extremos exactos; los percentiles salen de la muestra
+            latency.update({
+                "count": self.latency_count,
+                "mean": round(self.latency_sum / self.latency_count * 1000, 3),
+                "min": round(self.latency_min * 1000, 3),
+                "max": round(self.latency_max * 1000, 3),
+                "negative": self.negative_latencies,
+                "sampled": len(self.latencies.values),
+            })
+        return {
+            "messages": self.messages,
+            "boots": len(self.boots),
+            "expected": expected,
+            "suppressed": suppressed,
+            "received": received,
+            "lost": lost,
+            "loss_rate": round(lost / expected, 6) if expected else None,
+            "duplicates": self.duplicates,
+            "duplicate_rate": round(self.duplicates / self.messages, 6) if self.messages else None,
+            "reordered": self.reordered,
+            "reorder_rate": round(self.reordered / received, 6) if received else None,
+            "max_reorder_depth": self.max_reorder_depth,
+            "mean_reorder_depth": round(self.reorder_depth_sum / self.reordered, 2) if self.reordered else None,
+            "without_seq": self.without_seq,
+            "latency_ms": latency,
+        }
+
+
+class SequenceAnalyzer:
+    def __init__(self, expected=DEFAULT_EXPECTED, error_rate=DEFAULT_ERROR_RATE, reservoir=DEFAULT_RESERVOIR,
+                 seed=0):
+        self.seen = BloomFilter(expected, error_rate)
+        self.reservoir = reservoir
+        self.rng = random.Random(seed)  # Muestras reproducibles entre ejecuciones
+        self.devices = {}
+
+    def add(self, record):
+        device_id = record.get(DEVICE_FIELD)
+        stats = self.devices.get(device_id)
+        if stats is None:
+            stats = self.devices[device_id] = DeviceSequenceStats(self.reservoir, self.rng)
+        sent = record.get("ts")
+        enqueued = record.get(ENQUEUED_EPOCH_FIELD)
+        if sent is not None and enqueued is not None:
+            stats.add_latency(enqueued - sent)
+        seq = record.get("seq")
+        if seq is None:
+            stats.without_seq += 1
+            return
+        boot = record.get("boot")
+        duplicate = self.seen.add(f"{device_id}\x00{boot}\x00{seq}".encode("utf-8"))
+        stats.add_sequence(boot, seq, duplicate, record.get("suppressed") or 0)
+
+    def add_all(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def summary(self):
+        return {
+            "devices": {device_id: self.devices[device_id].summary() for device_id in sorted(self.devices, key=str)},
+            "duplicate_filter": self.seen.stats(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pérdidas, duplicados, desorden y latencia de la telemetría")
+    parser.add_argument("paths", nargs="+", help="Ficheros de exportación o directorios")
+    parser.add_argument("--device", action="append", help="Solo este dispositivo (se puede repetir)")
+    parser.add_argument("--start", help="Hora de encolado inicial ISO 8601 (usa los índices de export_index.py)")
+    parser.add_argument("--end", help="Hora de encolado final ISO 8601 (excluida)")
+    parser.add_argument("--expected", type=int, default=DEFAULT_EXPECTED,
+                        help="Lecturas esperadas, para dimensionar el filtro de duplicados")
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_ERROR_RATE,
+                        help="Falsos positivos admitidos en el filtro de duplicados")
+    parser.add_argument("--reservoir", type=int, default=DEFAULT_RESERVOIR,
+                        help="Latencias por dispositivo guardadas para los percentiles")
+    args = parser.parse_args()
+
+    if args.start or args.end:
+        reader = RangeReader(args.start, args.end, args.device, ANALYSIS_FIELDS)
+        records = reader.read(args.paths)
+    else:
+        reader = ExportReader(ANALYSIS_FIELDS, devices=args.device)
+        records = reader.read_all(args.paths)
+    analyzer = SequenceAnalyzer(args.expected, args.error_rate, args.reservoir).add_all(records)
+    print(json.dumps(analyzer.summary(), indent=2, ensure_ascii=False))
+    print(f"Lectura: {reader.stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Cola persistente "store-and-forward" para la telemetría de FlavourSense.
+
+Cuando se cae la conexión, `client.send_message` se bloquea o lanza una excepción y se pierden lecturas.
+Con esta cola el bucle de lectura nunca espera a la red:
+
+   - `SegmentQueue` guarda cada lectura en disco (tarjeta SD) en ficheros de segmento de solo-añadir.
+     Cada registro lleva longitud y CRC32, así que una escritura a medias tras un corte de luz se detecta
+     y se descarta al arrancar.
+   - El tamaño total está acotado (`max_bytes`): si se supera, se borran los segmentos más antiguos.
+   - La posición de lectura se guarda en el fichero `offsets` de forma atómica (fichero temporal +
+     `os.replace`), de modo que tras un reinicio se continúa donde se quedó el envío.
+   - `Drainer` es un hilo que vacía la cola hacia IoT Hub en bloques cuando hay conectividad, con
+     reintentos espaciados si falla el envío. Los registros urgentes (`Drainer.send_urgent`) pasan
+     delante de la cola: los envía el mismo hilo en cuanto puede y, si fallan, se guardan en la cola.
+
+`SegmentQueue.stats()` devuelve la profundidad de la cola y los contadores de envío (incluida la tasa
+de vaciado en registros por segundo).
+"""
+
+import collections
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+RECORD_HEADER = struct.Struct("<II")  # Longitud y CRC32 del registro
+SEGMENT_SUFFIX = ".seg"
+OFFSETS_FILE = "offsets"
+
+DEFAULT_SEGMENT_BYTES = 1024 * 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class SegmentQueue:
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES, max_bytes=DEFAULT_MAX_BYTES,
+                 fsync_every=10, clock=time.monotonic):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_every = fsync_every
+        self.clock = clock
+        self._lock = threading.Lock()
+
+        # Contadores expuestos en stats()
+        self.appended = 0
+        self.drained = 0
+        self.evicted = 0
+        self._drain_history = collections.deque(maxlen=64)
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = []        # Identificadores de segmento, del más antiguo al más nuevo
+        self._counts = {}          # Registros válidos por segmento
+        self._sizes = {}           # Bytes válidos por segmento
+        self._read_segment = None
+        self._read_position = 0
+        self._read_index = 0       # Registros ya enviados del segmento de lectura
+        self._writer = None
+        self._unsynced = 0
+        self._recover()
+
+    # RECUPERACIÓN AL ARRANCAR
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{segment:010d}{SEGMENT_SUFFIX}")
+
+    def _recover(self):
+        segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        for segment in segments:
+            count, size = self._scan_segment(segment)
+            self._segments.append(segment)
+            self._counts[segment] = count
+            self._sizes[segment] = size
+
+        read_segment, read_position = self._load_offsets()
+        if not self._segments:
+            open(self._segment_path(0), "ab").close()
+            self._segments.append(0)
+            self._counts[0] = 0
+            self._sizes[0] = 0
+        if read_segment not in self._counts:
+            read_segment, read_position = self._segments[0], 0
+
+        # Los segmentos anteriores al de lectura ya se enviaron
+        for segment in [s for s in self._segments if s < read_segment]:
+            self._remove_segment(segment)
+
+        self._read_segment = read_segment
+        self._read_position = min(read_position, self._sizes[read_segment])
+        self._read_index = sum(1 for _ in self._iter_records(read_segment, 0, self._read_position))
+
+    def _scan_segment(self, segment):
+        """Cuenta los registros válidos y trunca el segmento si termina en una escritura incompleta."""
+        path = self._segment_path(segment)
+        count = 0
+        position = 0
+        for position, _ in self._iter_records(segment, 0, None, with_end=True):
+            count += 1
+        if os.path.getsize(path) != position:
+            with open(path, "r+b") as segment_file:
+                segment_file.truncate(position)
+        return count, position
+
+    def _iter_records(self, segment, start, end, with_end=False):
+        with open(self._segment_path(segment), "rb") as segment_file:
+            segment_file.seek(start)
+            position = start
+            while end is None or position < end:
+                header = segment_file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length, crc = RECORD_HEADER.unpack(header)
+                payload = segment_file.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                position += RECORD_HEADER.size + length
+                yield (position, payload) if with_end else payload
+
+    def _load_offsets(self):
+        try:
+            with open(os.path.join(self.directory, OFFSETS_FILE), encoding="utf-8") as offsets_file:
+                offsets = json.load(offsets_file)
+            return offsets["segment"], offsets["position"]
+        except (OSError, ValueError, KeyError):
+            return None, 0
+
+    def _save_offsets(self):
+        path = os.path.join(self.directory, OFFSETS_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as offsets_file:
+            json.dump({"segment": self._read_segment, "position": self._read_position}, offsets_file)
+            offsets_file.flush()
+            os.fsync(offsets_file.fileno())
+        os.replace(tmp_path, path)
+
+    def _remove_segment(self, segment):
+        if self._writer and segment == self._segments[-1]:
+            self._writer.close()
+            self._writer = None
+        try:
+            os.remove(self._segment_path(segment))
+        except FileNotFoundError:
+            pass
+        self._segments.remove(segment)
+        del self._counts[segment]
+        del self._sizes[segment]
+
+    # ESCRITURA (lado del muestreo)
+    def append(self, payload):
+        """Añade un registro (bytes o str) al final de la cola. Nunca toca la red."""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            active = self._segments[-1]
+            if self._sizes[active] and self._sizes[active] + len(record) > self.segment_bytes:
+                active = self._rotate()
+            if self._writer is None:
+                self._writer = open(self._segment_path(active), "ab")
+
+            self._writer.write(record)
+            self._writer.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                os.fsync(self._writer.fileno())
+                self._unsynced = 0
+
+            self._counts[active] += 1
+            self._sizes[active] += len(record)
+            self.appended += 1
+            self._evict()
+
+    def _rotate(self):
+        if self._writer:
+            os.fsync(self._writer.fileno())
+            self._writer.close()
+            self._writer = None
+        segment = self._segments[-1] + 1
+        self._writer = open(self._segment_path(segment), "ab")
+        self._segments.append(segment)
+        self._counts[segment] = 0
+        self._sizes[segment] = 0
+        return segment
+
+    def _evict(self):
+        # Descarta los segmentos más antiguos mientras se supere el tamaño máximo
+        while len(self._segments) > 1 and sum(self._sizes.values()) > self.max_bytes:
+            oldest = self._segments[0]
+            if oldest == self._read_segment:
+                self.evicted += self._counts[oldest] - self._read_index
+                self._remove_segment(oldest)
+                self._read_segment = self._segments[0]
+                self._read_position = 0
+                self._read_index = 0
+                self._save_offsets()
+            else:
+                self.evicted += self._counts[oldest]
+                self._remove_segment(oldest)
+
+    # LECTURA (lado del envío)
+    def peek(self, max_records):
+        """
+        Devuelve hasta `max_records` registros pendientes sin consumirlos, junto con el cursor que hay que
+        pasar a `commit` una vez enviados.
+        """
+        with self._lock:
+            if self._writer:
+                self._writer.flush()
+            records = []
+            segment, position, index = self._read_segment, self._read_position, self._read_index
+            while len(records) < max_records:
+                for end, payload in self._iter_records(segment, position, self._sizes[segment], with_end=True):
+                    records.append(payload)
+                    position = end
+                    index += 1
+                    if len(records) >= max_records:
+                        break
+                later = [s for s in self._segments if s > segment]
+                if len(records) >= max_records or position < self._sizes[segment] or not later:
+                    break
+                segment, position, index = later[0], 0, 0
+            return records, (segment, position, index, len(records))
+
+    def commit(self, cursor):
+        """Marca como enviados los registros devueltos por `peek`."""
+        segment, position, index, count = cursor
+        with self._lock:
+            if segment not in self._counts:
+                return  # Ya descartado por falta de espacio
+            for old in [s for s in self._segments if s < segment]:
+                self._remove_segment(old)
+            self._read_segment = segment
+            self._read_position = position
+            self._read_index = index
+            self._save_offsets()
+            self.drained += count
+            self._drain_history.append((self.clock(), self.drained))
+
+    def depth(self):
+        with self._lock:
+            return sum(self._counts.values()) - self._read_index
+
+    def stats(self):
+        with self._lock:
+            drain_rate = 0.0
+            if len(self._drain_history) >= 2:
+                (t_first, n_first), (t_last, n_last) = self._drain_history[0], self._drain_history[-1]
+                if t_last > t_first:
+                    drain_rate = (n_last - n_first) / (t_last - t_first)
+            return {
+                "depth": sum(self._counts.values()) - self._read_index,
+                "bytes": sum(self._sizes.values()),
+                "segments": len(self._segments),
+                "appended": self.appended,
+                "drained": self.drained,
+                "evicted": self.evicted,
+                "drain_rate": round(drain_rate, 2),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._writer:
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+                self._writer.close()
+                self._writer = None
+
+
+class Drainer(threading.Thread):
+    """
+    Hilo que envía la cola a IoT Hub en bloques. `send_batch` recibe una lista de registros (bytes) y debe
+    lanzar una excepción si el envío falla; en ese caso los registros se reintentan más tarde.
+
+    `send_urgent(record)` deja un registro en memoria para que el hilo lo envíe antes que la cola, con
+    `send_one` (por defecto, `send_batch` con ese único registro); quien llama no espera a la red.
+    """
+
+    def __init__(self, queue, send_batch, batch_size=50, idle_delay=1.0, max_retry_delay=60.0, send_one=None):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.send_batch = send_batch
+        self.send_one = send_one or (lambda record: send_batch([record]))
+        self.batch_size = batch_size
+        self.idle_delay = idle_delay
+        self.max_retry_delay = max_retry_delay
+        self.failures = 0
+        self.urgent_sent = 0
+        self.urgent_failed = 0
+        self._urgent = collections.deque()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def send_urgent(self, record):
+        """Envía `record` antes que la cola. Nunca toca la red desde el hilo que llama."""
+        if isinstance(record, str):
+            record = record.encode("utf-8")
+        self._urgent.append(record)
+        self._wake.set()
+
+    def _send_urgent(self):
+        while self._urgent:
+            record = self._urgent.popleft()
+            try:
+                self.send_one(record)
+            except Exception as e:
+                self.urgent_failed += 1
+                print(f"Error al enviar un registro urgente, se guarda en la cola: {e}")
+                self.queue.append(record)
+                continue
+            self.urgent_sent += 1
+
+    def run(self):
+        retry_delay = self.idle_delay
+        retry_at = 0.0
+        while not self._stop_event.is_set():
+            self._wake.clear()
+            self._send_urgent()
+            # Tras un fallo la cola espera su turno, pero los urgentes despiertan al hilo antes
+            remaining = retry_at - time.monotonic()
+            if remaining > 0:
+                self._wake.wait(remaining)
+                continue
+            records, cursor = self.queue.peek(self.batch_size)
+            if not records:
+                self._wake.wait(self.idle_delay)
+                continue
+            try:
+                self.send_batch(records)
+            except Exception as e:
+                self.failures += 1
+                print(f"Error al enviar la cola ({len(records)} registros pendientes): {e}")
+                retry_at = time.monotonic() + retry_delay
+                retry_delay = min(retry_delay * 2, self.max_retry_delay)
+                continue
+            self.queue.commit(cursor)
+            retry_delay = self.idle_delay
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self._wake.set()
+        self.join(timeout)
+        if not self.is_alive():
+            # Los urgentes que no llegaron a enviarse se guardan en disco
+            while self._urgent:
+                self.queue.append(self._urgent.popleft())
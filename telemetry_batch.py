@@ -0,0 +1,144 @@
+"""
+Modo de envío por lotes (batching) para la telemetría de FlavourSense.
+
+En lugar de crear un `Message` y hacer un `client.send_message` bloqueante por cada lectura, las
+muestras se acumulan en un `TelemetryBatcher` y se envían juntas en un único mensaje cuando:
+
+   - se alcanzan `max_samples` muestras,
+   - han pasado `max_wait_ms` milisegundos desde la primera muestra del lote (se comprueba al añadir y
+     en `flush_if_due`, que el bucle de muestreo llama en cada periodo aunque no lleguen muestras), o
+   - llega un evento importante (por ejemplo una selección del joystick), que fuerza el envío inmediato.
+
+Por defecto el cuerpo del mensaje es un JSON compacto en forma de columnas + filas (otros formatos y
+la compresión opcional están en `telemetry_codec.py`):
+
+    {"t0": 1732640426.758, "fields": ["seq", "temperature", "light", "joystick_action"],
+     "rows": [[0, 1, 34.02, "Low Light", "No Selection"], [1000, 2, 33.97, "Low Light", "No Selection"]]}
+
+donde el primer valor de cada fila es el desfase en milisegundos respecto a `t0` (segundos epoch).
+
+`decode_body` deshace el lote en filas por muestra. Ejecutado como script convierte una exportación
+de blobs de IoT Hub (como `00.json`) en un CSV con una fila por muestra:
+
+    python3 telemetry_batch.py 00.json > muestras.csv
+
+Para exportaciones grandes, `export_reader.py` lee solo los campos pedidos y calcula agregados por
+dispositivo en una pasada.
+"""
+
+import csv
+import json
+import sys
+import time
+
+from telemetry_codec import BATCH_FIELDS, decode_body, encode_samples
+
+# Propiedad del mensaje que marca que el cuerpo es un lote
+BATCH_PROPERTY = "batch"
+
+# Valores por defecto del modo lote
+DEFAULT_MAX_SAMPLES = 10
+DEFAULT_MAX_WAIT_MS = 10000
+
+
+class TelemetryBatcher:
+    def __init__(self, send, max_samples=DEFAULT_MAX_SAMPLES, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 encoding="json", compression=None, clock=time.monotonic, wall_clock=time.time):
+        # `send` recibe el cuerpo del lote (EncodedBody) y el número de muestras que contiene
+        self.send = send
+        self.max_samples = max_samples
+        self.max_wait_ms = max_wait_ms
+        self.encoding = encoding
+        self.compression = compression
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._samples = []
+        self._opened_at = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, sample, urgent=False):
+        """Añade una muestra al lote. Devuelve True si el lote se ha enviado."""
+        if not self._samples:
+            self._opened_at = self.clock()
+        sample = dict(sample)
+        sample.setdefault("ts", self.wall_clock())
+        self._samples.append(sample)
+
+        if urgent or len(self._samples) >= self.max_samples or self.due():
+            self.flush()
+            return True
+        return False
+
+    def due(self):
+        """Indica si el lote abierto ha superado el tiempo máximo de espera."""
+        if not self._samples:
+            return False
+        return (self.clock() - self._opened_at) * 1000 >= self.max_wait_ms
+
+    def flush_if_due(self):
+        """Envía el lote si ha superado el tiempo máximo de espera. Devuelve True si se ha enviado."""
+        if self.due():
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """Envía las muestras pendientes (si las hay) y vacía el lote."""
+        if not self._samples:
+            return
+        body = encode_samples(self._samples, self.encoding, self.compression)
+        count = len(self._samples)
+        self._samples = []
+        self._opened_at = None
+        self.send(body, count)
+
+
+def decode_export_record(record):
+    """
+    Convierte un registro de la exportación de blobs de IoT Hub en filas por muestra,
+    añadiendo el dispositivo y la hora de encolado.
+    """
+    if isinstance(record, (str, bytes, bytearray)):
+        record = json.loads(record)
+
+    system_properties = record.get("SystemProperties", {})
+    device_id = system_properties.get("connectionDeviceId")
+    enqueued = record.get("EnqueuedTimeUtc")
+    rows = []
+    samples = decode_body(
+        record["Body"],
+        system_properties.get("contentType"),
+        system_properties.get("contentEncoding"),
+    )
+    for sample in samples:
+        sample["device_id"] = device_id
+        sample["enqueued_time_utc"] = enqueued
+        rows.append(sample)
+    return rows
+
+
+def export_to_csv(lines, output):
+    columns = ["device_id", "enqueued_time_utc", "ts"] + list(BATCH_FIELDS)
+    writer = csv.DictWriter(output, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        for row in decode_export_record(line):
+            writer.writerow(row)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("USO - python3 telemetry_batch.py exportacion.json [...]")
+        sys.exit(1)
+
+    def export_lines(paths):
+        for path in paths:
+            with open(path, encoding="utf-8") as export_file:
+                yield from export_file
+
+    export_to_csv(export_lines(sys.argv[1:]), sys.stdout)
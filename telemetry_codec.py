@@ -0,0 +1,223 @@
+"""
+Formatos de cuerpo (wire encodings) de la telemetría de FlavourSense.
+
+Cada lectura se enviaba como `json.dumps(sensor_data)`, repitiendo en cada mensaje los nombres de los
+campos y textos como "Low Light" o "No Selection". Este módulo permite elegir el formato:
+
+   - "json":   el formato de siempre. Un lote usa columnas + filas (ver `encode_batch`).
+   - "struct": formato binario fijo con los campos categóricos codificados como enteros:
+
+        cabecera  <BBHdI   versión, reservado, número de muestras, t0 (segundos epoch), `boot`
+        muestra   <IihBBBI `seq` (o `event_seq` en los eventos), desfase respecto a t0 en ms,
+                           temperatura en centésimas de grado, código de luz, código de joystick,
+                           tipo (lectura o evento del joystick), `suppressed`
+
+     Son 17 bytes por lectura frente a ~90 del JSON. Los campos extra (p. ej. los agregados de
+     `aggregation.py`) no caben en este formato y se descartan; en JSON viajan como columnas extra.
+     Los cuerpos de la versión 1 (cabecera <BBHd, muestra <IihBB, sin `boot`, `suppressed` ni tipo)
+     se siguen leyendo; en ellos `seq` 0 es un mensaje sin `seq` (un evento del joystick).
+
+Los lotes pueden comprimirse además con "gzip" o "deflate". El formato viaja en `content_type` y la
+compresión en `content_encoding` del mensaje, de modo que `decode_body` sabe cómo deshacerlo.
+"""
+
+import base64
+import collections
+import gzip
+import json
+import struct
+import zlib
+
+JSON_CONTENT_TYPE = "application/json"
+STRUCT_CONTENT_TYPE = "application/x-flavoursense-struct"
+ENCODINGS = ("json", "struct")
+COMPRESSIONS = ("gzip", "deflate")
+
+# Campos que se envían en cada muestra
+BATCH_FIELDS = ("seq", "temperature", "light", "joystick_action")
+
+# Códigos de los campos categóricos
+LIGHT_CODES = {"Low Light": 0, "High Light": 1}
+JOYSTICK_CODES = {"No Selection": 0, "Red Wine": 1, "White Wine": 2, "Rosé Wine": 3, "Noise Detected": 4}
+UNKNOWN_CODE = 255
+MISSING_TEMPERATURE = -32768
+
+STRUCT_VERSION = 2
+STRUCT_HEADER = struct.Struct("<BBHdI")
+STRUCT_SAMPLE = struct.Struct("<IihBBBI")
+STRUCT_V1_HEADER = struct.Struct("<BBHd")
+STRUCT_V1_SAMPLE = struct.Struct("<IihBB")
+# Tipos de muestra del formato binario
+SAMPLE_READING = 0
+SAMPLE_EVENT = 1
+
+EncodedBody = collections.namedtuple("EncodedBody", ["data", "content_type", "content_encoding"])
+
+_LIGHT_NAMES = {code: name for name, code in LIGHT_CODES.items()}
+_JOYSTICK_NAMES = {code: name for name, code in JOYSTICK_CODES.items()}
+
+
+# FORMATO JSON
+def encode_batch(rows, timestamps, fields=BATCH_FIELDS):
+    t0 = timestamps[0]
+    packed = [[int(round((ts - t0) * 1000))] + list(row) for ts, row in zip(timestamps, rows)]
+    return json.dumps({"t0": round(t0, 3), "fields": list(fields), "rows": packed}, separators=(",", ":"))
+
+
+def decode_batch(body):
+    """
+    Expande el cuerpo JSON de un mensaje en una lista de muestras (diccionarios).
+    Acepta tanto lotes como mensajes de una sola muestra (el formato antiguo).
+    """
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode("utf-8")
+    if isinstance(body, str):
+        body = json.loads(body)
+
+    if "rows" not in body:
+        return [dict(body)]
+
+    t0 = body["t0"]
+    fields = body["fields"]
+    samples = []
+    for row in body["rows"]:
+        # Las celdas nulas son campos que esa muestra no tenía
+        sample = {field: value for field, value in zip(fields, row[1:]) if value is not None}
+        sample["ts"] = round(t0 + row[0] / 1000, 3)
+        samples.append(sample)
+    return samples
+
+
+# FORMATO BINARIO
+def encode_struct(samples):
+    t0 = samples[0]["ts"]
+    # Todas las muestras de un lote son del mismo arranque; 0 si no lo llevan
+    boot = next((sample["boot"] for sample in samples if sample.get("boot") is not None), 0)
+    parts = [STRUCT_HEADER.pack(STRUCT_VERSION, 0, len(samples), t0, boot)]
+    for sample in samples:
+        temperature = sample.get("temperature")
+        # Los eventos del joystick no llevan `seq`: viajan con su `event_seq` y se marcan como eventos
+        if sample.get("seq") is None and sample.get("event_seq") is not None:
+            kind, seq = SAMPLE_EVENT, sample["event_seq"]
+        else:
+            kind, seq = SAMPLE_READING, sample.get("seq") or 0
+        parts.append(STRUCT_SAMPLE.pack(
+            seq,
+            int(round((sample["ts"] - t0) * 1000)),
+            MISSING_TEMPERATURE if temperature is None else int(round(temperature * 100)),
+            LIGHT_CODES.get(sample.get("light"), UNKNOWN_CODE),
+            JOYSTICK_CODES.get(sample.get("joystick_action"), UNKNOWN_CODE),
+            kind,
+            sample.get("suppressed") or 0,
+        ))
+    return b"".join(parts)
+
+
+def _struct_sample(t0, dt_ms, temperature, light, joystick):
+    return {
+        "ts": round(t0 + dt_ms / 1000, 3),
+        "temperature": None if temperature == MISSING_TEMPERATURE else temperature / 100,
+        "light": _LIGHT_NAMES.get(light),
+        "joystick_action": _JOYSTICK_NAMES.get(joystick),
+    }
+
+
+def decode_struct(data):
+    version = data[0] if data else None
+    samples = []
+    if version == STRUCT_VERSION:
+        _, _, count, t0, boot = STRUCT_HEADER.unpack_from(data, 0)
+        for seq, dt_ms, temperature, light, joystick, kind, suppressed in STRUCT_SAMPLE.iter_unpack(
+                data[STRUCT_HEADER.size:]):
+            sample = _struct_sample(t0, dt_ms, temperature, light, joystick)
+            if boot:
+                sample["boot"] = boot
+            if kind == SAMPLE_EVENT:
+                sample["event_seq"] = seq
+            else:
+                sample["seq"] = seq
+                sample["suppressed"] = suppressed
+            samples.append(sample)
+    elif version == 1:
+        _, _, count, t0 = STRUCT_V1_HEADER.unpack_from(data, 0)
+        for seq, dt_ms, temperature, light, joystick in STRUCT_V1_SAMPLE.iter_unpack(data[STRUCT_V1_HEADER.size:]):
+            sample = _struct_sample(t0, dt_ms, temperature, light, joystick)
+            if seq:
+                sample["seq"] = seq
+            samples.append(sample)
+    else:
+        raise ValueError(f"Versión de formato binario no soportada: {version}")
+    if len(samples) != count:
+        raise ValueError(f"Cuerpo binario incompleto: {len(samples)} de {count} muestras")
+    return samples
+
+
+# COMPRESIÓN
+def compress(data, method):
+    if method == "gzip":
+        return gzip.compress(data)
+    if method == "deflate":
+        return zlib.compress(data)
+    raise ValueError(f"Compresión desconocida: {method}")
+
+
+def decompress(data, method):
+    if method == "gzip":
+        return gzip.decompress(data)
+    if method == "deflate":
+        return zlib.decompress(data)
+    raise ValueError(f"Compresión desconocida: {method}")
+
+
+# ENTRADA / SALIDA
+def encode_samples(samples, encoding="json", compression=None, batch=True):
+    """
+    Codifica una lista de muestras en el cuerpo de un mensaje. Con `batch=False` y una sola muestra en
+    JSON se mantiene el formato antiguo (un objeto por mensaje), sin compresión.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Formato de telemetría desconocido: {encoding}")
+
+    if encoding == "json" and not batch:
+        return EncodedBody(json.dumps(samples[0]), JSON_CONTENT_TYPE, "utf-8")
+
+    if encoding == "json":
+        # Columnas fijas más los campos extra de todas las muestras, en el orden en que aparecen (p. ej.
+        # los agregados por ventana o el `event_seq` de los eventos del joystick)
+        fields = list(BATCH_FIELDS)
+        known = set(fields)
+        known.add("ts")
+        for sample in samples:
+            for field in sample:
+                if field not in known:
+                    known.add(field)
+                    fields.append(field)
+        rows = [[sample.get(field) for field in fields] for sample in samples]
+        data = encode_batch(rows, [sample["ts"] for sample in samples], fields).encode("utf-8")
+        content_type, content_encoding = JSON_CONTENT_TYPE, "utf-8"
+    else:
+        data = encode_struct(samples)
+        content_type, content_encoding = STRUCT_CONTENT_TYPE, "identity"
+
+    if batch and compression:
+        data = compress(data, compression)
+        content_encoding = compression
+    return EncodedBody(data, content_type, content_encoding)
+
+
+def decode_body(data, content_type=None, content_encoding=None):
+    """Devuelve la lista de muestras de un cuerpo codificado con `encode_samples`."""
+    if content_encoding in COMPRESSIONS:
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        data = decompress(data, content_encoding)
+
+    if content_type == STRUCT_CONTENT_TYPE:
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        return decode_struct(data)
+
+    if isinstance(data, str) and content_type == JSON_CONTENT_TYPE and not data.lstrip().startswith("{"):
+        # Las exportaciones guardan en base64 los cuerpos que no pueden incrustar como JSON
+        data = base64.b64decode(data)
+    return decode_batch(data)
@@ -0,0 +1,26 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto son scripts sueltos en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def export_line():
+    """Línea de una exportación de blobs de IoT Hub, con la forma de `00.json`."""
+    def make(device_id, enqueued, body, content_type="application/json", content_encoding="utf-8"):
+        return json.dumps({
+            "EnqueuedTimeUtc": enqueued,
+            "Properties": {},
+            "SystemProperties": {
+                "connectionDeviceId": device_id,
+                "contentType": content_type,
+                "contentEncoding": content_encoding,
+                "enqueuedTime": enqueued,
+            },
+            "Body": body,
+        }, separators=(",", ":")) + "\n"
+    return make
@@ -0,0 +1,123 @@
+import collections
+import itertools
+
+from arduino_publisher import ArduinoPublisher
+
+PublishResult = collections.namedtuple("PublishResult", ["rc", "mid"])
+
+
+class FakeClient:
+    """Cliente con la interfaz de paho: `publish` devuelve (rc, mid) y el PUBACK se simula aparte."""
+
+    def __init__(self):
+        self.mids = itertools.count(1)
+        self.published = []
+        self.rc = 0
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        mid = next(self.mids)
+        self.published.append((mid, payload))
+        return PublishResult(self.rc, mid)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def publisher(window=2, ack_timeout=10.0):
+    client = FakeClient()
+    clock = FakeClock()
+    arduino = ArduinoPublisher(client, "arduino", window=window, ack_timeout=ack_timeout, clock=clock)
+    arduino.on_connect()
+    return arduino, client, clock
+
+
+def payloads(client):
+    return [payload for _, payload in client.published]
+
+
+def test_acknowledged_state_is_not_republished():
+    arduino, client, _ = publisher()
+    assert arduino.set_state("ON") == "published"
+    arduino.on_publish(1)
+    assert arduino.set_state("ON") == "suppressed"
+    assert payloads(client) == ["ON"]
+
+
+def test_unacknowledged_state_is_not_treated_as_delivered():
+    arduino, client, _ = publisher()
+    arduino.set_state("ON")
+    # Sin PUBACK todavía: otro "ON" se publica, no se da por entregado
+    assert arduino.set_state("ON") == "published"
+    assert payloads(client) == ["ON", "ON"]
+
+
+def test_window_limits_in_flight_and_keeps_last_pending():
+    arduino, client, _ = publisher(window=2)
+    arduino.set_state("ON")
+    arduino.set_state("OFF")
+    assert arduino.set_state("ON") == "queued"
+    assert arduino.set_state("OFF") == "queued"
+    assert arduino.stats()["conflated"] == 1
+    assert payloads(client) == ["ON", "OFF"]
+    arduino.on_publish(1)
+    # El PUBACK libera un hueco y sale el último estado pendiente
+    assert payloads(client) == ["ON", "OFF", "OFF"]
+
+
+def test_disconnect_releases_in_flight_and_republishes_last_state():
+    arduino, client, _ = publisher(window=1)
+    arduino.set_state("ON")
+    arduino.on_disconnect()
+    assert arduino.stats()["in_flight"] == 0
+    assert arduino.stats()["pending"] == "ON"
+    arduino.on_connect()
+    assert payloads(client) == ["ON", "ON"]
+    assert arduino.stats()["expired"] == 1
+
+
+def test_lost_puback_times_out_and_frees_the_window():
+    arduino, client, clock = publisher(window=1, ack_timeout=10)
+    arduino.set_state("ON")
+    assert arduino.set_state("OFF") == "queued"
+    clock.now = 11
+    arduino.flush()
+    assert payloads(client) == ["ON", "OFF"]
+    assert arduino.stats()["expired"] == 1
+    # El PUBACK tardío del mensaje descartado no confirma nada
+    arduino.on_publish(1)
+    assert arduino.stats()["acked"] == 0
+    arduino.on_publish(2)
+    assert arduino.stats()["acked_state"] == "OFF"
+
+
+def test_expired_state_is_resent_when_delivery_is_unknown():
+    arduino, client, clock = publisher(window=1, ack_timeout=10)
+    arduino.set_state("ON")
+    arduino.on_publish(1)
+    arduino.set_state("OFF")
+    clock.now = 11
+    # Puede que "OFF" llegara sin PUBACK: pedir "ON" otra vez no se suprime
+    assert arduino.set_state("ON") == "published"
+    assert payloads(client) == ["ON", "OFF", "ON"]
+
+
+def test_offline_requests_wait_for_connection():
+    client = FakeClient()
+    arduino = ArduinoPublisher(client, "arduino")
+    assert arduino.set_state("ON") == "queued"
+    assert client.published == []
+    arduino.on_connect()
+    assert payloads(client) == ["ON"]
+
+
+def test_publish_error_keeps_state_pending():
+    arduino, client, _ = publisher()
+    client.rc = 4
+    arduino.set_state("ON")
+    assert arduino.stats()["errors"] == 1
+    assert arduino.stats()["pending"] == "ON"
@@ -0,0 +1,93 @@
+import json
+import threading
+
+from command_dispatch import CommandDispatcher
+from device_config import register_commands
+
+
+def message(command, **extra):
+    return json.dumps(dict(extra, command=command))
+
+
+def test_malformed_and_unknown_messages_are_counted():
+    dispatcher = CommandDispatcher()
+    dispatcher.register("Ping", lambda payload: None, inline=True)
+    assert dispatcher.dispatch("no es json") is None
+    assert dispatcher.dispatch("[1, 2]") is None
+    assert dispatcher.dispatch(message(["lista"])) is None
+    assert dispatcher.dispatch(message("Otro")) is None
+    stats = dispatcher.stats()
+    assert stats["malformed"] == 2
+    assert stats["unknown"] == 2
+
+
+def test_inline_commands_run_in_the_calling_thread():
+    calls = []
+    dispatcher = CommandDispatcher()
+    dispatcher.register("Ping", lambda payload: calls.append(threading.current_thread()), inline=True)
+    assert dispatcher.dispatch(message("Ping")) == "Ping"
+    assert calls == [threading.current_thread()]
+    assert dispatcher.stats()["commands"]["Ping"]["executed"] == 1
+
+
+def test_group_burst_is_coalesced_to_the_last_command():
+    started = threading.Event()
+    release = threading.Event()
+    done = threading.Event()
+    executed = []
+
+    def handler(payload):
+        executed.append(payload["value"])
+        if payload["value"] == 0:
+            started.set()
+            release.wait(5)
+        elif payload["value"] == 9:
+            done.set()
+
+    dispatcher = CommandDispatcher(workers=2)
+    dispatcher.register("Brillo", handler, group="brightness")
+    dispatcher.start()
+    try:
+        dispatcher.dispatch(message("Brillo", value=0))
+        assert started.wait(5)
+        # Mientras se ejecuta el primero, la ráfaga se reduce al último
+        for value in range(1, 10):
+            dispatcher.dispatch(message("Brillo", value=value))
+        assert dispatcher.pending() == 1
+        release.set()
+        assert done.wait(5)
+    finally:
+        dispatcher.stop(timeout=1)
+    assert executed == [0, 9]
+    counters = dispatcher.stats()["commands"]["Brillo"]
+    assert counters["received"] == 10
+    assert counters["superseded"] == 8
+    assert counters["executed"] == 2
+
+
+def test_full_queue_rejects_new_groups():
+    dispatcher = CommandDispatcher(max_pending=1)  # Sin arrancar: nada sale de la cola
+    dispatcher.register("A", lambda payload: None)
+    assert dispatcher.dispatch(message("A")) == "A"
+    assert dispatcher.dispatch(message("A")) is None
+    assert dispatcher.stats()["commands"]["A"]["rejected"] == 1
+
+
+def test_handler_errors_are_counted():
+    dispatcher = CommandDispatcher()
+    dispatcher.register("Falla", lambda payload: 1 / 0, inline=True)
+    dispatcher.dispatch(message("Falla"))
+    assert dispatcher.stats()["commands"]["Falla"]["errors"] == 1
+
+
+def test_shared_command_table():
+    fan = []
+    brightness = []
+    dispatcher = register_commands(CommandDispatcher(), fan.append, brightness.append)
+    assert set(dispatcher.routes) == {"Fan ON", "Fan OFF", "Increase Brightness", "Decrease Brightness",
+                                      "Temperature Low"}
+    for command, route in dispatcher.routes.items():
+        route.handler({"command": command})
+    assert fan == ["ON", "OFF"]
+    assert brightness == [2, 0.5]
+    assert dispatcher.routes["Fan ON"].group == dispatcher.routes["Fan OFF"].group
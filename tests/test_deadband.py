@@ -0,0 +1,65 @@
+from deadband import DeadbandFilter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def reading(temperature=20.0, light="Low Light", joystick_action="No Selection"):
+    return {"temperature": temperature, "light": light, "joystick_action": joystick_action}
+
+
+def test_first_reading_is_always_sent():
+    assert DeadbandFilter().offer(reading()) == "first"
+
+
+def test_numeric_field_within_delta_is_suppressed():
+    deadband = DeadbandFilter({"temperature": 0.25}, heartbeat=None)
+    deadband.offer(reading(20.0))
+    assert deadband.offer(reading(20.2)) is None
+    # El delta se mide respecto al último valor enviado, no al último leído
+    assert deadband.offer(reading(20.25)) == "temperature"
+    assert deadband.offer(reading(20.4)) is None
+
+
+def test_categorical_change_is_sent():
+    deadband = DeadbandFilter(heartbeat=None)
+    deadband.offer(reading())
+    assert deadband.offer(reading(light="High Light")) == "light"
+    assert deadband.offer(reading(light="High Light", joystick_action="Red Wine")) == "joystick_action"
+
+
+def test_fields_outside_config_are_ignored():
+    deadband = DeadbandFilter({"temperature": 0.25}, heartbeat=None)
+    deadband.offer(dict(reading(), seq=1))
+    assert deadband.offer(dict(reading(), seq=2, light="High Light")) is None
+
+
+def test_heartbeat_sends_unchanged_reading():
+    clock = FakeClock()
+    deadband = DeadbandFilter(heartbeat=60, clock=clock)
+    deadband.offer(reading())
+    clock.now = 59.9
+    assert deadband.offer(reading()) is None
+    clock.now = 60.0
+    assert deadband.offer(reading()) == "heartbeat"
+    clock.now = 100.0
+    assert deadband.offer(reading()) is None
+
+
+def test_check_does_not_record():
+    deadband = DeadbandFilter(heartbeat=None)
+    deadband.offer(reading(20.0))
+    assert deadband.check(reading(21.0)) == "temperature"
+    assert deadband.last_sent["temperature"] == 20.0
+
+
+def test_stats():
+    deadband = DeadbandFilter(heartbeat=None)
+    for _ in range(4):
+        deadband.offer(reading())
+    assert deadband.stats() == {"emitted": 1, "suppressed": 3, "reduction": 0.75}
@@ -0,0 +1,151 @@
+import io
+import os
+
+import pytest
+
+import export_index
+from export_index import INDEX_SUFFIX, ExportIndex, RangeReader, complete_lines
+from export_reader import DEVICE_FIELD, ENQUEUED_FIELD, ExportReader
+
+
+def enqueued_at(second):
+    return f"2024-11-26T20:{second // 60:02d}:{second % 60:02d}.0000000Z"
+
+
+@pytest.fixture
+def export_file(tmp_path, export_line):
+    """Diez minutos de dos dispositivos: uno cada 5 s ("SenseHat") y otro cada 30 s ("Otro")."""
+    path = tmp_path / "00.json"
+    lines = []
+    for second in range(0, 600, 5):
+        lines.append(export_line("SenseHat", enqueued_at(second), {"seq": second // 5 + 1, "temperature": 20.0}))
+        if second % 30 == 0:
+            lines.append(export_line("Otro", enqueued_at(second), {"seq": second // 30 + 1, "temperature": 30.0}))
+    path.write_text("".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def brute_force(path, start, end, devices=None):
+    """Los mismos registros leyendo el fichero entero."""
+    records = ExportReader(devices=devices).read(path)
+    return [record for record in records if start <= record[ENQUEUED_FIELD] < end]
+
+
+def test_index_covers_devices_and_blocks(export_file):
+    index = ExportIndex.open(export_file, interval=60)
+    assert index.size == os.path.getsize(export_file)
+    assert sorted(index.devices) == ["Otro", "SenseHat"]
+    assert index.device_ranges["SenseHat"][2] == 120
+    assert index.device_ranges["Otro"][2] == 20
+    assert len(index.blocks) == 10
+    assert os.path.exists(export_file + INDEX_SUFFIX)
+
+
+@pytest.mark.parametrize("start, end, devices", [
+    ("2024-11-26T20:02:00Z", "2024-11-26T20:04:30Z", None),
+    ("2024-11-26T20:02:00Z", "2024-11-26T20:04:30Z", ["Otro"]),
+    ("2024-11-26T19:00:00Z", "2024-11-26T21:00:00Z", None),
+    ("2024-11-26T20:09:58Z", "2024-11-26T21:00:00Z", ["SenseHat"]),
+])
+def test_range_reader_matches_full_scan(export_file, start, end, devices):
+    reader = RangeReader(start, end, devices)
+    records = list(reader.read([export_file]))
+    expected = brute_force(export_file, start.replace("Z", ".0000000Z"), end.replace("Z", ".0000000Z"), devices)
+    assert records == expected
+    assert reader.stats()["bytes_read"] <= os.path.getsize(export_file)
+
+
+def test_range_reader_reads_only_overlapping_blocks(export_file):
+    ExportIndex.open(export_file, interval=60)
+    reader = RangeReader("2024-11-26T20:03:00Z", "2024-11-26T20:04:00Z")
+    records = list(reader.read([export_file]))
+    assert len(records) == 12 + 2
+    assert reader.stats()["bytes_read"] < os.path.getsize(export_file) / 5
+
+
+def test_range_reader_skips_files_without_the_device(export_file):
+    reader = RangeReader(devices=["Nadie"])
+    assert list(reader.read([export_file])) == []
+    assert reader.stats()["files_skipped"] == 1
+    assert reader.stats()["bytes_read"] == 0
+
+
+def test_range_reader_with_small_chunks_matches(export_file, monkeypatch):
+    expected = list(RangeReader().read([export_file]))
+    # Trozos más cortos que una línea: las líneas cortadas siguen en el trozo siguiente
+    monkeypatch.setattr(export_index, "READ_CHUNK_BYTES", 100)
+    assert list(RangeReader().read([export_file])) == expected
+
+
+def test_range_lines_reads_in_bounded_chunks(monkeypatch):
+    monkeypatch.setattr(export_index, "READ_CHUNK_BYTES", 7)
+    data = b"primera linea\nsegunda\n\ntercera sin salto"
+    reads = []
+
+    class RecordingFile(io.BytesIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    reader = RangeReader()
+    lines = list(reader._range_lines(RecordingFile(b"xx" + data + b"yy"), 2, 2 + len(data)))
+    assert lines == [b"primera linea", b"segunda", b"", b"tercera sin salto"]
+    assert max(reads) <= 7
+    assert reader.bytes_read == len(data)
+
+
+def test_incremental_update_reads_only_new_lines(export_file, export_line):
+    index = ExportIndex.open(export_file, interval=60)
+    size = index.size
+    with open(export_file, "a", encoding="utf-8") as appended:
+        appended.write(export_line("SenseHat", enqueued_at(600), {"seq": 121}))
+    reopened = ExportIndex(export_file, interval=60)
+    assert reopened.load()
+    assert reopened.update() == os.path.getsize(export_file) - size
+    assert reopened.device_ranges["SenseHat"][2] == 121
+    assert len(reopened.blocks) == 11
+
+
+def test_partial_last_line_waits_for_next_update(export_file, export_line):
+    index = ExportIndex.open(export_file, interval=60)
+    size = index.size
+    line = export_line("SenseHat", enqueued_at(600), {"seq": 121})
+    with open(export_file, "a", encoding="utf-8") as appended:
+        appended.write(line[:40])
+    assert index.update() == 0
+    assert index.size == size
+    with open(export_file, "a", encoding="utf-8") as appended:
+        appended.write(line[40:])
+    assert index.update() == len(line.encode("utf-8"))
+
+
+def test_last_line_without_newline_is_indexed_when_complete(tmp_path, export_line):
+    path = tmp_path / "cerrado.json"
+    path.write_text(export_line("SenseHat", enqueued_at(0), {"seq": 1}).rstrip("\n"), encoding="utf-8")
+    index = ExportIndex.open(str(path))
+    assert index.size == os.path.getsize(path)
+    assert len(list(RangeReader().read([str(path)]))) == 1
+
+
+def test_replaced_file_is_rebuilt(export_file, export_line):
+    ExportIndex.open(export_file, interval=60)
+    with open(export_file, "w", encoding="utf-8") as replaced:
+        replaced.write(export_line("Nuevo", enqueued_at(0), {"seq": 1}))
+    index = ExportIndex.open(export_file, interval=60)
+    assert index.devices == ["Nuevo"]
+    assert index.size == os.path.getsize(export_file)
+
+
+def test_complete_lines_stops_at_partial_line():
+    data = b'{"a": 1}\n{"b": 2}\n{"c": '
+    position = [0]
+    lines = list(complete_lines(io.BytesIO(data), position))
+    assert lines == [b'{"a": 1}\n', b'{"b": 2}\n']
+    assert position[0] == len(b'{"a": 1}\n{"b": 2}\n')
+
+
+def test_records_carry_device(export_file):
+    records = list(RangeReader(devices=["Otro"], fields=[DEVICE_FIELD, "seq"]).read([export_file]))
+    assert len(records) == 20
+    assert {record[DEVICE_FIELD] for record in records} == {"Otro"}
+    assert ENQUEUED_FIELD not in records[0]
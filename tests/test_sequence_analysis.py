@@ -0,0 +1,118 @@
+import random
+
+from export_reader import DEVICE_FIELD, ENQUEUED_EPOCH_FIELD
+from sequence_analysis import BloomFilter, Reservoir, SequenceAnalyzer
+from telemetry_codec import decode_struct, encode_struct
+
+
+def record(seq=None, boot=1, device_id="SenseHat", ts=None, enqueued=None, **extra):
+    result = {DEVICE_FIELD: device_id, "boot": boot, **extra}
+    if seq is not None:
+        result["seq"] = seq
+    if ts is not None:
+        result["ts"] = ts
+    if enqueued is not None:
+        result[ENQUEUED_EPOCH_FIELD] = enqueued
+    return result
+
+
+def summary(records, **kwargs):
+    return SequenceAnalyzer(expected=10000, **kwargs).add_all(records).summary()["devices"]["SenseHat"]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [f"key-{i}".encode() for i in range(1000)]
+    first_pass = sum(bloom.add(key) for key in keys)
+    assert first_pass < 1000 * 0.01 * 2  # Falsos positivos al insertar claves nuevas
+    assert all(bloom.add(key) for key in keys)
+
+
+def test_bloom_filter_false_positive_rate_is_bounded():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f"in-{i}".encode())
+    assert abs(bloom.stats()["false_positive_rate"] - 0.01) < 0.002
+    # `add` también inserta: pocas consultas para no llenar el filtro más allá de su capacidad
+    false_positives = sum(bloom.add(f"out-{i}".encode()) for i in range(1000))
+    assert false_positives < 1000 * 0.02
+
+
+def test_reservoir_keeps_fixed_size_uniform_sample():
+    reservoir = Reservoir(100, random.Random(1))
+    for value in range(10000):
+        reservoir.add(value)
+    assert len(reservoir.values) == 100
+    assert reservoir.seen == 10000
+    # Una muestra uniforme de 0..9999 tiene media cercana a 5000
+    assert 3500 < sum(reservoir.values) / 100 < 6500
+
+
+def test_reservoir_keeps_everything_below_size():
+    reservoir = Reservoir(10)
+    for value in range(5):
+        reservoir.add(value)
+    assert reservoir.values == [0, 1, 2, 3, 4]
+
+
+def test_loss_duplicates_and_reordering():
+    seqs = [1, 2, 4, 3, 3, 7, 8]  # Faltan 5 y 6; 3 llega tarde y repetido
+    result = summary([record(seq) for seq in seqs])
+    assert result["expected"] == 8
+    assert result["received"] == 6
+    assert result["lost"] == 2
+    assert result["duplicates"] == 1
+    assert result["reordered"] == 1
+    assert result["max_reorder_depth"] == 1
+
+
+def test_reboot_restarts_sequence_without_duplicates():
+    records = [record(seq, boot=1) for seq in range(1, 6)] + [record(seq, boot=2) for seq in range(1, 4)]
+    result = summary(records)
+    assert result["boots"] == 2
+    assert result["duplicates"] == 0
+    assert result["lost"] == 0
+    assert result["expected"] == 8
+
+
+def test_deadband_suppressed_readings_are_not_lost():
+    # Lecturas 2-4 y 6 descartadas por la banda muerta: `suppressed` es el total acumulado
+    records = [record(1, suppressed=0), record(5, suppressed=3), record(7, suppressed=4)]
+    result = summary(records)
+    assert result["suppressed"] == 4
+    assert result["lost"] == 0
+
+
+def test_messages_without_seq_only_count_for_latency():
+    records = [record(event_seq=1, ts=100.0, enqueued=100.5), record(event_seq=2, ts=101.0, enqueued=101.25)]
+    result = summary(records)
+    assert result["without_seq"] == 2
+    assert result["duplicates"] == 0
+    assert result["latency_ms"]["count"] == 2
+    assert result["latency_ms"]["max"] == 500.0
+    assert result["latency_ms"]["min"] == 250.0
+
+
+def test_struct_events_and_reboots_are_not_duplicates():
+    records = []
+    for boot in (1, 2):
+        samples = [{"boot": boot, "seq": 1, "ts": 10.0},
+                   {"boot": boot, "event_seq": 1, "ts": 10.5},
+                   {"boot": boot, "event_seq": 2, "ts": 10.6},
+                   {"boot": boot, "seq": 2, "ts": 11.0}]
+        for sample in decode_struct(encode_struct(samples)):
+            sample[DEVICE_FIELD] = "SenseHat"
+            records.append(sample)
+    result = summary(records)
+    assert result["duplicates"] == 0
+    assert result["without_seq"] == 4
+    assert result["boots"] == 2
+    assert result["lost"] == 0
+
+
+def test_devices_are_analyzed_separately():
+    records = [record(1, device_id="A"), record(1, device_id="B"), record(3, device_id="B")]
+    devices = SequenceAnalyzer(expected=1000).add_all(records).summary()["devices"]
+    assert devices["A"]["lost"] == 0
+    assert devices["B"]["lost"] == 1
+    assert devices["A"]["duplicates"] == devices["B"]["duplicates"] == 0
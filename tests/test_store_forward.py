@@ -0,0 +1,186 @@
+import os
+import time
+
+from store_forward import RECORD_HEADER, Drainer, SegmentQueue
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def test_append_peek_commit(tmp_path):
+    queue = SegmentQueue(str(tmp_path))
+    for i in range(5):
+        queue.append(f"r{i}")
+
+    records, cursor = queue.peek(3)
+    assert records == [b"r0", b"r1", b"r2"]
+    # Sin commit, peek devuelve los mismos registros
+    assert queue.peek(3)[0] == records
+    queue.commit(cursor)
+    assert queue.depth() == 2
+    assert queue.peek(10)[0] == [b"r3", b"r4"]
+    assert queue.stats()["drained"] == 3
+
+
+def test_recovery_resumes_after_committed_records(tmp_path):
+    queue = SegmentQueue(str(tmp_path))
+    for i in range(4):
+        queue.append(f"r{i}")
+    _, cursor = queue.peek(2)
+    queue.commit(cursor)
+    queue.close()
+
+    reopened = SegmentQueue(str(tmp_path))
+    assert reopened.depth() == 2
+    assert reopened.peek(10)[0] == [b"r2", b"r3"]
+
+
+def test_recovery_truncates_torn_write(tmp_path):
+    queue = SegmentQueue(str(tmp_path))
+    for i in range(3):
+        queue.append(f"r{i}")
+    queue.close()
+    path = os.path.join(str(tmp_path), segment_files(str(tmp_path))[-1])
+    size = os.path.getsize(path)
+    # Corte de luz a mitad de registro: cabecera completa y solo parte del contenido
+    with open(path, "ab") as segment_file:
+        segment_file.write(RECORD_HEADER.pack(100, 0) + b"parcial")
+
+    reopened = SegmentQueue(str(tmp_path))
+    assert os.path.getsize(path) == size
+    assert reopened.peek(10)[0] == [b"r0", b"r1", b"r2"]
+    reopened.append("r3")
+    assert reopened.peek(10)[0] == [b"r0", b"r1", b"r2", b"r3"]
+
+
+def test_recovery_stops_at_bad_crc(tmp_path):
+    queue = SegmentQueue(str(tmp_path))
+    for i in range(3):
+        queue.append(f"r{i}")
+    queue.close()
+    path = os.path.join(str(tmp_path), segment_files(str(tmp_path))[-1])
+    with open(path, "r+b") as segment_file:
+        # Cambia un byte del contenido del segundo registro
+        segment_file.seek(2 * RECORD_HEADER.size + 2)
+        segment_file.write(b"X")
+
+    reopened = SegmentQueue(str(tmp_path))
+    assert reopened.peek(10)[0] == [b"r0"]
+
+
+def test_rotation_and_eviction_keep_newest_records(tmp_path):
+    record_size = RECORD_HEADER.size + len(b"r000")
+    queue = SegmentQueue(str(tmp_path), segment_bytes=4 * record_size, max_bytes=8 * record_size)
+    for i in range(20):
+        queue.append(f"r{i:03d}")
+
+    stats = queue.stats()
+    assert stats["bytes"] <= 8 * record_size
+    assert stats["evicted"] == 20 - stats["depth"]
+    records = queue.peek(100)[0]
+    assert records == [f"r{i:03d}".encode() for i in range(20 - len(records), 20)]
+    assert len(segment_files(str(tmp_path))) == stats["segments"]
+
+
+def test_eviction_of_read_segment_moves_cursor(tmp_path):
+    record_size = RECORD_HEADER.size + len(b"r000")
+    queue = SegmentQueue(str(tmp_path), segment_bytes=4 * record_size, max_bytes=8 * record_size)
+    for i in range(4):
+        queue.append(f"r{i:03d}")
+    _, cursor = queue.peek(2)
+    queue.commit(cursor)
+    for i in range(4, 12):
+        queue.append(f"r{i:03d}")
+
+    # El segmento de lectura se ha descartado: se sigue por el más antiguo que queda
+    assert queue.peek(1)[0] == [b"r004"]
+    assert queue.stats()["evicted"] == 2
+    queue.close()
+    assert SegmentQueue(str(tmp_path)).peek(1)[0] == [b"r004"]
+
+
+def test_commit_of_evicted_cursor_is_ignored(tmp_path):
+    record_size = RECORD_HEADER.size + len(b"r000")
+    queue = SegmentQueue(str(tmp_path), segment_bytes=4 * record_size, max_bytes=8 * record_size)
+    for i in range(4):
+        queue.append(f"r{i:03d}")
+    _, cursor = queue.peek(2)
+    for i in range(4, 12):
+        queue.append(f"r{i:03d}")
+    queue.commit(cursor)
+    assert queue.peek(1)[0] == [b"r004"]
+
+
+def test_drainer_sends_batches_and_retries(tmp_path):
+    queue = SegmentQueue(str(tmp_path))
+    for i in range(5):
+        queue.append(f"r{i}")
+    sent = []
+    failures = [1]
+
+    def send_batch(records):
+        if failures[0]:
+            failures[0] -= 1
+            raise ConnectionError("sin conexión")
+        sent.extend(records)
+
+    drainer = Drainer(queue, send_batch, batch_size=2, idle_delay=0.01)
+    drainer.start()
+    try:
+        assert wait_until(lambda: queue.depth() == 0)
+    finally:
+        drainer.stop(timeout=1)
+    assert sent == [b"r0", b"r1", b"r2", b"r3", b"r4"]
+    assert drainer.failures == 1
+
+
+def test_drainer_urgent_records_skip_the_queue(tmp_path):
+    queue = SegmentQueue(str(tmp_path))
+    sent = []
+
+    def send_batch(records):
+        raise ConnectionError("sin conexión")
+
+    drainer = Drainer(queue, send_batch, idle_delay=0.5, max_retry_delay=60,
+                      send_one=lambda record: sent.append(("urgente", record)))
+    queue.append("antiguo")
+    drainer.start()
+    try:
+        # La cola está en espera tras el fallo; el urgente no espera a ella
+        assert wait_until(lambda: drainer.failures >= 1)
+        drainer.send_urgent("urgente")
+        assert wait_until(lambda: drainer.urgent_sent == 1)
+        assert sent == [("urgente", b"urgente")]
+        assert queue.depth() == 1
+    finally:
+        drainer.stop(timeout=1)
+
+
+def test_drainer_failed_urgent_record_goes_to_the_queue(tmp_path):
+    queue = SegmentQueue(str(tmp_path))
+
+    def send_one(record):
+        raise ConnectionError("sin conexión")
+
+    batches = []
+    drainer = Drainer(queue, batches.append, idle_delay=0.01, send_one=send_one)
+    drainer.send_urgent("urgente")
+    drainer.start()
+    try:
+        # Se guarda en la cola y sale con ella
+        assert wait_until(lambda: batches)
+    finally:
+        drainer.stop(timeout=1)
+    assert drainer.urgent_failed == 1
+    assert batches == [[b"urgente"]]
+    assert queue.stats()["appended"] == 1
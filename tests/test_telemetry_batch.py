@@ -0,0 +1,48 @@
+from telemetry_batch import TelemetryBatcher
+from telemetry_codec import decode_body
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def batcher(max_samples=3, max_wait_ms=1000):
+    sent = []
+    clock = FakeClock()
+    batch = TelemetryBatcher(lambda body, count: sent.append((decode_body(*body), count)),
+                             max_samples=max_samples, max_wait_ms=max_wait_ms, clock=clock,
+                             wall_clock=lambda: 100.0)
+    return batch, sent, clock
+
+
+def test_batch_is_sent_when_full():
+    batch, sent, _ = batcher(max_samples=3)
+    for seq in (1, 2):
+        assert not batch.add({"seq": seq})
+    assert batch.add({"seq": 3})
+    assert [sample["seq"] for sample in sent[0][0]] == [1, 2, 3]
+    assert sent[0][1] == 3
+    assert len(batch) == 0
+
+
+def test_urgent_sample_flushes_immediately():
+    batch, sent, _ = batcher()
+    batch.add({"seq": 1})
+    assert batch.add({"seq": 2, "joystick_action": "Red Wine"}, urgent=True)
+    assert sent[0][1] == 2
+
+
+def test_flush_if_due_closes_idle_batch():
+    batch, sent, clock = batcher(max_wait_ms=1000)
+    batch.add({"seq": 1})
+    clock.now = 0.5
+    assert not batch.flush_if_due()
+    # Sin muestras nuevas el lote se cierra igualmente al pasar el tiempo máximo
+    clock.now = 1.0
+    assert batch.flush_if_due()
+    assert sent[0][1] == 1
+    assert not batch.flush_if_due()
@@ -0,0 +1,104 @@
+import base64
+import json
+import struct
+
+import pytest
+
+from telemetry_codec import (
+    JSON_CONTENT_TYPE,
+    STRUCT_CONTENT_TYPE,
+    STRUCT_V1_HEADER,
+    STRUCT_V1_SAMPLE,
+    decode_batch,
+    decode_body,
+    decode_struct,
+    encode_samples,
+    encode_struct,
+)
+
+READINGS = [
+    {"boot": 7, "seq": 1, "ts": 1732640426.758, "temperature": 34.02, "light": "Low Light",
+     "joystick_action": "No Selection", "suppressed": 0},
+    {"boot": 7, "seq": 2, "ts": 1732640427.758, "temperature": 33.97, "light": "High Light",
+     "joystick_action": "Red Wine", "suppressed": 3},
+]
+EVENT = {"boot": 7, "event_seq": 4, "ts": 1732640427.9, "temperature": 33.97, "light": "High Light",
+         "joystick_action": "White Wine"}
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "deflate"])
+def test_json_batch_round_trip(compression):
+    samples = READINGS + [EVENT]
+    body = encode_samples(samples, "json", compression)
+    assert body.content_type == JSON_CONTENT_TYPE
+    assert body.content_encoding == (compression or "utf-8")
+    # Los campos que una muestra no tiene (p. ej. `seq` en el evento) no aparecen al decodificar
+    assert decode_body(body.data, body.content_type, body.content_encoding) == samples
+
+
+def test_json_batch_keeps_extra_fields_as_columns():
+    samples = [dict(READINGS[0], temperature_min=33.9), dict(READINGS[1], temperature_min=33.8)]
+    body = encode_samples(samples, "json")
+    fields = json.loads(body.data)["fields"]
+    assert fields[:4] == ["seq", "temperature", "light", "joystick_action"]
+    assert "temperature_min" in fields and "ts" not in fields
+    assert decode_body(body.data, body.content_type, body.content_encoding) == samples
+
+
+def test_single_json_message_keeps_old_format():
+    body = encode_samples([READINGS[0]], "json", batch=False)
+    assert json.loads(body.data) == READINGS[0]
+    assert decode_batch(body.data) == [READINGS[0]]
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_struct_round_trip(compression):
+    body = encode_samples(READINGS + [EVENT], "struct", compression)
+    assert body.content_type == STRUCT_CONTENT_TYPE
+    decoded = decode_body(body.data, body.content_type, body.content_encoding)
+    assert decoded == READINGS + [EVENT]
+
+
+def test_struct_events_do_not_carry_seq():
+    decoded = decode_struct(encode_struct([READINGS[0], EVENT]))
+    assert "seq" not in decoded[1] and decoded[1]["event_seq"] == 4
+    assert "suppressed" not in decoded[1]
+    assert decoded[0]["seq"] == 1
+
+
+def test_struct_unknown_values():
+    sample = {"seq": 1, "ts": 10.0, "temperature": None, "light": "Dim", "joystick_action": None}
+    decoded = decode_struct(encode_struct([sample]))[0]
+    assert decoded["temperature"] is None
+    assert decoded["light"] is None and decoded["joystick_action"] is None
+    assert "boot" not in decoded
+
+
+def test_struct_from_export_is_base64():
+    body = encode_samples(READINGS, "struct")
+    text = base64.b64encode(body.data).decode("ascii")
+    assert decode_body(text, body.content_type, body.content_encoding) == READINGS
+
+
+def test_struct_v1_bodies_still_decode():
+    data = (STRUCT_V1_HEADER.pack(1, 0, 2, 100.0)
+            + STRUCT_V1_SAMPLE.pack(5, 0, 2150, 0, 1)
+            + STRUCT_V1_SAMPLE.pack(0, 250, 2150, 1, 2))
+    reading, event = decode_struct(data)
+    assert reading == {"seq": 5, "ts": 100.0, "temperature": 21.5, "light": "Low Light",
+                       "joystick_action": "Red Wine"}
+    # En la versión 1, `seq` 0 era un mensaje sin `seq`
+    assert "seq" not in event and event["ts"] == 100.25
+
+
+def test_struct_rejects_unknown_version_and_truncated_body():
+    data = encode_struct(READINGS)
+    with pytest.raises(ValueError):
+        decode_struct(b"\x09" + data[1:])
+    with pytest.raises((ValueError, struct.error)):
+        decode_struct(data[:-3])
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        encode_samples(READINGS, "cbor")